@@ -4,6 +4,8 @@ import os
 import json
 import re
 import platform
+import threading
+from contextlib import contextmanager
 from modules.helpers.config_helper import ConfigHelper
 import logging
 
@@ -17,11 +19,7 @@ _SQLITE_TYPE = {
     "float":    "REAL",
 }
 
-def load_schema_from_json(entity_name):
-    """
-    Opens PROJECT_ROOT/modules/<entity_name>/<entity_name>_template.json
-    and returns [(col_name, sql_type), …].
-    """
+def _load_template_fields(entity_name):
     project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
     json_path    = os.path.join(
         project_root,
@@ -31,51 +29,249 @@ def load_schema_from_json(entity_name):
     )
     with open(json_path, encoding="utf-8") as f:
         tmpl = json.load(f)
+    return tmpl["fields"]
 
+def load_schema_from_json(entity_name):
+    """
+    Opens PROJECT_ROOT/modules/<entity_name>/<entity_name>_template.json
+    and returns [(col_name, sql_type), …].
+    """
     schema = []
-    for field in tmpl["fields"]:
+    for field in _load_template_fields(entity_name):
         name = field["name"]
         jtype = field["type"]
         schema.append((name, _SQLITE_TYPE.get(jtype, "TEXT")))
     return schema
 
-def get_connection():
-    raw_db_path = ConfigHelper.get("Database", "path", fallback="default_campaign.db").strip()
+def load_field_types(entity_name):
+    """
+    Returns {col_name: json_type} from the same template, e.g. "longtext"
+    or "list", so callers know which columns hold JSON.
+    """
+    return {field["name"]: field["type"] for field in _load_template_fields(entity_name)}
+
+_pool_lock = threading.RLock()
+_write_lock = threading.RLock()
+_version_lock = threading.Lock()
+_thread_state = threading.local()
+_pool = {
+    "path": None,        # resolved path the pooled connections point to
+    "writer": None,      # the single shared write connection
+    "readers": {},       # thread -> its read connection, for pruning/shutdown
+    "generation": 0,     # bumped on close so threads drop stale readers
+    "watcher": None,     # connection only used to read PRAGMA data_version
+    "seen": None,        # its data_version after our last commit
+    "writer_seen": None, # the writer's own data_version at our last commit
+    "external": 0,       # commits seen from other processes
+    "writes": 0,         # our commits that caches did not account for
+}
+
+_resolved_paths = {}
+
+def resolve_db_path(raw_db_path=None):
+    """
+    Turns the configured database path into a path usable on this machine.
+    Windows-style paths are remapped onto the Synology share when running
+    elsewhere.
+    """
+    if raw_db_path is None:
+        raw_db_path = ConfigHelper.get("Database", "path", fallback="default_campaign.db")
+    raw_db_path = raw_db_path.strip()
+    cached = _resolved_paths.get(raw_db_path)
+    if cached is not None:
+        return cached
+    _resolved_paths[raw_db_path] = _resolve_db_path(raw_db_path)
+    return _resolved_paths[raw_db_path]
+
+def _resolve_db_path(raw_db_path):
     is_windows_style_path = re.match(r"^[a-zA-Z]:[\\/\\]", raw_db_path)
 
     if platform.system() != "Windows" and is_windows_style_path:
-        drive_letter = raw_db_path[0].upper()
         subpath = raw_db_path[2:].lstrip("/\\").replace("\\", "/")
         if subpath.lower().startswith("synologydrive/"):
             subpath = subpath[len("synologydrive/"):]
         synology_base = "/volume1/homes/llankar/Drive"
-        DB_PATH = os.path.join(synology_base, subpath)
-    else:
-        DB_PATH = raw_db_path if os.path.exists(raw_db_path) else os.path.abspath(os.path.normpath(raw_db_path))
+        return os.path.join(synology_base, subpath)
+    return raw_db_path if os.path.exists(raw_db_path) else os.path.abspath(os.path.normpath(raw_db_path))
+
+def _open_connection(db_path):
+    """
+    Opens a connection with the pragmas we want on every pooled handle.
+    """
+    conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    journal_mode = ConfigHelper.get("Database", "journal_mode", fallback="WAL").strip() or "WAL"
+    try:
+        conn.execute(f"PRAGMA journal_mode={journal_mode}")
+    except sqlite3.DatabaseError as e:
+        # Some network shares refuse WAL; fall back to SQLite's default.
+        logging.warning("Could not set journal_mode=%s on %s: %s", journal_mode, db_path, e)
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA cache_size=-20000")       # ~20 MB page cache
+    conn.execute("PRAGMA mmap_size=268435456")     # 256 MB memory map
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+def _current_pool_path():
+    """
+    Returns the resolved DB path, dropping every pooled connection first if
+    the configured database changed since they were opened.
+    """
+    db_path = resolve_db_path()
+    if _pool["path"] != db_path:
+        # Always take the write lock before the pool lock to avoid deadlocks.
+        with _write_lock, _pool_lock:
+            if _pool["path"] != db_path:
+                close_all_connections()
+                _pool["path"] = db_path
+    return db_path
+
+def close_all_connections():
+    """
+    Closes the pooled write connection and every per-thread read connection.
+    Call this on shutdown or after switching to another campaign database.
+    """
+    with _write_lock, _pool_lock, _version_lock:
+        for conn in [_pool["writer"], _pool["watcher"]] + list(_pool["readers"].values()):
+            if conn is None:
+                continue
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        _pool["writer"] = None
+        _pool["watcher"] = None
+        _pool["seen"] = None
+        _pool["writer_seen"] = None
+        _pool["readers"] = {}
+        _pool["path"] = None
+        _pool["generation"] += 1
+
+def _prune_dead_readers():
+    """
+    Closes read connections left behind by worker threads that have exited.
+    """
+    for thread in [t for t in _pool["readers"] if not t.is_alive()]:
+        try:
+            _pool["readers"].pop(thread).close()
+        except sqlite3.Error:
+            pass
+
+@contextmanager
+def read_connection():
+    """
+    Yields this thread's pooled read connection (rows are sqlite3.Row).
+    The connection stays open for the next caller on the same thread.
+    """
+    db_path = _current_pool_path()
+    conn = getattr(_thread_state, "reader", None)
+    if conn is None or getattr(_thread_state, "generation", None) != _pool["generation"]:
+        conn = _open_connection(db_path)
+        with _pool_lock:
+            _prune_dead_readers()
+            _pool["readers"][threading.current_thread()] = conn
+            _thread_state.generation = _pool["generation"]
+        _thread_state.reader = conn
+    yield conn
+
+@contextmanager
+def write_connection(invalidate_caches=True):
+    """
+    Yields the process-wide write connection while holding the write lock.
+    Commits when the block succeeds and rolls back when it raises.
+
+    The commit changes data_version(), so entity caches reload, unless
+    ``invalidate_caches`` is False: callers that update the caches of what
+    they wrote themselves (GenericModelWrapper) or write tables no cache
+    holds (map_items) pass False.
+    """
+    db_path = _current_pool_path()
+    with _write_lock:
+        conn = _get_writer(db_path)
+        try:
+            yield conn
+            with _version_lock:
+                # Commits from elsewhere are counted before ours is absorbed
+                _poll_external(db_path)
+                conn.commit()
+                _pool["seen"] = _watcher_version(db_path)
+                # The watcher cannot tell ours from one landing right after
+                # it; the writer's data_version only moves for the others.
+                # Read after the watcher, it misses none of them.
+                version = conn.execute("PRAGMA data_version").fetchone()[0]
+                if version != _pool["writer_seen"]:
+                    _pool["external"] += 1
+                    _pool["writer_seen"] = version
+                if invalidate_caches:
+                    _pool["writes"] += 1
+        except Exception:
+            conn.rollback()
+            raise
+
+def _get_writer(db_path):
+    # Caller must hold _write_lock
+    conn = _pool["writer"]
+    if conn is None:
+        conn = _open_connection(db_path)
+        _pool["writer"] = conn
+        _pool["writer_seen"] = conn.execute("PRAGMA data_version").fetchone()[0]
+    return conn
+
+def _watcher_version(db_path):
+    # Caller must hold _version_lock. PRAGMA data_version moves whenever
+    # another connection, our own writer included, commits.
+    conn = _pool["watcher"]
+    if conn is None:
+        conn = _pool["watcher"] = _open_connection(db_path)
+    return conn.execute("PRAGMA data_version").fetchone()[0]
+
+def _poll_external(db_path):
+    # Caller must hold _version_lock
+    version = _watcher_version(db_path)
+    if _pool["seen"] is not None and version != _pool["seen"]:
+        _pool["external"] += 1
+    _pool["seen"] = version
 
-    return sqlite3.connect(DB_PATH)
+def data_version():
+    """
+    Returns a token that changes whenever the campaign database is modified
+    by another process (the web viewer, an external script...), by one of
+    our writes that did not update the caches itself (see
+    write_connection), or when the pool switches to another database.
+    Caches compare it to decide whether their rows are still current.
+    Never waits for a write in progress, only for a commit.
+    """
+    db_path = _current_pool_path()
+    with _version_lock:
+        _poll_external(db_path)
+        return (_pool["generation"], _pool["writes"], _pool["external"])
+
+def get_connection():
+    """
+    Returns a dedicated (non-pooled) connection to the campaign database.
+    Kept for scripts that manage their own connection lifetime; application
+    code should prefer read_connection()/write_connection().
+    """
+    return _open_connection(resolve_db_path())
 
 def initialize_db():
-    conn   = get_connection()
-    cursor = conn.cursor()
-
-    # Create tables if missing
-    for table in ["pcs","npcs","scenarios","factions","places","objects","informations","clues", "creatures", "maps"]:
-        schema = load_schema_from_json(table)
-        pk = schema[0][0]
-        cols_sql = ",\n    ".join(f"{col} {typ}" for col,typ in schema)
-        ddl = f"""
-        CREATE TABLE IF NOT EXISTS {table} (
-            {cols_sql},
-            PRIMARY KEY({pk})
-        )"""
-        cursor.execute(ddl)
-
-    # Add any new columns for existing tables
-    update_table_schema(conn, cursor)
+    with write_connection() as conn:
+        cursor = conn.cursor()
 
-    conn.commit()
-    conn.close()
+        # Create tables if missing
+        for table in ["pcs","npcs","scenarios","factions","places","objects","informations","clues", "creatures", "maps"]:
+            schema = load_schema_from_json(table)
+            pk = schema[0][0]
+            cols_sql = ",\n    ".join(f"{col} {typ}" for col,typ in schema)
+            ddl = f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                {cols_sql},
+                PRIMARY KEY({pk})
+            )"""
+            cursor.execute(ddl)
+
+        # Add any new columns for existing tables
+        update_table_schema(conn, cursor)
 
 def update_table_schema(conn, cursor):
     """
@@ -126,8 +322,424 @@ def update_table_schema(conn, cursor):
                         f"ALTER TABLE {ent} ADD COLUMN {col} {typ}"
                     )
 
+    # Normalized copy of the linked list fields, for indexed reverse lookups
+    ensure_entity_links(cursor, entities)
+    # Full-text index over names and rich-text fields
+    ensure_search_index(cursor, entities)
+    # One row per token or shape, instead of the maps' Tokens blob
+    ensure_map_items(cursor)
+
     conn.commit()
 
+def linked_list_fields(entity_name):
+    """
+    Returns [(field, target_table), …] for the template's list fields that
+    point at another entity, e.g. ("Factions", "factions") for NPCs.
+    """
+    return [
+        (field["name"], field["linked_type"].lower())
+        for field in _load_template_fields(entity_name)
+        if field["type"] == "list" and field.get("linked_type")
+    ]
+
+def ensure_entity_links(cursor, entities):
+    """
+    Creates the entity_links table and its indexes if needed, then brings
+    it in line with the JSON list columns stored in ``entities``. Runs each
+    time a database is opened or switched to, so links of rows written
+    without GenericModelWrapper (another process, raw SQL, a restored copy)
+    are rebuilt.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS entity_links (
+            src_type TEXT NOT NULL,
+            src_key  TEXT NOT NULL,
+            field    TEXT NOT NULL,
+            dst_type TEXT NOT NULL,
+            dst_key  TEXT NOT NULL,
+            position INTEGER NOT NULL DEFAULT 0
+        )""")
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_entity_links_src ON entity_links(src_type, src_key, field)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_entity_links_dst ON entity_links(dst_type, dst_key, src_type)"
+    )
+    for ent in entities:
+        reconcile_entity_links(cursor, ent)
+
+def reconcile_entity_links(cursor, ent):
+    """
+    Rewrites the entity_links rows of ``ent`` that differ from its list
+    columns, and drops those of rows that no longer exist. Returns the
+    number of rows whose links were fixed.
+    """
+    stored = {}
+    for src_key, field, dst_type, dst_key, pos in cursor.execute(
+        "SELECT src_key, field, dst_type, dst_key, position FROM entity_links "
+        "WHERE src_type = ? ORDER BY src_key, field, position", (ent,)
+    ).fetchall():
+        stored.setdefault(src_key, []).append((field, dst_type, dst_key, pos))
+
+    fields = linked_list_fields(ent)
+    pk = load_schema_from_json(ent)[0][0]
+    names = [pk] + [f for f, _ in fields]
+    rows = [dict(zip(names, row)) for row in cursor.execute(
+        f"SELECT {', '.join(names)} FROM {ent}"
+    ).fetchall()]
+
+    stale = []
+    for row in rows:
+        expected = sorted(
+            (field, dst_type, dst_key, pos)
+            for field, dst_type in fields
+            for pos, dst_key in enumerate(_link_values(row[field]))
+        )
+        if expected != stored.pop(row[pk], []):
+            stale.append(row)
+    # What is left belongs to rows that are gone
+    gone = list(stored)
+    if gone:
+        delete_entity_links(cursor, ent, gone)
+    if stale:
+        delete_entity_links(cursor, ent, [row[pk] for row in stale])
+        write_entity_links(cursor, ent, stale, pk, fields)
+    if gone or stale:
+        logging.info("Rebuilt the links of %d %s row(s)", len(gone) + len(stale), ent)
+    return len(gone) + len(stale)
+
+def _link_values(value):
+    # List columns are JSON strings on disk and lists in memory
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except json.JSONDecodeError:
+            return [value] if value.strip() else []
+    if not isinstance(value, list):
+        return []
+    return [str(v) for v in value if v not in (None, "")]
+
+def write_entity_links(cursor, src_type, rows, key_field, fields):
+    """
+    Replaces the entity_links rows of the given source rows. ``fields`` is
+    linked_list_fields(src_type); only fields present in a row are rewritten.
+    """
+    deletes = []
+    inserts = []
+    for row in rows:
+        src_key = row.get(key_field)
+        if src_key is None:
+            continue
+        for field, dst_type in fields:
+            if field not in row:
+                continue
+            deletes.append((src_type, src_key, field))
+            for pos, dst_key in enumerate(_link_values(row[field])):
+                inserts.append((src_type, src_key, field, dst_type, dst_key, pos))
+    cursor.executemany(
+        "DELETE FROM entity_links WHERE src_type = ? AND src_key = ? AND field = ?",
+        deletes
+    )
+    cursor.executemany(
+        "INSERT INTO entity_links (src_type, src_key, field, dst_type, dst_key, position) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        inserts
+    )
+
+def delete_entity_links(cursor, src_type, src_keys=None):
+    """
+    Drops the links of the given source rows, or of the whole table when
+    ``src_keys`` is None.
+    """
+    if src_keys is None:
+        cursor.execute("DELETE FROM entity_links WHERE src_type = ?", (src_type,))
+    else:
+        cursor.executemany(
+            "DELETE FROM entity_links WHERE src_type = ? AND src_key = ?",
+            [(src_type, key) for key in src_keys]
+        )
+
+# Tokens and shapes placed on maps, one row each: (column, SQL type)
+MAP_ITEM_COLUMNS = (
+    ("type", "TEXT"), ("x", "REAL"), ("y", "REAL"),
+    ("entity_type", "TEXT"), ("entity_id", "TEXT"), ("image_path", "TEXT"),
+    ("size", "INTEGER"), ("hp", "INTEGER"), ("max_hp", "INTEGER"),
+    ("border_color", "TEXT"), ("shape_type", "TEXT"), ("fill_color", "TEXT"),
+    ("is_filled", "BOOLEAN"), ("width", "REAL"), ("height", "REAL"),
+)
+
+def ensure_map_items(cursor):
+    """
+    Creates the map_items table: the tokens and shapes of each map, keyed
+    by (map_name, item_id) and stacked by ``z``, so that editing one item
+    writes one row. Maps still holding a Tokens blob are migrated when
+    they are first opened (see modules.maps.views.map_selector).
+    """
+    cols = ",\n            ".join(f"{c} {t}" for c, t in MAP_ITEM_COLUMNS)
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS map_items (
+            map_name TEXT NOT NULL,
+            item_id  TEXT NOT NULL,
+            z        REAL NOT NULL DEFAULT 0,
+            {cols},
+            PRIMARY KEY (map_name, item_id)
+        )""")
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_map_items_map ON map_items(map_name, z)"
+    )
+
+def load_map_items(map_name):
+    """The items of ``map_name`` as dicts, bottom to top, without NULL columns."""
+    with read_connection() as conn:
+        cursor = conn.execute(
+            "SELECT * FROM map_items WHERE map_name = ? ORDER BY z", (map_name,)
+        )
+        names = [d[0] for d in cursor.description]
+        items = []
+        for row in cursor.fetchall():
+            item = {n: v for n, v in zip(names, row) if v is not None}
+            if "is_filled" in item:
+                item["is_filled"] = bool(item["is_filled"])
+            items.append(item)
+    return items
+
+def write_map_items(cursor, map_name, rows):
+    """Inserts or replaces the given items (dicts with item_id and z) of a map."""
+    if not rows:
+        return
+    cols = ["map_name", "item_id", "z"] + [c for c, _ in MAP_ITEM_COLUMNS]
+    placeholders = ", ".join("?" for _ in cols)
+    cursor.executemany(
+        f"INSERT OR REPLACE INTO map_items ({', '.join(cols)}) VALUES ({placeholders})",
+        [[map_name] + [row.get(c) for c in cols[1:]] for row in rows]
+    )
+
+def delete_map_items(cursor, map_name, item_ids=None):
+    """Drops the given items of a map, or all of them when ``item_ids`` is None."""
+    if item_ids is None:
+        cursor.execute("DELETE FROM map_items WHERE map_name = ?", (map_name,))
+    else:
+        cursor.executemany(
+            "DELETE FROM map_items WHERE map_name = ? AND item_id = ?",
+            [(map_name, item_id) for item_id in item_ids]
+        )
+
+def rename_map_items(cursor, old_name, new_name):
+    """Moves the items of map ``old_name`` to ``new_name``, replacing any it had."""
+    delete_map_items(cursor, new_name)
+    cursor.execute(
+        "UPDATE map_items SET map_name = ? WHERE map_name = ?", (new_name, old_name)
+    )
+
+# Columns that hold paths or serialized map state, never worth searching
+_UNSEARCHABLE_FIELDS = {"Portrait", "Image", "FogMaskPath", "Tokens", "Attachment"}
+_SEARCHABLE_TYPES = ("text", "longtext", "list", "list_longtext")
+
+def searchable_fields(entity_name):
+    """
+    Returns the columns indexed as the searchable body of an entity: every
+    text-like field except the key (indexed as the name) and file paths.
+    """
+    fields = _load_template_fields(entity_name)
+    return [
+        field["name"] for field in fields[1:]
+        if field["type"] in _SEARCHABLE_TYPES and field["name"] not in _UNSEARCHABLE_FIELDS
+    ]
+
+def ensure_search_index(cursor, entities):
+    """
+    Creates the entity_search FTS5 index if needed, then brings it in line
+    with the rows stored in ``entities``. Runs each time a database is
+    opened or switched to, so rows written without GenericModelWrapper
+    (another process, raw SQL, a restored copy) are re-indexed.
+    Returns False when this SQLite build has no FTS5 support.
+    """
+    cursor.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name='entity_search'"
+    )
+    created = not cursor.fetchone()
+    if created:
+        try:
+            cursor.execute("""
+                CREATE VIRTUAL TABLE entity_search USING fts5(
+                    name, body,
+                    tokenize = 'unicode61 remove_diacritics 2',
+                    prefix = '2 3'
+                )""")
+        except sqlite3.OperationalError as e:
+            logging.warning("Full-text search unavailable (no FTS5): %s", e)
+            return False
+    # Maps FTS rowids to (entity type, key) so rows can be replaced by id
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS entity_search_docs (
+            id   INTEGER PRIMARY KEY,
+            type TEXT NOT NULL,
+            key  TEXT NOT NULL,
+            UNIQUE(type, key)
+        )""")
+    if created:
+        cursor.execute("DELETE FROM entity_search_docs")
+    try:
+        for ent in entities:
+            reconcile_search_index(cursor, ent)
+    except sqlite3.OperationalError as e:
+        logging.warning("Search index not reconciled: %s", e)
+        return False
+    return True
+
+def reconcile_search_index(cursor, ent):
+    """
+    Re-indexes the rows of ``ent`` whose full-text entry differs from what
+    is stored, and drops the entries of rows that no longer exist. Returns
+    the number of entries fixed.
+    """
+    stored = {
+        key: (name, body) for key, name, body in cursor.execute(
+            "SELECT d.key, s.name, s.body FROM entity_search_docs d "
+            "JOIN entity_search s ON s.rowid = d.id WHERE d.type = ?", (ent,)
+        ).fetchall()
+    }
+    # Docs whose FTS row is missing are re-indexed or dropped below too
+    for (key,) in cursor.execute(
+        "SELECT key FROM entity_search_docs WHERE type = ?", (ent,)
+    ).fetchall():
+        stored.setdefault(key, None)
+
+    pk = load_schema_from_json(ent)[0][0]
+    fields = searchable_fields(ent)
+    cols = [pk] + fields
+    stale = []
+    for values in cursor.execute(f"SELECT {', '.join(cols)} FROM {ent}").fetchall():
+        row = dict(zip(cols, values))
+        if row[pk] is None:
+            continue
+        if stored.pop(row[pk], None) != _search_entry(row, pk, fields):
+            stale.append(row)
+    # What is left belongs to rows that are gone
+    gone = list(stored)
+    if gone:
+        delete_search_index(cursor, ent, gone)
+    if stale:
+        write_search_index(cursor, ent, stale, pk, fields)
+    if gone or stale:
+        logging.info("Re-indexed %d %s row(s) for search", len(gone) + len(stale), ent)
+    return len(gone) + len(stale)
+
+def _search_entry(row, key_field, fields):
+    # (name, body) as stored in entity_search for one row
+    return (
+        _plain_text(row.get(key_field)),
+        "\n".join(_plain_text(row.get(f)) for f in fields),
+    )
+
+def _plain_text(value):
+    # Rich text is {"text": ..., "formatting": ...}; lists hold names or rich text
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        if value[:1] in ("{", "["):
+            try:
+                return _plain_text(json.loads(value))
+            except json.JSONDecodeError:
+                return value
+        return value
+    if isinstance(value, dict):
+        return _plain_text(value.get("text", ""))
+    if isinstance(value, list):
+        return "\n".join(_plain_text(v) for v in value)
+    return str(value)
+
+def write_search_index(cursor, src_type, rows, key_field, fields):
+    """
+    Replaces the full-text entries of the given rows. ``fields`` is
+    searchable_fields(src_type). Does nothing if the index does not exist.
+    """
+    src_type = src_type.lower()
+    try:
+        for row in rows:
+            key = row.get(key_field)
+            if key is None:
+                continue
+            cursor.execute(
+                "INSERT OR IGNORE INTO entity_search_docs (type, key) VALUES (?, ?)",
+                (src_type, key)
+            )
+            doc_id = cursor.execute(
+                "SELECT id FROM entity_search_docs WHERE type = ? AND key = ?",
+                (src_type, key)
+            ).fetchone()[0]
+            cursor.execute("DELETE FROM entity_search WHERE rowid = ?", (doc_id,))
+            cursor.execute(
+                "INSERT INTO entity_search (rowid, name, body) VALUES (?, ?, ?)",
+                (doc_id,) + _search_entry(row, key_field, fields)
+            )
+    except sqlite3.OperationalError as e:
+        logging.debug("Search index not updated for %s: %s", src_type, e)
+
+def delete_search_index(cursor, src_type, src_keys=None):
+    """
+    Removes the full-text entries of the given rows, or of the whole table
+    when ``src_keys`` is None.
+    """
+    src_type = src_type.lower()
+    try:
+        if src_keys is None:
+            cursor.execute(
+                "DELETE FROM entity_search WHERE rowid IN "
+                "(SELECT id FROM entity_search_docs WHERE type = ?)",
+                (src_type,)
+            )
+            cursor.execute("DELETE FROM entity_search_docs WHERE type = ?", (src_type,))
+            return
+        for key in src_keys:
+            found = cursor.execute(
+                "SELECT id FROM entity_search_docs WHERE type = ? AND key = ?",
+                (src_type, key)
+            ).fetchone()
+            if found:
+                cursor.execute("DELETE FROM entity_search WHERE rowid = ?", (found[0],))
+                cursor.execute("DELETE FROM entity_search_docs WHERE id = ?", (found[0],))
+    except sqlite3.OperationalError as e:
+        logging.debug("Search index not updated for %s: %s", src_type, e)
+
+def _fts_query(text):
+    # Every word must match, each as a prefix: "dres fil" -> "dres"* AND "fil"*
+    words = re.findall(r"\w+", text, flags=re.UNICODE)
+    return " AND ".join(f'"{w}"*' for w in words)
+
+def search(query, types=None, limit=50):
+    """
+    Ranked, prefix-matching full-text search across all entity tables.
+    ``types`` restricts the tables searched (e.g. ["npcs", "places"]);
+    ``limit=None`` returns every match. Names weigh more than body text.
+    Returns [(table, key), …] best first, or None when the index is
+    unavailable or the query has no words, so callers can fall back to
+    scanning.
+    """
+    match = _fts_query(query)
+    if not match:
+        return None
+    sql = (
+        "SELECT d.type, d.key FROM entity_search "
+        "JOIN entity_search_docs d ON d.id = entity_search.rowid "
+        "WHERE entity_search MATCH ?"
+    )
+    params = [match]
+    if types:
+        types = [t.lower() for t in types]
+        sql += f" AND d.type IN ({', '.join('?' for _ in types)})"
+        params.extend(types)
+    sql += " ORDER BY bm25(entity_search, 10.0, 1.0)"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(int(limit))
+    try:
+        with read_connection() as conn:
+            return [(row[0], row[1]) for row in conn.execute(sql, params).fetchall()]
+    except sqlite3.OperationalError as e:
+        logging.debug("Full-text search failed for %r: %s", query, e)
+        return None
+
 if __name__ == "__main__":
     initialize_db()
     print("Database initialized.")
\ No newline at end of file
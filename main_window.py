@@ -1,6 +1,5 @@
 import os
 import json
-import sqlite3
 import subprocess
 import time
 import requests
@@ -32,7 +31,8 @@ from modules.scenarios.scenario_importer import ScenarioImportWindow
 from modules.scenarios.scenario_generator_view import ScenarioGeneratorView
 from modules.generic.export_for_foundry import preview_and_export_foundry
 from modules.helpers import text_helpers
-from db.db import load_schema_from_json, initialize_db
+from db.db import load_schema_from_json, initialize_db, update_table_schema, read_connection, write_connection, close_all_connections
+from modules.maps.services.map_writer import flush_map_writers
 from modules.factions.faction_graph_editor import FactionGraphEditor
 from modules.pcs.display_pcs import display_pcs_in_banner
 from modules.generic.generic_list_selection_view import GenericListSelectionView
@@ -732,80 +732,84 @@ class MainWindow(ctk.CTk):
         if not new_db_path:
             return
 
-        # 2) Persist to config so get_connection()/init_db() will pick it up
+        # 2) Persist to config so get_connection()/init_db() will pick it up,
+        #    once map edits queued for the old campaign are written
+        flush_map_writers()
         ConfigHelper.set("Database", "path", new_db_path)
 
-        # 3) Open a fresh connection and create all tables based on JSON templates
-        conn = sqlite3.connect(new_db_path)
-        cursor = conn.cursor()
-
-        # For each entity, load its template and build a CREATE TABLE
-        for entity in ("pcs","npcs", "scenarios", "factions",
-                    "places", "objects", "creatures", "informations","clues", "maps"):
-
-            tpl = load_template(entity)   # loads modules/<entity>/<entity>_template.json
-            cols = []
-            for i, field in enumerate(tpl["fields"]):
-                name = field["name"]
-                ftype = field["type"]
-                # map JSON -> SQL
-                if ftype in ("text", "longtext"):
-                    sql_type = "TEXT"
-                elif ftype == "boolean":
-                    sql_type = "BOOLEAN"
-                elif ftype == "list":
-                    # we store lists as JSON strings
-                    sql_type = "TEXT"
-                elif ftype == "file":
-                    # we store lists as JSON strings
-                    sql_type = "TEXT"
-                else:
-                    sql_type = "TEXT"
+        # 3) Drop pooled handles to the old campaign, then create all tables
+        #    based on JSON templates through the pooled write connection
+        close_all_connections()
+        with write_connection() as conn:
+            cursor = conn.cursor()
+
+            # For each entity, load its template and build a CREATE TABLE
+            for entity in ("pcs","npcs", "scenarios", "factions",
+                        "places", "objects", "creatures", "informations","clues", "maps"):
+
+                tpl = load_template(entity)   # loads modules/<entity>/<entity>_template.json
+                cols = []
+                for i, field in enumerate(tpl["fields"]):
+                    name = field["name"]
+                    ftype = field["type"]
+                    # map JSON -> SQL
+                    if ftype in ("text", "longtext"):
+                        sql_type = "TEXT"
+                    elif ftype == "boolean":
+                        sql_type = "BOOLEAN"
+                    elif ftype == "list":
+                        # we store lists as JSON strings
+                        sql_type = "TEXT"
+                    elif ftype == "file":
+                        # we store lists as JSON strings
+                        sql_type = "TEXT"
+                    else:
+                        sql_type = "TEXT"
 
-                # first field is primary key
-                if i == 0:
-                    cols.append(f"{name} {sql_type} PRIMARY KEY")
-                else:
-                    cols.append(f"{name} {sql_type}")
-
-            ddl = f"CREATE TABLE IF NOT EXISTS {entity} ({', '.join(cols)})"
-            cursor.execute(ddl)
-
-        # 4) Re‑create the graph viewer tables
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS nodes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                npc_name TEXT,
-                x INTEGER,
-                y INTEGER,
-                color TEXT
-            )
-        """)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS links (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                npc_name1 TEXT,
-                npc_name2 TEXT,
-                text TEXT,
-                arrow_mode TEXT
-            )
-        """)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS shapes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                type TEXT,
-                x INTEGER,
-                y INTEGER,
-                w INTEGER,
-                h INTEGER,
-                color TEXT,
-                tag TEXT,
-                z INTEGER
-            )
-        """)
+                    # first field is primary key
+                    if i == 0:
+                        cols.append(f"{name} {sql_type} PRIMARY KEY")
+                    else:
+                        cols.append(f"{name} {sql_type}")
+
+                ddl = f"CREATE TABLE IF NOT EXISTS {entity} ({', '.join(cols)})"
+                cursor.execute(ddl)
+
+            # 4) Re‑create the graph viewer tables
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS nodes (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    npc_name TEXT,
+                    x INTEGER,
+                    y INTEGER,
+                    color TEXT
+                )
+            """)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS links (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    npc_name1 TEXT,
+                    npc_name2 TEXT,
+                    text TEXT,
+                    arrow_mode TEXT
+                )
+            """)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS shapes (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    type TEXT,
+                    x INTEGER,
+                    y INTEGER,
+                    w INTEGER,
+                    h INTEGER,
+                    color TEXT,
+                    tag TEXT,
+                    z INTEGER
+                )
+            """)
 
-        conn.commit()
-        conn.close()
+            # Link table and any columns the templates added since
+            update_table_schema(conn, cursor)
 
         # 5) Re‑initialise your in‑memory wrappers & update the label
         #    (and run any schema‐migrations if you still need them)
@@ -894,12 +898,8 @@ class MainWindow(ctk.CTk):
         ctk.CTkButton(top, text="Continue", command=confirm_model_and_continue).pack(pady=10)
 
     def generate_portraits_continue_npcs(self):
-        db_path = ConfigHelper.get("Database", "path", fallback="default_campaign.db")
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM npcs")
-        npc_rows = cursor.fetchall()
+        with read_connection() as conn:
+            npc_rows = conn.execute("SELECT * FROM npcs").fetchall()
         modified = False
         for npc in npc_rows:
             portrait = npc["Portrait"] if npc["Portrait"] is not None else ""
@@ -907,14 +907,15 @@ class MainWindow(ctk.CTk):
                 npc_dict = dict(npc)
                 self.generate_portrait_for_npc(npc_dict)
                 if npc_dict.get("Portrait"):
-                    cursor.execute("UPDATE npcs SET Portrait = ? WHERE Name = ?", (npc_dict["Portrait"], npc["Name"]))
+                    # Write each portrait as soon as it exists so the write lock
+                    # is never held while SwarmUI is generating.
+                    with write_connection() as conn:
+                        conn.execute("UPDATE npcs SET Portrait = ? WHERE Name = ?", (npc_dict["Portrait"], npc["Name"]))
                     modified = True
         if modified:
-            conn.commit()
             print("Updated NPC database with generated portraits.")
         else:
             print("No NPCs were missing portraits.")
-        conn.close()
 
     def generate_missing_creature_portraits(self):
         def confirm_model_and_continue():
@@ -936,12 +937,8 @@ class MainWindow(ctk.CTk):
         ctk.CTkButton(top, text="Continue", command=confirm_model_and_continue).pack(pady=10)
 
     def generate_portraits_continue_creatures(self):
-        db_path = ConfigHelper.get("Database", "path", fallback="default_campaign.db")
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM creatures")
-        creature_rows = cursor.fetchall()
+        with read_connection() as conn:
+            creature_rows = conn.execute("SELECT * FROM creatures").fetchall()
         modified = False
         for creature in creature_rows:
             portrait = creature["Portrait"] if creature["Portrait"] is not None else ""
@@ -949,14 +946,13 @@ class MainWindow(ctk.CTk):
                 creature_dict = dict(creature)
                 self.generate_portrait_for_creature(creature_dict)
                 if creature_dict.get("Portrait"):
-                    cursor.execute("UPDATE creatures SET Portrait = ? WHERE Name = ?", (creature_dict["Portrait"], creature_dict["Name"]))
+                    with write_connection() as conn:
+                        conn.execute("UPDATE creatures SET Portrait = ? WHERE Name = ?", (creature_dict["Portrait"], creature_dict["Name"]))
                     modified = True
         if modified:
-            conn.commit()
             print("Updated creature database with generated portraits.")
         else:
             print("No creatures were missing portraits.")
-        conn.close()
 
     def generate_portrait_for_npc(self, npc):
         self.launch_swarmui()
@@ -1250,30 +1246,26 @@ class MainWindow(ctk.CTk):
         if not portrait_mapping:
             print("No portrait mapping was built.")
             return
-        db_path = ConfigHelper.get("Database", "path", fallback="default_campaign.db")
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute("SELECT Name, Portrait FROM npcs")
-        npc_rows = cursor.fetchall()
-        modified = False
-        for npc in npc_rows:
-            npc_name = npc["Name"].strip()
-            normalized_npc = self.normalize_name(npc_name)
-            if normalized_npc in portrait_mapping:
-                portrait_file = portrait_mapping[normalized_npc]
-                if not npc["Portrait"] or npc["Portrait"].strip() == "":
-                    campaign_dir = ConfigHelper.get_campaign_dir()
-                    new_portrait_path = os.path.join(campaign_dir, "assets", "portraits", portrait_file)
-                    cursor.execute("UPDATE npcs SET Portrait = ? WHERE Name = ?", (new_portrait_path, npc_name))
-                    print(f"Associated portrait '{portrait_file}' with NPC '{npc_name}'")
-                    modified = True
+        with write_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT Name, Portrait FROM npcs")
+            npc_rows = cursor.fetchall()
+            modified = False
+            for npc in npc_rows:
+                npc_name = npc["Name"].strip()
+                normalized_npc = self.normalize_name(npc_name)
+                if normalized_npc in portrait_mapping:
+                    portrait_file = portrait_mapping[normalized_npc]
+                    if not npc["Portrait"] or npc["Portrait"].strip() == "":
+                        campaign_dir = ConfigHelper.get_campaign_dir()
+                        new_portrait_path = os.path.join(campaign_dir, "assets", "portraits", portrait_file)
+                        cursor.execute("UPDATE npcs SET Portrait = ? WHERE Name = ?", (new_portrait_path, npc_name))
+                        print(f"Associated portrait '{portrait_file}' with NPC '{npc_name}'")
+                        modified = True
         if modified:
-            conn.commit()
             print("NPC database updated with associated portraits.")
         else:
             print("No NPC records were updated. Either all have portraits or no matches were found.")
-        conn.close()
 
     def _on_ctrl_f(self, event=None):
         """Global Ctrl+F binding: only opens search when GM screen is active."""
@@ -1314,6 +1306,7 @@ class MainWindow(ctk.CTk):
                 self.map_controller.close_web_display()
             except Exception:
                 logging.exception("Error while closing web display")
+            flush_map_writers()
             top.destroy()
 
         top.protocol("WM_DELETE_WINDOW", _on_close)
@@ -1321,3 +1314,5 @@ class MainWindow(ctk.CTk):
 if __name__ == "__main__":
     app = MainWindow()
     app.mainloop()
+    flush_map_writers()
+    close_all_connections()
@@ -12,8 +12,7 @@ def open_creature_editor_window(creature_name):
     """
     # 1. Load the NPC data from the "creatures" file.
     creature_wrapper = GenericModelWrapper("creatures")
-    items = creature_wrapper.load_items()
-    creature_item = next((i for i in items if i.get("Name") == creature_name), None)
+    creature_item = creature_wrapper.get_by_key(creature_name)
     if not creature_item:
         messagebox.showerror("Error", f"NPC '{creature_name}' not found.")
         return
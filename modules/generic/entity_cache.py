@@ -0,0 +1,152 @@
+import copy
+import logging
+import threading
+
+from db.db import data_version
+
+
+class EntityCache:
+    """
+    Process-wide, per-table cache of decoded entity rows keyed by primary key.
+
+    Rows are loaded once through the owning wrapper's loader and then served
+    from memory. The wrapper's own writes update the cache in place; writes
+    made by other connections (the Flask web viewer, scripts) are detected
+    through db.data_version() and trigger a full reload on the next access.
+
+    Subscribers are called as ``callback(changed_keys, deleted_keys)``;
+    ``changed_keys`` is None when the whole table was reloaded.
+    """
+
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    @classmethod
+    def for_table(cls, table, key_field, loader):
+        with cls._instances_lock:
+            cache = cls._instances.get(table)
+            if cache is None:
+                cache = cls(table, key_field, loader)
+                cls._instances[table] = cache
+            return cache
+
+    def __init__(self, table, key_field, loader):
+        self.table = table
+        self.key_field = key_field
+        self._loader = loader
+        self._rows = None        # key -> row dict, in table order
+        self._stamp = None
+        self._lock = threading.RLock()
+        self._subscribers = []
+
+    # --- Reads ---------------------------------------------------------------
+    def get(self, key):
+        """Return a copy of the row with this primary key, or None."""
+        self._ensure_fresh()
+        with self._lock:
+            row = self._rows.get(key)
+            return _detached(row) if row is not None else None
+
+    def all(self, fields=None):
+        """Return copies of every row in table order, optionally only ``fields``."""
+        self._ensure_fresh()
+        with self._lock:
+            if fields is None:
+                return [_detached(row) for row in self._rows.values()]
+            return [
+                {f: _detached_value(row[f]) for f in fields if f in row}
+                for row in self._rows.values()
+            ]
+
+    def is_loaded(self):
+        """True when the rows are in memory and still match the database."""
+        return self._rows is not None and data_version() == self._stamp
+
+    def keys(self):
+        self._ensure_fresh()
+        with self._lock:
+            return list(self._rows.keys())
+
+    def invalidate(self):
+        """Forget every row; the next access reloads the table."""
+        with self._lock:
+            self._rows = None
+            self._stamp = None
+
+    def _ensure_fresh(self):
+        # Read the stamp first: a write landing during the load bumps it again
+        stamp = data_version()
+        reloaded = False
+        with self._lock:
+            if self._rows is None or stamp != self._stamp:
+                reloaded = self._rows is not None
+                rows = self._loader()
+                self._rows = {row.get(self.key_field): row for row in rows}
+                self._stamp = stamp
+        if reloaded:
+            self._notify(None, ())
+
+    # --- Writes made through the wrapper ------------------------------------
+    def apply_upserts(self, rows):
+        with self._lock:
+            keys = [row.get(self.key_field) for row in rows]
+            if self._rows is not None:
+                for key, row in zip(keys, rows):
+                    # INSERT OR REPLACE drops columns that were not supplied
+                    self._rows[key] = dict(row)
+        self._notify(keys, ())
+
+    def apply_deletes(self, keys):
+        with self._lock:
+            if self._rows is not None:
+                for key in keys:
+                    self._rows.pop(key, None)
+        self._notify((), list(keys))
+
+    def apply_patch(self, key, fields):
+        with self._lock:
+            row = self._rows.get(key) if self._rows is not None else None
+            if row is not None:
+                row.update(fields)
+        self._notify([key], ())
+
+    def apply_replace_all(self, rows):
+        with self._lock:
+            self._rows = {row.get(self.key_field): dict(row) for row in rows}
+        self._notify(None, ())
+
+    # --- Change notifications -----------------------------------------------
+    def subscribe(self, callback):
+        """Register ``callback(changed_keys, deleted_keys)``; returns an unsubscribe function."""
+        with self._lock:
+            self._subscribers.append(callback)
+
+        def unsubscribe():
+            with self._lock:
+                if callback in self._subscribers:
+                    self._subscribers.remove(callback)
+        return unsubscribe
+
+    def _notify(self, changed, deleted):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(changed, deleted)
+            except Exception:
+                logging.exception("Entity cache subscriber failed for %s", self.table)
+
+
+def _detached_value(value):
+    # Lists and dicts (rich text, link lists) must not be shared with callers
+    return copy.deepcopy(value) if isinstance(value, (list, dict)) else value
+
+
+def _detached(row):
+    """A copy of a cached row sharing no list or dict with it."""
+    # copy() keeps lazily decoded columns undecoded; they decode into the copy
+    row = row.copy()
+    for key, value in dict.items(row):
+        if isinstance(value, (list, dict)):
+            dict.__setitem__(row, key, copy.deepcopy(value))
+    return row
@@ -105,9 +105,7 @@ def open_entity_tab(entity_type, name, master):
         messagebox.showerror("Error", f"Unknown type '{entity_type}'")
         return
 
-    items = wrapper.load_items()
-    key_field = "Title" if entity_type == "Scenarios" else "Name"
-    item = next((i for i in items if i.get(key_field) == name), None)
+    item = wrapper.get_by_key(name)
     if not item:
         messagebox.showerror("Error", f"{entity_type[:-1]} '{name}' not found.")
         return
@@ -176,8 +174,7 @@ def insert_npc_table(parent, header, npc_names, open_entity_callback):
 
     # load data
     wrapper = GenericModelWrapper("npcs")
-    all_npcs = wrapper.load_items()
-    npc_map   = {npc["Name"]: npc for npc in all_npcs}
+    npc_map   = wrapper.get_many(npc_names)
 
     for r, name in enumerate(npc_names, start=1):
         data = npc_map.get(name, {}) or {}
@@ -266,8 +263,7 @@ def insert_creature_table(parent, header, creature_names, open_entity_callback):
             .grid(row=0, column=c, padx=5, pady=1, sticky="nsew")
 
     wrapper       = GenericModelWrapper("creatures")
-    all_creatures = wrapper.load_items()
-    creature_map  = {cr["Name"]: cr for cr in all_creatures}
+    creature_map  = wrapper.get_many(creature_names)
 
     for r, name in enumerate(creature_names, start=1):
         data = creature_map.get(name, {}) or {}
@@ -362,10 +358,7 @@ def insert_places_table(parent, header, place_names, open_entity_callback):
             .grid(row=0, column=c, padx=5, pady=1, sticky="nsew")
 
     # load place data once
-    place_map = {
-        pl["Name"]: pl
-        for pl in GenericModelWrapper("places").load_items()
-    }
+    place_map = GenericModelWrapper("places").get_many(place_names)
 
     # populate rows
     for r, name in enumerate(place_names, start=1):
@@ -594,22 +587,20 @@ def create_scenario_detail_frame(entity_type, scenario_item, master, open_entity
     return frame
 
 def EditWindow(self, item, template, model_wrapper, creation_mode=False, on_save=None):
-    # load the full list so saves actually persist
-    items = model_wrapper.load_items()
-    key_field = "Title" if model_wrapper.entity_type == "scenarios" else "Name"
-    # 3) Find the same dict in our list and edit *that*
-    target = next((it for it in items if it.get(key_field) == item.get(key_field)), None)
+    key_field = model_wrapper.key_field
+    # 3) Edit the stored row so saves start from what is in the database
+    target = model_wrapper.get_by_key(item.get(key_field))
     if target is None:
-        # Fallback: fall back to editing the passed-in dict, and append if new
+        # Fallback: edit the passed-in dict, it will be inserted on save
         target = item
-        items.append(target)
+    old_key = target.get(key_field)
     editor = GenericEditorWindow(
         self, target, template,
         model_wrapper, creation_mode
     )
     self.master.wait_window(editor)
     if getattr(editor, "saved", False):
-        model_wrapper.save_items(items)
+        model_wrapper.rename_item(old_key, target)
         # let the detail frame know it should refresh itself
         if callable(on_save):
             on_save(target)
@@ -725,9 +716,7 @@ def create_entity_detail_frame(entity_type, entity, master, open_entity_callback
 def open_entity_window(entity_type, name):
         # Look up the entity using the wrappers dictionary.
         wrapper = wrappers[entity_type]
-        items = wrapper.load_items()
-        key = "Title" if entity_type == "Scenarios" else "Name"
-        entity = next((i for i in items if i.get(key) == name), None)
+        entity = wrapper.get_by_key(name)
         if not entity:
             messagebox.showerror("Error", f"{entity_type[:-1]} '{name}' not found.")
             return
@@ -13,8 +13,7 @@ def open_detached_npc(npc_name):
     """
     # 1. Load the NPC from JSON
     npc_wrapper = GenericModelWrapper("npcs")
-    items = npc_wrapper.load_items()
-    item = next((i for i in items if i.get("Name") == npc_name), None)
+    item = npc_wrapper.get_by_key(npc_name)
     if not item:
         messagebox.showerror("Error", f"NPC '{npc_name}' not found.")
         return
@@ -43,8 +42,7 @@ def open_detached_pc(pc_name):
         """
         # 1. Load the NPC from JSON
         pc_wrapper = GenericModelWrapper("pcs")
-        items = pc_wrapper.load_items()
-        item = next((i for i in items if i.get("Name") == pc_name), None)
+        item = pc_wrapper.get_by_key(pc_name)
         if not item:
                 messagebox.showerror("Error", f"PC '{pc_name}' not found.")
                 return
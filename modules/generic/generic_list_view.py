@@ -1,5 +1,6 @@
 import re
 import time
+import threading
 import os, ctypes
 from ctypes import wintypes
 import customtkinter as ctk
@@ -18,6 +19,10 @@ PORTRAIT_FOLDER = os.path.join(ConfigHelper.get_campaign_dir(), "assets", "portr
 MAX_PORTRAIT_SIZE = (1024, 1024)
 ctk.set_appearance_mode("Dark")
 ctk.set_default_color_theme("blue")
+# Rows kept in the tree above and below the visible ones
+VIRTUAL_BUFFER_ROWS = 50
+ROW_HEIGHT = 25
+FILTER_DEBOUNCE_MS = 150
 
 
 def sanitize_id(s):
@@ -121,6 +126,9 @@ class GenericListView(ctk.CTkFrame):
         search_entry = ctk.CTkEntry(search_frame, textvariable=self.search_var)
         search_entry.pack(side="left", fill="x", expand=True, padx=5)
         search_entry.bind("<Return>", lambda e: self.filter_items(self.search_var.get()))
+        self._filter_job = None
+        self._filter_query = ""
+        self.search_var.trace_add("write", lambda *_: self._schedule_filter())
         ctk.CTkButton(search_frame, text="Filter",
             command=lambda: self.filter_items(self.search_var.get()))\
         .pack(side="left", padx=5)
@@ -143,6 +151,21 @@ class GenericListView(ctk.CTkFrame):
         self.view_toggle.set("Table")
         self.view_toggle.pack(side="left", padx=5)
 
+        # --- Virtual scrolling state ---
+        # _rows is the flattened list the tree would show; only the slice
+        # around _view_start is actually inserted in the Treeview
+        self._rows = []
+        self._rendered = []          # global row index of each tree row
+        self._render_range = (0, 0)
+        self._view_start = 0
+        self._iid_items = {}
+        self._group_iids = {}
+        self._open_groups = set()
+        self._display_cache = {}
+        self._search_cache = {}
+        self._rendering = False
+        self._render_pending = False
+
         # --- Treeview setup ---
         self.tree_frame = ctk.CTkFrame(self, fg_color="#2B2B2B")
         self.tree_frame.pack(fill="both", expand=True, padx=5, pady=5)
@@ -155,7 +178,7 @@ class GenericListView(ctk.CTkFrame):
                         background="#2B2B2B",
                         fieldbackground="#2B2B2B",
                         foreground="white",
-                        rowheight=25,
+                        rowheight=ROW_HEIGHT,
                         font=("Segoe UI", 10, "bold"))
         style.configure("Custom.Treeview.Heading",
                         background="#2B2B2B",
@@ -183,12 +206,13 @@ class GenericListView(ctk.CTkFrame):
 
         self._apply_column_settings()
 
-        vsb = ttk.Scrollbar(self.tree_frame, orient="vertical", command=self.tree.yview)
+        # The vertical scrollbar spans the whole list, not just the rendered rows
+        self.vsb = ttk.Scrollbar(self.tree_frame, orient="vertical", command=self._on_vscroll)
         hsb = ttk.Scrollbar(self.tree_frame, orient="horizontal", command=self.tree.xview)
-        self.tree.configure(yscrollcommand=vsb.set, xscrollcommand=hsb.set)
+        self.tree.configure(yscrollcommand=self._on_tree_yscroll, xscrollcommand=hsb.set)
 
         self.tree.grid(row=0, column=0, sticky="nsew")
-        vsb.grid(row=0, column=1, sticky="ns")
+        self.vsb.grid(row=0, column=1, sticky="ns")
         hsb.grid(row=1, column=0, sticky="ew")
 
         # --- Card view setup ---
@@ -202,6 +226,9 @@ class GenericListView(ctk.CTkFrame):
         self.tree.bind("<ButtonRelease-1>", self.on_button_release)
         self.tree.bind("<Control-c>", lambda e: self.copy_item(self.tree.focus()))
         self.tree.bind("<Control-v>", lambda e: self.paste_item(self.tree.focus() or None))
+        self.tree.bind("<<TreeviewOpen>>", lambda e: self._on_group_toggle(True))
+        self.tree.bind("<<TreeviewClose>>", lambda e: self._on_group_toggle(False))
+        self.tree.bind("<Configure>", lambda e: self._check_window())
         self.copied_item = None
         self.dragging_iid = None
         self.dragging_column = None
@@ -231,6 +258,59 @@ class GenericListView(ctk.CTkFrame):
 
         self.refresh_list()
 
+        # Follow edits made to this table from other views or processes
+        self._unsubscribe_cache = self.model_wrapper.subscribe(self._on_entity_cache_change)
+        self.bind("<Destroy>", self._on_destroy, add="+")
+
+    def _on_destroy(self, event):
+        if event.widget is self and self._unsubscribe_cache:
+            self._unsubscribe_cache()
+            self._unsubscribe_cache = None
+
+    def _on_entity_cache_change(self, changed_keys, deleted_keys):
+        """Merge rows changed elsewhere into the list, touching only those rows."""
+        if threading.current_thread() is not threading.main_thread():
+            self.after(0, self._on_entity_cache_change, changed_keys, deleted_keys)
+            return
+        if not self.winfo_exists():
+            return
+        if changed_keys is None:
+            self._display_cache.clear()
+            self._search_cache.clear()
+            self.items = self.model_wrapper.load_items()
+            self._load_list_order()
+            self.filter_items(self.search_var.get())
+            return
+
+        deleted = set(deleted_keys)
+        kept = [it for it in self.items if it.get(self.unique_field) not in deleted]
+        structure_changed = len(kept) != len(self.items)
+        self.items = kept
+        positions = {it.get(self.unique_field): idx for idx, it in enumerate(self.items)}
+        updated = []
+        for key, fresh in self.model_wrapper.get_many(changed_keys).items():
+            idx = positions.get(key)
+            if idx is None:
+                self.items.append(fresh)
+                structure_changed = True
+            elif self.items[idx] != fresh:
+                # Update in place so filtered_items keeps pointing at it
+                self.items[idx].clear()
+                self.items[idx].update(fresh)
+                updated.append(self.items[idx])
+
+        if structure_changed or (updated and (self.group_column or self.search_var.get().strip())):
+            self.filter_items(self.search_var.get())
+            return
+        for item in updated:
+            self._invalidate_row(item)
+            iid = self._get_base_id(item)
+            if self.tree.exists(iid):
+                text, values = self._display_row(item)
+                self.tree.item(iid, text=text, values=values)
+        if updated and self.current_view == "Cards":
+            self.refresh_cards()
+
     def show_portrait_window(self, iid):
         item, _ = self._find_item_by_iid(iid)
         if not item:
@@ -241,16 +321,223 @@ class GenericListView(ctk.CTkFrame):
         show_portrait(path, title)
 
     def refresh_list(self):
-        self.tree.delete(*self.tree.get_children())
-        self.batch_index = 0
-        self.batch_size = 50
-        if self.group_column:
-            self.insert_grouped_items()
-        else:
-            self.insert_next_batch()
+        self._build_rows()
+        self._render_window()
         if self.current_view == "Cards":
             self.refresh_cards()
 
+    # --- Virtual scrolling ---------------------------------------------------
+    def _build_rows(self):
+        """
+        Flatten filtered_items into the rows the tree shows: ("item", item,
+        group) entries, preceded when grouping by ("group", value, members)
+        headers whose members are listed only while the group is open.
+        """
+        if not self.group_column:
+            self._rows = [("item", it, None) for it in self.filtered_items]
+            return
+        grouped = {}
+        # Linked list columns (e.g. Factions) are grouped from the indexed
+        # entity_links table instead of decoding every row's JSON list
+        link_fields = dict(self.model_wrapper.link_fields)
+        links = (
+            self.model_wrapper.link_groups(self.group_column)
+            if self.group_column in link_fields else None
+        )
+        for item in self.filtered_items:
+            if links is not None:
+                key = ", ".join(links.get(item.get(self.unique_field), [])) or "Unknown"
+            else:
+                key = self.clean_value(item.get(self.group_column, "")) or "Unknown"
+            grouped.setdefault(key, []).append(item)
+        rows = []
+        for group_val in sorted(grouped.keys()):
+            members = grouped[group_val]
+            rows.append(("group", group_val, members))
+            if group_val in self._open_groups:
+                rows.extend(("item", it, group_val) for it in members)
+        self._rows = rows
+
+    def _visible_row_count(self):
+        # Minus one row for the headings
+        return max(1, self.tree.winfo_height() // ROW_HEIGHT - 1)
+
+    def _render_window(self):
+        """Insert only the rows around _view_start (plus a buffer) in the tree."""
+        self._render_pending = False
+        total = len(self._rows)
+        visible = self._visible_row_count()
+        start = max(0, min(self._view_start, total - visible))
+        first = max(0, start - VIRTUAL_BUFFER_ROWS)
+        last = min(total, start + visible + VIRTUAL_BUFFER_ROWS)
+
+        # Selection and focus survive the re-render when their rows stay in view
+        selected = [self._iid_items.get(i) for i in self.tree.selection()]
+        focused = self._iid_items.get(self.tree.focus())
+
+        self._rendering = True
+        try:
+            self.tree.delete(*self.tree.get_children())
+            self._iid_items = {}
+            self._group_iids = {}
+            self._rendered = []
+            parents = {}
+            for idx in range(first, last):
+                kind, value, extra = self._rows[idx]
+                if kind == "group":
+                    parents[value] = self._insert_group_row(value)
+                    self._rendered.append(idx)
+                    continue
+                parent = ""
+                if extra is not None:
+                    parent = parents.get(extra)
+                    if parent is None:
+                        # The window starts inside a group: repeat its header
+                        header = idx
+                        while self._rows[header][0] != "group":
+                            header -= 1
+                        parent = parents[extra] = self._insert_group_row(extra)
+                        self._rendered.append(header)
+                if self._insert_item_row(parent, value):
+                    self._rendered.append(idx)
+            self._render_range = (first, last)
+            self._view_start = start
+
+            by_item = {id(it): iid for iid, it in self._iid_items.items()}
+            keep = [by_item[id(it)] for it in selected if it is not None and id(it) in by_item]
+            if keep:
+                self.tree.selection_set(keep)
+            if focused is not None and id(focused) in by_item:
+                self.tree.focus(by_item[id(focused)])
+
+            if self._rendered and start in self._rendered:
+                self.tree.yview_moveto(self._rendered.index(start) / len(self._rendered))
+        finally:
+            self._rendering = False
+        self._update_scrollbar()
+
+    def _insert_group_row(self, group_val):
+        iid = unique_iid(self.tree, sanitize_id(f"group_{group_val}"))
+        is_open = group_val in self._open_groups
+        self.tree.insert("", "end", iid=iid, text=group_val, open=is_open)
+        if not is_open:
+            # Members are not rendered; a placeholder keeps the expand arrow
+            self.tree.insert(iid, "end", iid=f"{iid}__placeholder", text="")
+        self._group_iids[iid] = group_val
+        return iid
+
+    def _insert_item_row(self, parent, item):
+        base_id = self._get_base_id(item) or f"item_{int(time.time()*1000)}"
+        iid = unique_iid(self.tree, base_id)
+        name_text, vals = self._display_row(item)
+        color = self.row_colors.get(base_id)
+        try:
+            self.tree.insert(
+                parent, "end", iid=iid, text=name_text, values=vals,
+                tags=(f"color_{color}",) if color else ()
+            )
+        except Exception as e:
+            print("[ERROR] inserting item:", e, iid, vals)
+            return None
+        self._iid_items[iid] = item
+        return iid
+
+    def _display_row(self, item):
+        """(name text, column values) for an item, cleaned once and cached."""
+        cached = self._display_cache.get(id(item))
+        if cached is None or cached[0] is not item:
+            cached = (
+                item,
+                self.clean_value(item.get(self.unique_field, "")),
+                tuple(self.clean_value(item.get(c, "")) for c in self.columns),
+            )
+            self._display_cache[id(item)] = cached
+        return cached[1], cached[2]
+
+    def _search_text(self, item):
+        """Lowercased cleaned text of all an item's fields, cached like _display_row."""
+        cached = self._search_cache.get(id(item))
+        if cached is None or cached[0] is not item:
+            text = "\n".join(self.clean_value(v).lower() for v in item.values())
+            cached = (item, text)
+            self._search_cache[id(item)] = cached
+        return cached[1]
+
+    def _invalidate_row(self, item):
+        self._display_cache.pop(id(item), None)
+        self._search_cache.pop(id(item), None)
+
+    def _window_exhausted(self):
+        first, last = self._render_range
+        margin = VIRTUAL_BUFFER_ROWS // 2
+        end = self._view_start + self._visible_row_count()
+        return (
+            (first > 0 and self._view_start - first < margin)
+            or (last < len(self._rows) and last - end < margin)
+        )
+
+    def _check_window(self):
+        if self._window_exhausted() and not self._render_pending:
+            self._render_pending = True
+            self.after_idle(self._render_window)
+
+    def _on_tree_yscroll(self, first, last):
+        """The tree scrolled inside the rendered rows (wheel, keys, see())."""
+        if not self._rendering and self._rendered:
+            count = len(self._rendered)
+            top = min(count - 1, max(0, int(float(first) * count + 0.5)))
+            self._view_start = self._rendered[top]
+            self._check_window()
+        self._update_scrollbar()
+
+    def _update_scrollbar(self):
+        total = len(self._rows)
+        if not total:
+            self.vsb.set(0.0, 1.0)
+            return
+        visible = self._visible_row_count()
+        self.vsb.set(self._view_start / total, min(1.0, (self._view_start + visible) / total))
+
+    def _on_vscroll(self, action, *args):
+        """Scrollbar positions are fractions of the full row list."""
+        visible = self._visible_row_count()
+        if action == "moveto":
+            start = int(float(args[0]) * len(self._rows))
+        elif action == "scroll":
+            step = visible if args[1] == "pages" else 1
+            start = self._view_start + int(args[0]) * step
+        else:
+            return
+        self._view_start = max(0, min(start, len(self._rows) - visible))
+        first, last = self._render_range
+        if first <= self._view_start < last and not self._window_exhausted() \
+                and self._view_start in self._rendered:
+            self.tree.yview_moveto(self._rendered.index(self._view_start) / len(self._rendered))
+        else:
+            self._render_window()
+
+    def _on_group_toggle(self, opened):
+        group = self._group_iids.get(self.tree.focus())
+        if group is None:
+            return
+        if opened:
+            self._open_groups.add(group)
+        else:
+            self._open_groups.discard(group)
+        # Tk changes the open state after this event: re-render afterwards
+        self.after_idle(self.refresh_list)
+
+    def _shows_all_items(self):
+        """True when the tree lists self.items unfiltered and in list order."""
+        # Identity check: comparing the dicts would decode every JSON column
+        return len(self.filtered_items) == len(self.items) and all(
+            a is b for a, b in zip(self.filtered_items, self.items)
+        )
+
+    def _row_index(self, iid):
+        """Index in the full row list of a top-level tree row."""
+        return self._rendered[self.tree.index(iid)]
+
     def on_button_press(self, event):
         region = self.tree.identify("region", event.x, event.y)
         if region == "heading":
@@ -289,11 +576,11 @@ class GenericListView(ctk.CTkFrame):
         self._save_column_settings()
 
     def on_tree_click(self, event):
-        if self.group_column or self.filtered_items != self.items:
+        if self.group_column or not self._shows_all_items():
             self.dragging_iid = None
             return
         self.dragging_iid = self.tree.identify_row(event.y)
-        self.start_index = self.tree.index(self.dragging_iid) if self.dragging_iid else None
+        self.start_index = self._row_index(self.dragging_iid) if self.dragging_iid else None
 
     def on_tree_drag(self, event):
         pass
@@ -301,28 +588,24 @@ class GenericListView(ctk.CTkFrame):
     def on_tree_drop(self, event):
         if not self.dragging_iid:
             return
-        if self.group_column or self.filtered_items != self.items:
+        if self.group_column or not self._shows_all_items():
             self.dragging_iid = None
             return
         target_iid = self.tree.identify_row(event.y)
         if not target_iid:
-            target_index = len(self.tree.get_children()) - 1
+            target_index = len(self.items) - 1
         else:
-            target_index = self.tree.index(target_iid)
+            target_index = self._row_index(target_iid)
         if target_index > self.start_index:
             target_index -= 1
-        self.tree.move(self.dragging_iid, '', target_index)
-        id_map = {
-            sanitize_id(str(it.get(self.unique_field, ""))).lower(): idx
-            for idx, it in enumerate(self.items)
-        }
-        old_index = id_map.get(self.dragging_iid)
-        if old_index is not None:
+        old_index = self.start_index
+        if old_index is not None and old_index != target_index:
             item = self.items.pop(old_index)
             self.items.insert(target_index, item)
             self.filtered_items = list(self.items)
-            self.model_wrapper.save_items(self.items)
+            # Row order lives in the config, the table rows are unchanged
             self._save_list_order()
+            self.refresh_list()
         self.dragging_iid = None
 
     def copy_item(self, iid):
@@ -368,58 +651,10 @@ class GenericListView(ctk.CTkFrame):
         else:
             index = len(self.items)
         self.items.insert(index, new_item)
-        self.model_wrapper.save_items(self.items)
+        self.model_wrapper.upsert_item(new_item)
         self._save_list_order()
         self.filter_items(self.search_var.get())
 
-    def insert_next_batch(self):
-        end = min(self.batch_index + self.batch_size, len(self.filtered_items))
-        for i in range(self.batch_index, end):
-            item = self.filtered_items[i]
-            raw = item.get(self.unique_field, "")
-            if isinstance(raw, dict):
-                raw = raw.get("text", "")
-            base_id = sanitize_id(raw or f"item_{int(time.time()*1000)}").lower()
-            iid = unique_iid(self.tree, base_id)
-            name_text = self.clean_value(item.get(self.unique_field, ""))
-            vals = tuple(self.clean_value(item.get(c, "")) for c in self.columns)
-            try:
-                self.tree.insert("", "end", iid=iid, text=name_text, values=vals)
-                color = self.row_colors.get(base_id)
-                if color:
-                    self.tree.item(iid, tags=(f"color_{color}",))
-            except Exception as e:
-                print("[ERROR] inserting item:", e, iid, vals)
-        self.batch_index = end
-        if end < len(self.filtered_items):
-            self.after(50, self.insert_next_batch)
-
-    def insert_grouped_items(self):
-        grouped = {}
-        for item in self.filtered_items:
-            key = self.clean_value(item.get(self.group_column, "")) or "Unknown"
-            grouped.setdefault(key, []).append(item)
-
-        for group_val in sorted(grouped.keys()):
-            base_group_id = sanitize_id(f"group_{group_val}")
-            group_id = unique_iid(self.tree, base_group_id)
-            self.tree.insert("", "end", iid=group_id, text=group_val, open=False)
-            for item in grouped[group_val]:
-                raw = item.get(self.unique_field, "")
-                if isinstance(raw, dict):
-                    raw = raw.get("text", "")
-                base_iid = sanitize_id(raw or f"item_{int(time.time()*1000)}").lower()
-                iid = unique_iid(self.tree, base_iid)
-                name_text = self.clean_value(item.get(self.unique_field, ""))
-                vals = tuple(self.clean_value(item.get(c, "")) for c in self.columns)
-                try:
-                    self.tree.insert(group_id, "end", iid=iid, text=name_text, values=vals)
-                    color = self.row_colors.get(base_iid)
-                    if color:
-                        self.tree.item(iid, tags=(f"color_{color}",))
-                except Exception as e:
-                    print("[ERROR] inserting item:", e, iid, vals)
-
     def clean_value(self, val):
         if val is None:
             return ""
@@ -438,6 +673,7 @@ class GenericListView(ctk.CTkFrame):
             key=lambda x: str(x.get(column_name, "")),
             reverse=not asc
         )
+        self._view_start = 0
         self.refresh_list()
 
     def on_double_click(self, event):
@@ -446,13 +682,14 @@ class GenericListView(ctk.CTkFrame):
             return
         item, _ = self._find_item_by_iid(iid)
         if item:
+            old_key = item.get(self.unique_field)
             editor = GenericEditorWindow(
                 self.master, item, self.template,
                 self.model_wrapper, creation_mode=False
             )
             self.master.wait_window(editor)
             if getattr(editor, "saved", False):
-                self.model_wrapper.save_items(self.items)
+                self._persist_edited_item(item, old_key)
                 self.refresh_list()
 
     def on_right_click(self, event):
@@ -472,13 +709,14 @@ class GenericListView(ctk.CTkFrame):
     def on_card_click(self, iid):
         item, _ = self._find_item_by_iid(iid)
         if item:
+            old_key = item.get(self.unique_field)
             editor = GenericEditorWindow(
                 self.master, item, self.template,
                 self.model_wrapper, creation_mode=False
             )
             self.master.wait_window(editor)
             if getattr(editor, "saved", False):
-                self.model_wrapper.save_items(self.items)
+                self._persist_edited_item(item, old_key)
                 self.refresh_list()
 
     def _show_item_menu(self, iid, event):
@@ -581,11 +819,15 @@ class GenericListView(ctk.CTkFrame):
         base_id = iid.lower()
         if base_id in self.row_colors:
             self._save_row_color(base_id, None)
+        removed_keys = [
+            it.get(self.unique_field) for it in self.items
+            if sanitize_id(str(it.get(self.unique_field, ""))).lower() == base_id
+        ]
         self.items = [
             it for it in self.items
             if sanitize_id(str(it.get(self.unique_field, ""))).lower() != base_id
         ]
-        self.model_wrapper.save_items(self.items)
+        self.model_wrapper.delete_items(removed_keys)
         self._save_list_order()
         self.filter_items(self.search_var.get())
 
@@ -614,10 +856,19 @@ class GenericListView(ctk.CTkFrame):
         new = {}
         if self.open_editor(new, True):
             self.items.append(new)
-            self.model_wrapper.save_items(self.items)
+            self.model_wrapper.upsert_item(new)
             self._save_list_order()
             self.filter_items(self.search_var.get())
 
+    def _persist_edited_item(self, item, old_key):
+        """Write back one edited row, moving it to its new key if it was renamed."""
+        self._invalidate_row(item)
+        new_key = item.get(self.unique_field)
+        if old_key is not None and old_key != new_key:
+            self.model_wrapper.rename_item(old_key, item)
+        else:
+            self.model_wrapper.upsert_item(item)
+
     def open_editor(self, item, creation_mode=False):
         ed = GenericEditorWindow(
             self.master, item, self.template,
@@ -630,15 +881,41 @@ class GenericListView(ctk.CTkFrame):
         q = query.strip().lower()
         if q:
             self.filtered_items = [
-                it for it in self.items
-                if any(q in self.clean_value(v).lower() for v in it.values())
+                it for it in self.items if q in self._search_text(it)
             ]
         else:
             self.filtered_items = list(self.items)
+        self._filter_query = q
+        self._view_start = 0
         self.refresh_list()
 
+    def _schedule_filter(self):
+        """Filter once typing pauses instead of on every keystroke."""
+        if self._filter_job is not None:
+            self.after_cancel(self._filter_job)
+        self._filter_job = self.after(FILTER_DEBOUNCE_MS, self._apply_typed_filter)
+
+    def _apply_typed_filter(self):
+        self._filter_job = None
+        if not self.winfo_exists():
+            return
+        q = self.search_var.get().strip().lower()
+        previous = self._filter_query
+        if q == previous:
+            return
+        if previous and previous in q:
+            # Every match of the longer query matched the previous one
+            self.filtered_items = [
+                it for it in self.filtered_items if q in self._search_text(it)
+            ]
+            self._filter_query = q
+            self._view_start = 0
+            self.refresh_list()
+        else:
+            self.filter_items(q)
+
     def add_items(self, items):
-        added = 0
+        added = []
         for itm in items:
             nid = sanitize_id(str(itm.get(self.unique_field, ""))).lower()
             if not any(
@@ -646,9 +923,9 @@ class GenericListView(ctk.CTkFrame):
                 for i in self.items
             ):
                 self.items.append(itm)
-                added += 1
+                added.append(itm)
         if added:
-            self.model_wrapper.save_items(self.items)
+            self.model_wrapper.upsert_many(added)
             self._save_list_order()
             self.filter_items(self.search_var.get())
 
@@ -723,6 +1000,9 @@ class GenericListView(ctk.CTkFrame):
         top.focus_force()
 
     def _find_item_by_iid(self, iid):
+        item = self._iid_items.get(iid)
+        if item is not None:
+            return item, self._get_base_id(item)
         for it in self.filtered_items:
             base_id = self._get_base_id(it)
             if iid == base_id or iid.startswith(base_id + "_"):
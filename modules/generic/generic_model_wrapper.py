@@ -1,79 +1,371 @@
-import sqlite3
 import json
-from db.db import get_connection
+from db.db import (
+    read_connection, write_connection, load_field_types,
+    linked_list_fields, write_entity_links, delete_entity_links, delete_map_items, rename_map_items,
+    searchable_fields, write_search_index, delete_search_index,
+)
+from modules.generic.entity_cache import EntityCache
+from modules.generic.lazy_row import LazyRow, looks_like_json, decode_json_text
+
+# Template types whose values are stored as JSON text and can be large
+_LAZY_JSON_TYPES = ("longtext", "list", "list_longtext")
+_MAX_SQL_PARAMS = 900
 
 class GenericModelWrapper:
     def __init__(self, entity_type):
         self.entity_type = entity_type
         # Assume your table name is the same as the entity type (e.g., "npcs")
         self.table = entity_type  
+        self._field_types = None
+        self._link_fields = None
+        self._search_fields = None
+
+    @property
+    def field_types(self):
+        """{column: template type} from the entity's JSON template."""
+        if self._field_types is None:
+            try:
+                self._field_types = load_field_types(self.table)
+            except (OSError, KeyError, ValueError):
+                self._field_types = {}
+        return self._field_types
+
+    @property
+    def link_fields(self):
+        """[(field, target_table)] for list fields with a linked_type."""
+        if self._link_fields is None:
+            try:
+                self._link_fields = linked_list_fields(self.table)
+            except (OSError, KeyError, ValueError):
+                self._link_fields = []
+        return self._link_fields
+
+    @property
+    def search_fields(self):
+        """Columns indexed for full-text search, besides the key."""
+        if self._search_fields is None:
+            try:
+                self._search_fields = searchable_fields(self.table)
+            except (OSError, KeyError, ValueError):
+                self._search_fields = []
+        return self._search_fields
+
+    @property
+    def columns(self):
+        """Column names declared in the entity's JSON template."""
+        return list(self.field_types)
 
-    def load_items(self):
-        conn = get_connection()
-        conn.row_factory = sqlite3.Row  # This makes rows behave like dictionaries.
-        cursor = conn.cursor()
-        cursor.execute(f"SELECT * FROM {self.table}")
-        rows = cursor.fetchall()
+    @property
+    def key_field(self):
+        """Primary key column: the first field of the entity's JSON template."""
+        return self.columns[0] if self.columns else "Name"
+
+    @property
+    def cache(self):
+        """Shared per-table EntityCache, see modules.generic.entity_cache."""
+        return EntityCache.for_table(self.table, self.key_field, self._load_rows)
+
+    def get_by_key(self, key):
+        """
+        Return the row with this primary key, or None.
+        Served from the cache when it is warm, else by a primary-key lookup.
+        """
+        if self.cache.is_loaded():
+            return self.cache.get(key)
+        rows = self._load_rows(where_keys=[key])
+        return rows[0] if rows else None
+
+    def get_many(self, keys):
+        """
+        Return {key: row} for the given primary keys, in the order requested.
+        Missing keys are left out.
+        """
+        keys = list(dict.fromkeys(k for k in keys if k is not None))
+        if self.cache.is_loaded():
+            found = {k: self.cache.get(k) for k in keys}
+        else:
+            found = {}
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(keys), _MAX_SQL_PARAMS):
+                chunk = keys[start:start + _MAX_SQL_PARAMS]
+                for row in self._load_rows(where_keys=chunk):
+                    found[row.get(self.key_field)] = row
+        return {k: found[k] for k in keys if found.get(k) is not None}
+
+    def subscribe(self, callback):
+        """Subscribe to row changes on this table; returns an unsubscribe function."""
+        return self.cache.subscribe(callback)
+
+    @staticmethod
+    def _encode(val):
+        # Lists and dicts (rich text, link lists) are stored as JSON strings
+        if isinstance(val, (list, dict)):
+            return json.dumps(val)
+        return val
+
+    @staticmethod
+    def _decode(value):
+        # Decode only likely JSON: starts with {, [, or "
+        return decode_json_text(value)
+
+    def _as_stored(self, item):
+        """The row as it will read back from the table, for the cache."""
+        # INSERT OR REPLACE leaves the columns that were not supplied NULL
+        row = dict.fromkeys(self.columns)
+        row.update((key, self._stored_value(val)) for key, val in item.items())
+        return row
+
+    def _stored_value(self, val):
+        # Re-decoded from its JSON so the cache never shares the caller's lists
+        return self._decode(self._encode(val))
+
+    def load_items(self, fields=None):
+        """
+        Return every row as a fresh list of dicts, served from the cache.
+        With ``fields``, only those columns are returned; when the cache is
+        cold they are read with a projected SELECT instead of loading it.
+        """
+        if fields is None:
+            return self.cache.all()
+        fields = [f for f in fields if f in self.field_types] or [self.key_field]
+        if self.cache.is_loaded():
+            return self.cache.all(fields)
+        return self._load_rows(fields)
+
+    def _load_rows(self, fields=None, where_keys=None):
+        cols = ", ".join(fields) if fields else "*"
+        sql = f"SELECT {cols} FROM {self.table}"
+        params = ()
+        if where_keys is not None:
+            sql += f" WHERE {self.key_field} IN ({', '.join('?' for _ in where_keys)})"
+            params = tuple(where_keys)
+        with read_connection() as conn:
+            cursor = conn.execute(sql, params)
+            names = [d[0] for d in cursor.description]
+            rows = cursor.fetchall()
+        # Large JSON columns (rich text, link lists) are decoded on first access
+        lazy = [
+            self.field_types.get(name) in _LAZY_JSON_TYPES for name in names
+        ]
         items = []
         for row in rows:
-            item = {}
-            for key in row.keys():
-                value = row[key]
-                # Decode only likely JSON: starts with {, [, or "
-                if isinstance(value, str) and value.strip().startswith(("{", "[", "\"")):
-                    try:
-                        item[key] = json.loads(value)
-                    except (TypeError, json.JSONDecodeError):
-                        item[key] = value
+            values = {}
+            pending = []
+            for idx, name in enumerate(names):
+                value = row[idx]
+                if lazy[idx] and looks_like_json(value):
+                    values[name] = value
+                    pending.append(name)
                 else:
-                    item[key] = value
-            items.append(item)
-        conn.close()
+                    values[name] = self._decode(value)
+            items.append(LazyRow(values, pending))
         return items
 
-
     def save_items(self, items):
-        conn = get_connection()
-        cursor = conn.cursor()
-        
-        # Détermine le champ unique à utiliser
-        if items:
-            sample_item = items[0]
-            if "Name" in sample_item:
-                unique_field = "Name"
-            elif "Title" in sample_item:
-                unique_field = "Title"
+        """
+        Rewrites the whole table so it holds exactly ``items``.
+        Kept for bulk imports; prefer upsert_item/upsert_many/delete_items
+        for edits so writes scale with the change, not the table size.
+        """
+        with write_connection(invalidate_caches=False) as conn:
+            cursor = conn.cursor()
+
+            # Détermine le champ unique à utiliser
+            if items:
+                sample_item = items[0]
+                if "Name" in sample_item:
+                    unique_field = "Name"
+                elif "Title" in sample_item:
+                    unique_field = "Title"
+                else:
+                    unique_field = list(sample_item.keys())[0]
             else:
-                unique_field = list(sample_item.keys())[0]
-        else:
-            unique_field = "Name"  # Valeur par défaut si la liste est vide
+                unique_field = "Name"  # Valeur par défaut si la liste est vide
+
+            # Insertion ou mise à jour (INSERT OR REPLACE)
+            for item in items:
+                keys = list(item.keys())
+                values = []
+                for key in keys:
+                    values.append(self._encode(item[key]))
+                placeholders = ", ".join("?" for _ in keys)
+                cols = ", ".join(keys)
+                sql = f"INSERT OR REPLACE INTO {self.table} ({cols}) VALUES ({placeholders})"
+                cursor.execute(sql, values)
+
+            # Gestion du cas de suppression :
+            # On construit la liste des identifiants uniques présents dans les items
+            unique_ids = [item[unique_field] for item in items if unique_field in item]
+
+            if unique_ids:
+                placeholders = ", ".join("?" for _ in unique_ids)
+                delete_sql = f"DELETE FROM {self.table} WHERE {unique_field} NOT IN ({placeholders})"
+                cursor.execute(delete_sql, unique_ids)
+            else:
+                # S'il n'y a aucun item, supprimer tous les enregistrements de la table
+                delete_sql = f"DELETE FROM {self.table}"
+                cursor.execute(delete_sql)
+
+            stored = [self._as_stored(i) for i in items]
+            if self.link_fields:
+                delete_entity_links(cursor, self.table)
+                write_entity_links(cursor, self.table, stored, self.key_field, self.link_fields)
+            delete_search_index(cursor, self.table)
+            write_search_index(cursor, self.table, stored, self.key_field, self.search_fields)
+            if self.table == "maps":
+                cursor.execute(
+                    f"DELETE FROM map_items WHERE map_name NOT IN (SELECT {self.key_field} FROM maps)"
+                )
+        self.cache.apply_replace_all(stored)
+
+    def upsert_item(self, item):
+        """Insert or replace a single row."""
+        self.upsert_many([item])
 
-        # Insertion ou mise à jour (INSERT OR REPLACE)
+    def upsert_many(self, items):
+        """
+        Insert or replace only the given rows, in one transaction.
+        Rows sharing the same set of columns are written with one executemany.
+        """
+        items = list(items)
+        batches = {}
         for item in items:
-            keys = list(item.keys())
-            values = []
-            for key in keys:
-                val = item[key]
-                if isinstance(val, (list, dict)):
-                    val = json.dumps(val)
-                values.append(val)
-            placeholders = ", ".join("?" for _ in keys)
-            cols = ", ".join(keys)
-            sql = f"INSERT OR REPLACE INTO {self.table} ({cols}) VALUES ({placeholders})"
-            cursor.execute(sql, values)
-        
-        # Gestion du cas de suppression :
-        # On construit la liste des identifiants uniques présents dans les items
-        unique_ids = [item[unique_field] for item in items if unique_field in item]
-        
-        if unique_ids:
-            placeholders = ", ".join("?" for _ in unique_ids)
-            delete_sql = f"DELETE FROM {self.table} WHERE {unique_field} NOT IN ({placeholders})"
-            cursor.execute(delete_sql, unique_ids)
-        else:
-            # S'il n'y a aucun item, supprimer tous les enregistrements de la table
-            delete_sql = f"DELETE FROM {self.table}"
-            cursor.execute(delete_sql)
-        
-        conn.commit()
-        conn.close()
+            cols = tuple(item.keys())
+            batches.setdefault(cols, []).append(
+                [self._encode(item[c]) for c in cols]
+            )
+        if not batches:
+            return
+        stored = [self._as_stored(i) for i in items]
+        with write_connection(invalidate_caches=False) as conn:
+            for cols, rows in batches.items():
+                placeholders = ", ".join("?" for _ in cols)
+                sql = f"INSERT OR REPLACE INTO {self.table} ({', '.join(cols)}) VALUES ({placeholders})"
+                conn.executemany(sql, rows)
+            if self.link_fields:
+                write_entity_links(conn.cursor(), self.table, stored, self.key_field, self.link_fields)
+            write_search_index(conn.cursor(), self.table, stored, self.key_field, self.search_fields)
+        self.cache.apply_upserts(stored)
+
+    def delete_items(self, keys):
+        """Delete the rows whose primary key is in ``keys``."""
+        keys = [(k,) for k in keys]
+        if not keys:
+            return
+        with write_connection(invalidate_caches=False) as conn:
+            conn.executemany(
+                f"DELETE FROM {self.table} WHERE {self.key_field} = ?", keys
+            )
+            if self.link_fields:
+                delete_entity_links(conn.cursor(), self.table, [k for (k,) in keys])
+            delete_search_index(conn.cursor(), self.table, [k for (k,) in keys])
+            if self.table == "maps":
+                # Tokens and shapes placed on the deleted maps
+                for (key,) in keys:
+                    delete_map_items(conn.cursor(), key)
+        self.cache.apply_deletes([k for (k,) in keys])
+
+    def rename_item(self, old_key, item):
+        """
+        Replace the row ``old_key`` with ``item``, whose key changed, in one
+        transaction. What hangs off the old key (its links, search entry,
+        and for maps the placed tokens and shapes) moves to the new key.
+        """
+        new_key = item.get(self.key_field)
+        if old_key is None or old_key == new_key:
+            self.upsert_item(item)
+            return
+        stored = self._as_stored(item)
+        cols = list(item.keys())
+        with write_connection(invalidate_caches=False) as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"DELETE FROM {self.table} WHERE {self.key_field} = ?", (old_key,))
+            cursor.execute(
+                f"INSERT OR REPLACE INTO {self.table} ({', '.join(cols)}) "
+                f"VALUES ({', '.join('?' for _ in cols)})",
+                [self._encode(item[c]) for c in cols]
+            )
+            if self.link_fields:
+                delete_entity_links(cursor, self.table, [old_key])
+                write_entity_links(cursor, self.table, [stored], self.key_field, self.link_fields)
+            delete_search_index(cursor, self.table, [old_key])
+            write_search_index(cursor, self.table, [stored], self.key_field, self.search_fields)
+            if self.table == "maps":
+                rename_map_items(cursor, old_key, new_key)
+        self.cache.apply_deletes([old_key])
+        self.cache.apply_upserts([stored])
+
+    def patch_fields(self, key, fields):
+        """Update only the given columns of one row, leaving the others untouched."""
+        if not fields:
+            return
+        cols = list(fields.keys())
+        assignments = ", ".join(f"{c} = ?" for c in cols)
+        values = [self._encode(fields[c]) for c in cols] + [key]
+        with write_connection(invalidate_caches=False) as conn:
+            conn.execute(
+                f"UPDATE {self.table} SET {assignments} WHERE {self.key_field} = ?",
+                values
+            )
+            if self.link_fields:
+                write_entity_links(
+                    conn.cursor(), self.table, [dict(fields, **{self.key_field: key})],
+                    self.key_field, self.link_fields
+                )
+            if any(c in self.search_fields for c in cols):
+                # The body covers several columns: re-index from the updated row
+                cursor = conn.execute(
+                    f"SELECT * FROM {self.table} WHERE {self.key_field} = ?", (key,)
+                )
+                names = [d[0] for d in cursor.description]
+                row = cursor.fetchone()
+                if row is not None:
+                    write_search_index(
+                        conn.cursor(), self.table, [dict(zip(names, row))],
+                        self.key_field, self.search_fields
+                    )
+        self.cache.apply_patch(
+            key, {field: self._stored_value(val) for field, val in fields.items()}
+        )
+
+    # --- Link lookups (entity_links table) ----------------------------------
+    def linked_keys(self, key, field):
+        """Keys listed in this row's ``field`` (e.g. an NPC's Factions), in order."""
+        with read_connection() as conn:
+            rows = conn.execute(
+                "SELECT dst_key FROM entity_links "
+                "WHERE src_type = ? AND src_key = ? AND field = ? ORDER BY position",
+                (self.table, key, field)
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def keys_linking_to(self, target_type, target_key, field=None):
+        """
+        Keys of the rows in this table whose list fields reference
+        ``target_key`` of ``target_type``, e.g. the scenarios using an NPC:
+        GenericModelWrapper("scenarios").keys_linking_to("npcs", name)
+        """
+        sql = (
+            "SELECT DISTINCT src_key FROM entity_links "
+            "WHERE dst_type = ? AND dst_key = ? AND src_type = ?"
+        )
+        params = [target_type.lower(), target_key, self.table]
+        if field:
+            sql += " AND field = ?"
+            params.append(field)
+        with read_connection() as conn:
+            return [r[0] for r in conn.execute(sql, params).fetchall()]
+
+    def link_groups(self, field):
+        """{row key: [linked keys in list order]} for every row with links in ``field``."""
+        groups = {}
+        with read_connection() as conn:
+            rows = conn.execute(
+                "SELECT src_key, dst_key FROM entity_links "
+                "WHERE src_type = ? AND field = ? ORDER BY src_key, position",
+                (self.table, field)
+            ).fetchall()
+        for src_key, dst_key in rows:
+            groups.setdefault(src_key, []).append(dst_key)
+        return groups
+
@@ -0,0 +1,123 @@
+import json
+
+
+def looks_like_json(value):
+    """Cheap check for text that may hold JSON: starts with {, [ or "."""
+    # Only strip the head: longtext values can be megabytes long
+    return isinstance(value, str) and value[:32].lstrip()[:1] in ("{", "[", "\"")
+
+
+def decode_json_text(value):
+    """Decode ``value`` when it looks like JSON, else return it unchanged."""
+    if looks_like_json(value):
+        try:
+            return json.loads(value)
+        except (TypeError, json.JSONDecodeError):
+            return value
+    return value
+
+
+class LazyRow(dict):
+    """
+    A dict whose JSON columns are decoded on first access.
+
+    ``pending`` names the keys whose stored value is still raw JSON text.
+    Reading such a key (``row[k]``, ``row.get(k)``, ``items()``...) decodes
+    it once and keeps the result. ``copy()`` keeps undecoded values raw, so
+    handing out copies stays cheap.
+    """
+
+    __slots__ = ("_pending",)
+
+    def __init__(self, values=(), pending=()):
+        super().__init__(values)
+        self._pending = set(pending)
+
+    def _resolve(self, key):
+        if key in self._pending:
+            self._pending.discard(key)
+            dict.__setitem__(self, key, decode_json_text(dict.__getitem__(self, key)))
+
+    def _resolve_all(self):
+        for key in list(self._pending):
+            self._resolve(key)
+
+    # --- Reads ---------------------------------------------------------------
+    def __getitem__(self, key):
+        if self._pending:
+            self._resolve(key)
+        return dict.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+    def __iter__(self):
+        # Overriding __iter__ makes dict(row) and {**row} go through __getitem__
+        return dict.__iter__(self)
+
+    def items(self):
+        self._resolve_all()
+        return dict.items(self)
+
+    def values(self):
+        self._resolve_all()
+        return dict.values(self)
+
+    def __eq__(self, other):
+        self._resolve_all()
+        if isinstance(other, LazyRow):
+            other._resolve_all()
+        return dict.__eq__(self, other)
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        self._resolve_all()
+        return dict.__repr__(self)
+
+    def copy(self):
+        return LazyRow(dict.items(self), self._pending)
+
+    def __reduce_ex__(self, protocol):
+        # copy.deepcopy / pickle get a fully decoded plain dict
+        return (dict, (dict(self),))
+
+    # --- Writes --------------------------------------------------------------
+    def __setitem__(self, key, value):
+        self._pending.discard(key)
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        self._pending.discard(key)
+        dict.__delitem__(self, key)
+
+    def pop(self, key, *default):
+        if key in self:
+            value = self[key]
+            del self[key]
+            return value
+        return dict.pop(self, key, *default)
+
+    def popitem(self):
+        self._resolve_all()
+        return dict.popitem(self)
+
+    def setdefault(self, key, default=None):
+        if key in self:
+            return self[key]
+        self[key] = default
+        return default
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def clear(self):
+        self._pending.clear()
+        dict.clear(self)
@@ -6,7 +6,8 @@ import customtkinter as ctk
 from modules.maps.views.map_selector import select_map, _on_display_map
 from modules.maps.views.toolbar_view import _build_toolbar, _on_brush_size_change, _on_brush_shape_change, _change_brush, _on_token_size_change
 from modules.maps.views.canvas_view import _build_canvas, _on_delete_key
-from modules.maps.services.fog_manager import _set_fog, clear_fog, reset_fog, on_paint
+from modules.maps.services.fog_manager import _set_fog, clear_fog, reset_fog, on_paint, end_fog_stroke
+from modules.maps.services.fog_history import FogHistory
 # Removed direct imports from token_manager, as methods are now part of this controller or generic
 # from modules.maps.services.token_manager import add_token, _on_token_press, _on_token_move, _on_token_release, _copy_token, _paste_token, _show_token_menu, _resize_token_dialog, _change_token_border_color, _delete_token, _persist_tokens
 from modules.maps.services.token_manager import add_token, _persist_tokens, _change_token_border_color # Keep this if it's used by other token_manager functions not moved
@@ -14,10 +15,17 @@ from modules.maps.views.fullscreen_view import open_fullscreen, _update_fullscre
 from modules.maps.views.web_display_view import open_web_display, _update_web_display_map, close_web_display
 from modules.maps.services.entity_picker_service import open_entity_picker, on_entity_selected
 from modules.maps.utils.icon_loader import load_icon
-from PIL import Image, ImageTk, ImageDraw
+from modules.maps.utils.tile_pyramid import CanvasTileLayer
+from modules.maps.utils.fog_mask import save_mask, mask_path_for
+from modules.maps.services.scene_compositor import SceneCompositor
+from modules.maps.utils.token_images import load_token_image
+from modules.maps.views.token_info_popup import show_token_info, hide_token_info, place_token_info
+from modules.maps.utils.spatial_index import SpatialIndex
+from modules.maps.services.item_index import index_item, visible_items, item_at, item_canvas_ids, stack_new_item
+from PIL import Image, ImageDraw
 from modules.generic.generic_model_wrapper import GenericModelWrapper
+from db.db import search
 from modules.helpers.template_loader import load_template
-from modules.helpers.text_helpers import format_longtext
 from modules.helpers.config_helper import ConfigHelper
 from modules.ui.image_viewer import show_portrait
 
@@ -29,6 +37,9 @@ MASKS_DIR = os.path.join(ConfigHelper.get_campaign_dir(), "masks")
 MAX_ZOOM = 3.0
 MIN_ZOOM = 0.1
 ZOOM_STEP = 0.1  # 10% per wheel notch
+MAP_TILE_TAG = "map_tile"
+FOG_TILE_TAG = "fog_tile"
+ITEM_TAG = "map_item"  # every canvas item drawn for a token or shape
 ctk.set_appearance_mode("dark")
 
 class DisplayMapController:
@@ -51,10 +62,9 @@ class DisplayMapController:
         self.current_map = None
         self.base_img    = None
         self.mask_img    = None
-        self.base_tk     = None
-        self.mask_tk     = None
-        self.base_id     = None
-        self.mask_id     = None
+        self.scene       = SceneCompositor()  # scaled layers shared by every view
+        self._base_layer = None  # CanvasTileLayer of base_img on self.canvas
+        self._mask_layer = None  # CanvasTileLayer of mask_img on self.canvas
         self._zoom_after_id = None
         self._fast_resample = Image.BILINEAR
         self.zoom        = 1.0
@@ -68,6 +78,9 @@ class DisplayMapController:
         self.brush_shape = "rectangle"
         self.fog_mode    = "add"
         self.tokens      = [] # List of all items (tokens and shapes)
+        self._item_index = SpatialIndex()  # world bounds of self.tokens, see item_index
+        self._shown_items = {}  # id(item) -> item drawn on the GM canvas last update
+        self._items_view = None  # (zoom, pan_x, pan_y) the item canvas items are drawn for
         
         self.drawing_mode = "token"
         self.shape_is_filled = True
@@ -93,9 +106,9 @@ class DisplayMapController:
     
         self.fs            = None
         self.fs_canvas     = None
-        self.fs_base_id    = None
-        self.fs_mask_id    = None
-        self.fog_history = []
+        self._fs_base_layer = None  # CanvasTileLayers on fs_canvas
+        self._fs_fog_layer  = None
+        self.fog_history = FogHistory()
         self._fog_action_active = False
         
         self._maps = {m["Name"]: m for m in maps_wrapper.load_items()}
@@ -113,20 +126,30 @@ class DisplayMapController:
         listbox = tk.Listbox(popup, activestyle="none")
         listbox.pack(fill="both", expand=True, padx=10, pady=(0,10))
         search_map = []
+        type_by_table = {w.table.lower(): et for et, w in self._model_wrappers.items()}
         def populate(initial=False, query=""):
             listbox.delete(0, "end"); search_map.clear(); q = query.lower()
-            for etype, wrapper in self._model_wrappers.items():
-                for item in wrapper.load_items():
-                    name = item.get("Name", "")
-                    if initial or q in name.lower():
-                        listbox.insert("end", f"{etype}: {name}"); search_map.append((etype, name, item))
+            results = None if initial or not q else search(q, types=list(type_by_table), limit=50)
+            if results is not None:
+                # Ranked full-text matches; records are fetched on selection
+                for table, name in results:
+                    etype = type_by_table[table]
+                    listbox.insert("end", f"{etype}: {name}"); search_map.append((etype, name, None))
+            else:
+                for etype, wrapper in self._model_wrappers.items():
+                    for item in wrapper.load_items(fields=["Name"]):
+                        name = item.get("Name", "")
+                        if initial or q in name.lower():
+                            listbox.insert("end", f"{etype}: {name}"); search_map.append((etype, name, None))
             if listbox.size() > 0: listbox.selection_clear(0, "end"); listbox.selection_set(0); listbox.activate(0)
         populate(initial=True)
         entry.bind("<KeyRelease>", lambda e: populate(False, entry.get().strip()))
         entry.bind("<Down>", lambda e: (listbox.focus_set(), "break"))
         def on_select(evt=None):
             if not search_map: return
-            idx = listbox.curselection()[0]; etype, name, record = search_map[idx]
+            sel = listbox.curselection(); idx = sel[0] if sel else 0
+            etype, name, record = search_map[idx]
+            record = record or self._model_wrappers[etype].get_by_key(name) or {}
             portrait = record.get("Portrait", "")
             path = portrait.get("path") or portrait.get("text", "") if isinstance(portrait, dict) else portrait
             self.add_token(path, etype, name, record) # This specifically adds a new token
@@ -135,13 +158,22 @@ class DisplayMapController:
         listbox.bind("<Double-Button-1>", on_select)
         
     def _push_fog_history(self):
+        """Start recording a fog stroke; on_paint saves each region before drawing on it."""
         if self.mask_img is not None:
-            MAX_UNDO = 20; self.fog_history.append(self.mask_img.copy())
-            if len(self.fog_history) > MAX_UNDO: self.fog_history.pop(0)
-    
+            self.fog_history.begin(self.mask_img)
+
     def undo_fog(self, event=None):
-        if not self.fog_history: return
-        self.mask_img = self.fog_history.pop(); self._update_canvas_images()
+        box = self.fog_history.undo(self.mask_img) if self.mask_img else None
+        if box: self._on_fog_restored(box)
+
+    def redo_fog(self, event=None):
+        box = self.fog_history.redo(self.mask_img) if self.mask_img else None
+        if box: self._on_fog_restored(box)
+
+    def _on_fog_restored(self, box):
+        # Only the restored region is redrawn, on both canvases
+        self._refresh_fog(box)
+        if getattr(self, '_web_server_thread', None): self._update_web_display_map()
     
     # _bind_token is now _bind_item_events
 
@@ -199,19 +231,9 @@ class DisplayMapController:
             return # A handle was pressed, resize logic takes over
 
         # If not clicking a handle, determine if clicking an item or empty space
-        current_ids = self.canvas.find_withtag("current")
-        clicked_an_item = False
-        if current_ids:
-            clicked_item_id = current_ids[0]
-            for item_iter in self.tokens:
-                item_canvas_ids = item_iter.get("canvas_ids")
-                if item_canvas_ids and clicked_item_id in item_canvas_ids:
-                    print(f"[DEBUG] _on_mouse_down: Matched clicked canvas ID {clicked_item_id} to item: {item_iter.get('type')} - {item_iter.get('entity_id', 'Shape')}")
-                    # An item (not a handle) was clicked. Its own _on_item_press will handle selection.
-                    # If this click deselects a shape that was in graphical edit mode,
-                    # _on_item_press should call _remove_resize_handles.
-                    clicked_an_item = True
-                    break
+        # An item (not a handle) was clicked: its own _on_item_press handles
+        # selection, and deselects a shape that was in graphical edit mode.
+        clicked_an_item = item_at(self, event.x, event.y) is not None
         
         if not clicked_an_item: # Clicked on empty canvas space
             if self._graphical_edit_mode_item: # If graphical edit was active, deactivate it
@@ -239,6 +261,7 @@ class DisplayMapController:
 
         if self.fog_mode in ("add", "rem") and not self._fog_action_active:
             self._push_fog_history(); self._fog_action_active = True
+        self._last_paint_pos = None # A new stroke starts here, not at the last one's end
         self._marker_start = (event.x, event.y)
         self._marker_after_id = self.canvas.after(500, self._create_marker)
 
@@ -252,21 +275,51 @@ class DisplayMapController:
         if self._marker_after_id: self.canvas.after_cancel(self._marker_after_id); self._marker_after_id = None
         if self._marker_id: self.canvas.delete(self._marker_id); self._marker_id = None
         if self.fs_canvas and self._fs_marker_id: self.fs_canvas.delete(self._fs_marker_id); self._fs_marker_id = None
+        self.end_fog_stroke()
         if self._fog_action_active:
             self._fog_action_active = False; self.canvas.delete("fog_preview")
-            if self.base_img and self.mask_img:
-                w, h = self.base_img.size; sw, sh = int(w*self.zoom), int(h*self.zoom)
-                if sw > 0 and sh > 0:
-                    mask_resized = self.mask_img.resize((sw, sh), resample=Image.LANCZOS)
-                    self.mask_tk = ImageTk.PhotoImage(mask_resized)
-                    if self.mask_id: self.canvas.itemconfig(self.mask_id, image=self.mask_tk); self.canvas.coords(self.mask_id, self.pan_x, self.pan_y)
+            self.fog_history.commit()
         
     def _perform_zoom(self, final: bool):
-        resample = Image.LANCZOS if final else self._fast_resample; self._update_canvas_images(resample=resample)
+        resample = Image.LANCZOS if final else self._fast_resample; self._update_canvas_images(resample=resample, interim=not final)
 
-    def _update_canvas_images(self, resample=Image.LANCZOS):
+    def _update_canvas_images(self, resample=Image.LANCZOS, interim=False):
+        """
+        Redraw the map, its fog and the items on it for the current view.
+
+        Pan and zoom move every item with one ``canvas.move`` / ``canvas.scale``
+        on ITEM_TAG; items are then only touched where their own state changed.
+        ``interim`` frames of a zoom gesture stop there: token images are
+        re-created, and the other views updated, once the gesture ends.
+        """
         if not self.base_img: return
-        
+
+        w, h = self.base_img.size; sw, sh = int(w*self.zoom), int(h*self.zoom)
+        if sw <= 0 or sh <= 0: return 
+        self.scene.changed()
+        self._render_map_layers(resample)
+        self._transform_items()
+        if interim:
+            place_token_info(self)
+            return
+        # Only items on screen are scaled and drawn; the others are hidden
+        visible = visible_items(self)
+        shown = {id(item): item for item in visible}
+        for key, item in self._shown_items.items():
+            if key not in shown:
+                for cid in item_canvas_ids(item): self.canvas.itemconfigure(cid, state="hidden")
+        for item in visible:
+            if id(item) not in self._shown_items:
+                for cid in item_canvas_ids(item): self.canvas.itemconfigure(cid, state="normal")
+            index_item(self, item)  # picks up resizes
+        self._shown_items = shown
+        for item in visible:
+            item_type = item.get("type", "token")
+            if item_type == "token":
+                self._draw_token(item, resample)
+            elif item_type in ["rectangle", "oval"]:
+                self._draw_shape(item)
+
         # Redraw handles if graphical edit mode is active for the selected item
         # and not currently in a drag-resize operation.
         if self.selected_token and self.selected_token == self._graphical_edit_mode_item and \
@@ -275,103 +328,122 @@ class DisplayMapController:
         # Ensure handles are removed if graphical edit mode is not active for the selected item
         elif self._resize_handles and (not self.selected_token or self.selected_token != self._graphical_edit_mode_item):
             self._remove_resize_handles()
-
-
-        w, h = self.base_img.size; sw, sh = int(w*self.zoom), int(h*self.zoom)
-        if sw <= 0 or sh <= 0: return 
-        x0, y0 = self.pan_x, self.pan_y
-        base_resized = self.base_img.resize((sw,sh), resample=resample); self.base_tk = ImageTk.PhotoImage(base_resized)
-        if self.base_id: self.canvas.itemconfig(self.base_id, image=self.base_tk); self.canvas.coords(self.base_id, x0, y0)
-        else: self.base_id = self.canvas.create_image(x0, y0, image=self.base_tk, anchor='nw')
-        if self.mask_img:
-            mask_resized = self.mask_img.resize((sw,sh), resample=resample); self.mask_tk = ImageTk.PhotoImage(mask_resized)
-            if self.mask_id: self.canvas.itemconfig(self.mask_id, image=self.mask_tk); self.canvas.coords(self.mask_id, x0, y0)
-            else: self.mask_id = self.canvas.create_image(x0, y0, image=self.mask_tk, anchor='nw')
-        for item in self.tokens:
-            item_type = item.get("type", "token"); xw, yw = item['position']
-            if item_type == "token":
-                pil = item.get('pil_image');
-                if not pil: continue
-                tw, th = pil.size; nw, nh = int(tw*self.zoom), int(th*self.zoom)
-                if nw <=0 or nh <=0: continue
-                img_r = pil.resize((nw,nh), resample=resample); tkimg = ImageTk.PhotoImage(img_r); item['tk_image'] = tkimg
-                sx, sy = int(xw*self.zoom + self.pan_x), int(yw*self.zoom + self.pan_y)
-                if item.get('canvas_ids'):
-                    b_id, i_id = item['canvas_ids']
-                    self.canvas.itemconfig(b_id, outline=item.get('border_color','#0000ff'))
-                    self.canvas.coords(b_id, sx-3, sy-3, sx+nw+3, sy+nh+3); self.canvas.coords(i_id, sx, sy)
-                    self.canvas.itemconfig(i_id, image=tkimg)
-                    hp = item.get("hp", 10); max_hp = item.get("max_hp", 10)
-                    ratio = hp / max_hp if max_hp > 0 else 1.0; hp_color = "#ff3333" if ratio < 0.10 else "#33cc33"
-                    circle_diam = max(18, int(nw * 0.25)); cx = sx + nw - circle_diam + 4; cy = sy + nh - circle_diam + 4
-                    if item.get("hp_canvas_ids"):
-                        cid, tid = item["hp_canvas_ids"]
-                        self.canvas.coords(cid, cx, cy, cx + circle_diam, cy + circle_diam); self.canvas.itemconfig(cid, fill=hp_color)
-                        self.canvas.coords(tid, cx + circle_diam // 2, cy + circle_diam // 2); self.canvas.itemconfig(tid, text=str(hp))
-                    name_id = item.get('name_id')
-                    if name_id: tx = sx + nw/2; ty = sy + nh + 2; self.canvas.coords(name_id, tx, ty); self.canvas.itemconfig(name_id, text=item.get('entity_id', ''))
-                    if item.get('info_widget_id') and item.get('info_widget'):
-                        ix = sx + nw + 10; iy = sy + nh/2; self.canvas.coords(item['info_widget_id'], ix, iy)
-                        rec = item.get('entity_record', {}); entity_type_for_stats = item.get('entity_type'); new_text_stats = ""
-                        if entity_type_for_stats == "Creature": new_text_stats = rec.get("Stats", "")
-                        elif entity_type_for_stats == "PC": new_text_stats = rec.get("Stats", "")
-                        elif entity_type_for_stats == "NPC": new_text_stats = rec.get("Traits", "")
-                        new_text = format_longtext(new_text_stats); tb = item['info_widget']
-                        tb._textbox.delete("1.0", "end"); tb._textbox.insert("1.0", new_text)
-                else: 
-                    b_id = self.canvas.create_rectangle(sx-3, sy-3, sx+nw+3, sy+nh+3, outline=item.get('border_color','#0000ff'), width=3)
-                    i_id = self.canvas.create_image(sx, sy, image=tkimg, anchor='nw')
-                    tx = sx + nw/2; ty = sy + nh + 2; name_id = self.canvas.create_text(tx, ty, text=item.get('entity_id',''), fill='white', anchor='n'); item['name_id'] = name_id
-                    hp = item.get("hp", 10); max_hp = item.get("max_hp", 10); ratio = hp / max_hp if max_hp > 0 else 1.0
-                    hp_color = "#ff3333" if ratio < 0.10 else "#33cc33"; circle_diam = max(18, int(nw * 0.25))
-                    cx = sx + nw - circle_diam + 4; cy = sy + nh - circle_diam + 4
-                    cid = self.canvas.create_oval(cx, cy, cx + circle_diam, cy + circle_diam, fill=hp_color, outline="black", width=1)
-                    tid = self.canvas.create_text(cx + circle_diam//2, cy + circle_diam//2, text=str(hp), font=("Arial", max(10, circle_diam // 2), "bold"), fill="white")
-                    item["hp_canvas_ids"] = (cid, tid)
-                    for item_id_hp in (cid, tid):
-                        self.canvas.tag_bind(item_id_hp, "<Double-Button-1>", lambda e, t=item: self._on_hp_double_click(e, t))
-                        self.canvas.tag_bind(item_id_hp, "<Button-3>", lambda e, t=item: self._on_max_hp_menu_click(e, t))
-                    rec = item.get('entity_record', {}); entity_type_for_stats = item.get('entity_type'); raw_stats_text = ""
-                    if entity_type_for_stats == "Creature": raw_stats_text = rec.get("Stats", "")
-                    elif entity_type_for_stats == "PC": raw_stats_text = rec.get("Stats", "")
-                    elif entity_type_for_stats == "NPC": raw_stats_text = rec.get("Traits", "")
-                    display_stats_text = format_longtext(raw_stats_text)
-                    if isinstance(display_stats_text, (list, tuple)): display_stats_text = "\n".join(map(str, display_stats_text))
-                    else: display_stats_text = str(display_stats_text)
-                    height_info = item.get("size", self.token_size) * 2; entry_info = item.get("info_widget")
-                    if not entry_info: entry_info = ctk.CTkTextbox(self.canvas, width=100, height=height_info, wrap="word"); item["info_widget"] = entry_info
-                    entry_info._textbox.delete("1.0", "end"); entry_info._textbox.insert("1.0", display_stats_text)
-                    ix = sx + nw + 10; iy = sy + nh/2; info_id = self.canvas.create_window(ix, iy, anchor='w', window=entry_info)
-                    self.canvas.itemconfigure(info_id, state='hidden')
-                    item.update({'canvas_ids': (b_id, i_id), 'name_id': name_id, 'info_widget_id': info_id, 'info_widget': entry_info})
-                    for cid_bind in (b_id, i_id):
-                        self.canvas.tag_bind(cid_bind, "<Enter>", lambda e, iid=info_id: self.canvas.itemconfigure(iid, state='normal'))
-                        self.canvas.tag_bind(cid_bind, "<Leave>", lambda e, iid=info_id: self.canvas.itemconfigure(iid, state='hidden'))
-                    entry_info.bind("<Enter>", lambda e, iid=info_id: self.canvas.itemconfigure(iid, state='normal'))
-                    entry_info.bind("<Leave>", lambda e, iid=info_id: self.canvas.itemconfigure(iid, state='hidden'))
-                    self._bind_item_events(item)
-            elif item_type in ["rectangle", "oval"]:
-                shape_width_unscaled = item.get("width", DEFAULT_SHAPE_WIDTH); shape_height_unscaled = item.get("height", DEFAULT_SHAPE_HEIGHT)
-                shape_width = shape_width_unscaled * self.zoom; shape_height = shape_height_unscaled * self.zoom
-                if shape_width <=0 or shape_height <=0: continue
-                sx, sy = int(xw*self.zoom + self.pan_x), int(yw*self.zoom + self.pan_y)
-                fill_color = item.get("fill_color", "") if item.get("is_filled") else ""; border_color = item.get("border_color", "#000000")
-                if item.get('canvas_ids') and item['canvas_ids'][0] is not None:
-                    shape_id = item['canvas_ids'][0]
-                    if item_type == "rectangle": self.canvas.coords(shape_id, sx, sy, sx + shape_width, sy + shape_height)
-                    elif item_type == "oval": self.canvas.coords(shape_id, sx, sy, sx + shape_width, sy + shape_height)
-                    self.canvas.itemconfig(shape_id, fill=fill_color, outline=border_color)
-                else:
-                    shape_id = None
-                    if item_type == "rectangle": shape_id = self.canvas.create_rectangle(sx, sy, sx + shape_width, sy + shape_height, fill=fill_color, outline=border_color, width=2)
-                    elif item_type == "oval": shape_id = self.canvas.create_oval(sx, sy, sx + shape_width, sy + shape_height, fill=fill_color, outline=border_color, width=2)
-                    item['canvas_ids'] = (shape_id,) if shape_id else ();
-                    if shape_id: self._bind_item_events(item)
+        place_token_info(self)
         if self.fs_canvas:
             self._update_fullscreen_map()
         if getattr(self, '_web_server_thread', None):
             self._update_web_display_map()
 
+    def _transform_items(self):
+        """Bring every item drawn for the previous view to the current one, in two Tk calls."""
+        old = self._items_view
+        self._items_view = (self.zoom, self.pan_x, self.pan_y)
+        if old is None or old == self._items_view: return
+        old_zoom, old_pan_x, old_pan_y = old
+        factor = self.zoom / old_zoom
+        # screen = world * zoom + pan: scale about the origin, then shift
+        if factor != 1: self.canvas.scale(ITEM_TAG, 0, 0, factor, factor)
+        dx = self.pan_x - old_pan_x * factor; dy = self.pan_y - old_pan_y * factor
+        if dx or dy: self.canvas.move(ITEM_TAG, dx, dy)
+
+    def _draw_token(self, item, resample):
+        """Create the canvas items of a token, or update only those whose state changed."""
+        pil = item.get('pil_image')
+        if not pil: return
+        tkimg = self.scene.token_photo(pil, self.zoom, resample)
+        if tkimg is None: return
+        item['tk_image'] = tkimg
+        xw, yw = item['position']; nw, nh = tkimg.width(), tkimg.height()
+        hp = item.get("hp", 10); max_hp = item.get("max_hp", 10)
+        # Pan is already applied by _transform_items: positions are keyed on zoom
+        state = {
+            "geometry": (self.zoom, xw, yw, nw, nh), "image": tkimg,
+            "border": item.get('border_color', '#0000ff'), "hp": (hp, max_hp),
+            "name": item.get('entity_id', ''),
+        }
+        sx, sy = int(xw*self.zoom + self.pan_x), int(yw*self.zoom + self.pan_y)
+        ratio = hp / max_hp if max_hp > 0 else 1.0; hp_color = "#ff3333" if ratio < 0.10 else "#33cc33"
+        circle_diam = max(18, int(nw * 0.25)); cx = sx + nw - circle_diam + 4; cy = sy + nh - circle_diam + 4
+        if item.get('canvas_ids'):
+            drawn = item.get('_drawn') or {}
+            b_id, i_id = item['canvas_ids']; name_id = item.get('name_id'); hp_ids = item.get("hp_canvas_ids")
+            if drawn.get("geometry") != state["geometry"]:
+                self.canvas.coords(b_id, sx-3, sy-3, sx+nw+3, sy+nh+3); self.canvas.coords(i_id, sx, sy)
+                if hp_ids:
+                    self.canvas.coords(hp_ids[0], cx, cy, cx + circle_diam, cy + circle_diam)
+                    self.canvas.coords(hp_ids[1], cx + circle_diam // 2, cy + circle_diam // 2)
+                if name_id: self.canvas.coords(name_id, sx + nw/2, sy + nh + 2)
+            if drawn.get("image") is not tkimg: self.canvas.itemconfig(i_id, image=tkimg)
+            if drawn.get("border") != state["border"]: self.canvas.itemconfig(b_id, outline=state["border"])
+            if hp_ids and drawn.get("hp") != state["hp"]:
+                self.canvas.itemconfig(hp_ids[0], fill=hp_color); self.canvas.itemconfig(hp_ids[1], text=str(hp))
+            if name_id and drawn.get("name") != state["name"]: self.canvas.itemconfig(name_id, text=state["name"])
+        else: 
+            b_id = self.canvas.create_rectangle(sx-3, sy-3, sx+nw+3, sy+nh+3, outline=state["border"], width=3, tags=ITEM_TAG)
+            i_id = self.canvas.create_image(sx, sy, image=tkimg, anchor='nw', tags=ITEM_TAG)
+            tx = sx + nw/2; ty = sy + nh + 2; name_id = self.canvas.create_text(tx, ty, text=state["name"], fill='white', anchor='n', tags=ITEM_TAG); item['name_id'] = name_id
+            cid = self.canvas.create_oval(cx, cy, cx + circle_diam, cy + circle_diam, fill=hp_color, outline="black", width=1, tags=ITEM_TAG)
+            tid = self.canvas.create_text(cx + circle_diam//2, cy + circle_diam//2, text=str(hp), font=("Arial", max(10, circle_diam // 2), "bold"), fill="white", tags=ITEM_TAG)
+            item["hp_canvas_ids"] = (cid, tid)
+            for item_id_hp in (cid, tid):
+                self.canvas.tag_bind(item_id_hp, "<Double-Button-1>", lambda e, t=item: self._on_hp_double_click(e, t))
+                self.canvas.tag_bind(item_id_hp, "<Button-3>", lambda e, t=item: self._on_max_hp_menu_click(e, t))
+            item.update({'canvas_ids': (b_id, i_id), 'name_id': name_id})
+            # One shared stats popup, filled on hover
+            for cid_bind in (b_id, i_id):
+                self.canvas.tag_bind(cid_bind, "<Enter>", lambda e, t=item: show_token_info(self, t))
+                self.canvas.tag_bind(cid_bind, "<Leave>", lambda e, t=item: hide_token_info(self, t))
+            self._bind_item_events(item); stack_new_item(self, item)
+        item['_drawn'] = state
+
+    def _draw_shape(self, item):
+        """Create the canvas item of a shape, or update it only where its state changed."""
+        item_type = item.get("type"); xw, yw = item['position']
+        shape_width = item.get("width", DEFAULT_SHAPE_WIDTH) * self.zoom; shape_height = item.get("height", DEFAULT_SHAPE_HEIGHT) * self.zoom
+        if shape_width <= 0 or shape_height <= 0: return
+        sx, sy = int(xw*self.zoom + self.pan_x), int(yw*self.zoom + self.pan_y)
+        fill_color = item.get("fill_color", "") if item.get("is_filled") else ""; border_color = item.get("border_color", "#000000")
+        state = {"geometry": (self.zoom, xw, yw, shape_width, shape_height), "colors": (fill_color, border_color)}
+        if item.get('canvas_ids') and item['canvas_ids'][0] is not None:
+            drawn = item.get('_drawn') or {}; shape_id = item['canvas_ids'][0]
+            if drawn.get("geometry") != state["geometry"]: self.canvas.coords(shape_id, sx, sy, sx + shape_width, sy + shape_height)
+            if drawn.get("colors") != state["colors"]: self.canvas.itemconfig(shape_id, fill=fill_color, outline=border_color)
+        else:
+            create = self.canvas.create_rectangle if item_type == "rectangle" else self.canvas.create_oval
+            shape_id = create(sx, sy, sx + shape_width, sy + shape_height, fill=fill_color, outline=border_color, width=2, tags=ITEM_TAG)
+            item['canvas_ids'] = (shape_id,) if shape_id else ();
+            if shape_id: self._bind_item_events(item); stack_new_item(self, item)
+        item['_drawn'] = state
+
+    def _render_map_layers(self, resample=Image.LANCZOS):
+        """Draw the visible tiles of the map and its fog mask on the GM canvas."""
+        self.scene.set_images(self.base_img, self.mask_img)
+        # A new canvas is built for each map: layers are tied to their canvas
+        if self._base_layer is None or self._base_layer.canvas is not self.canvas:
+            self._base_layer = CanvasTileLayer(self.canvas, self.scene.base_tiles, MAP_TILE_TAG)
+            self._mask_layer = None
+        self._base_layer.set_source(self.scene.base_tiles)
+        self._base_layer.render(self.zoom, self.pan_x, self.pan_y, resample)
+        if self.mask_img is None:
+            if self._mask_layer: self._mask_layer.clear()
+            return
+        if self._mask_layer is None:
+            self._mask_layer = CanvasTileLayer(
+                self.canvas, self.scene.gm_fog_tiles, FOG_TILE_TAG, above=self._base_layer.anchor_tag
+            )
+        self._mask_layer.set_source(self.scene.gm_fog_tiles)
+        self._mask_layer.render(self.zoom, self.pan_x, self.pan_y, resample)
+
+    def _refresh_fog(self, box=None):
+        """
+        Redraw the fog after mask_img changed, only inside ``box`` (world px)
+        if given. Every canvas showing the fog picks up the new tiles.
+        """
+        if self.scene.mask_img is not self.mask_img:
+            self.scene.set_images(self.base_img, self.mask_img)
+        else:
+            self.scene.fog_changed(box)
+
     def _bind_item_events(self, item):
         if not item.get('canvas_ids'): return
         ids_to_bind = item['canvas_ids']
@@ -406,6 +478,7 @@ class DisplayMapController:
 
         self.selected_token = item
         item["drag_data"] = {"x": event.x, "y": event.y}
+        self._item_index.begin_drag(item)
         # Handles are only drawn if "Edit Shape" is chosen from context menu.
 
     def _on_item_move(self, event, item):
@@ -419,7 +492,7 @@ class DisplayMapController:
             if cid: self.canvas.move(cid, dx, dy)
         if item.get("type", "token") == "token":
             if item.get("name_id"): self.canvas.move(item["name_id"], dx, dy)
-            if item.get("info_widget_id"): self.canvas.move(item["info_widget_id"], dx, dy)
+            if getattr(self, "_info_popup_item", None) is item: place_token_info(self)
             if item.get("hp_canvas_ids"):
                 for hp_cid in item["hp_canvas_ids"]:
                     if hp_cid: self.canvas.move(hp_cid, dx, dy)
@@ -440,7 +513,12 @@ class DisplayMapController:
             # The actual release logic is in _on_resize_handle_release
             return
 
-        item.pop("drag_data", None); self._persist_tokens()
+        item.pop("drag_data", None); self._item_index.end_drag(item); index_item(self, item)
+        self._persist_tokens()
+        # The players' views follow the drop (token images are already scaled)
+        self.scene.changed()
+        if self.fs_canvas: self._update_fullscreen_map()
+        if getattr(self, '_web_server_thread', None): self._update_web_display_map()
 
     def _on_item_right_click(self, event, item):
         item_type = item.get("type", "token")
@@ -521,10 +599,8 @@ class DisplayMapController:
             # and is loaded from an image_path, it needs to be re-processed.
             if "image_path" in token and token["image_path"]:
                 try:
-                    # Image is already imported from PIL at the top of the file
-                    pil_img = Image.open(token["image_path"]).convert("RGBA")
                     # Assuming square tokens for simplicity, adjust if aspect ratio is preserved
-                    token["pil_image"] = pil_img.resize((new_size, new_size), Image.LANCZOS)
+                    token["pil_image"] = load_token_image(token["image_path"], new_size)
                 except FileNotFoundError:
                     print(f"Error: Image file not found for token: {token['image_path']}")
                     # Decide on fallback: keep old image, clear image, or use placeholder
@@ -600,8 +676,8 @@ class DisplayMapController:
         active_item = item_to_copy if item_to_copy else self.selected_token
         #if not active_item: return
         self.clipboard_token = active_item.copy()
-        for key_to_pop in ['pil_image', 'tk_image', 'info_widget', 'entity_record', 
-                           'canvas_ids', 'hp_canvas_ids', 'name_id', 'info_widget_id',
+        for key_to_pop in ['pil_image', 'tk_image', 'info_text', 'entity_record', 
+                           'canvas_ids', 'hp_canvas_ids', 'name_id', '_drawn', 'drag_data',
                            'hp_entry_widget', 'hp_entry_widget_id', 
                            'max_hp_entry_widget', 'max_hp_entry_widget_id']:
             self.clipboard_token.pop(key_to_pop, None)
@@ -628,8 +704,7 @@ class DisplayMapController:
             if "image_path" in new_item_data and new_item_data["image_path"]:
                 try:
                     sz = new_item_data.get("size", self.token_size)
-                    pil_img = Image.open(new_item_data["image_path"]).convert("RGBA")
-                    new_item_data["pil_image"] = pil_img.resize((sz, sz), Image.LANCZOS)
+                    new_item_data["pil_image"] = load_token_image(new_item_data["image_path"], sz)
                 except Exception as e:
                     print(f"Error reloading image for pasted token: {e}")
                     new_item_data["pil_image"] = None # Or a placeholder
@@ -643,7 +718,7 @@ class DisplayMapController:
             new_item_data.setdefault("size", self.token_size)
             new_item_data.setdefault("hp", 10)
             new_item_data.setdefault("max_hp", 10)
-            # entity_record and info_widget are not typically part of clipboard_token
+            # entity_record is not typically part of clipboard_token
 
         elif item_type in ["rectangle", "oval"]:
             # Shape-specific defaults if any were missed in copy (unlikely if copy is good)
@@ -669,9 +744,7 @@ class DisplayMapController:
             if item_to_delete.get("hp_canvas_ids"):
                 for hp_cid in item_to_delete["hp_canvas_ids"]:
                     if hp_cid: self.canvas.delete(hp_cid)
-            if item_to_delete.get("info_widget_id"): self.canvas.delete(item_to_delete["info_widget_id"])
-            if item_to_delete.get("info_widget") and hasattr(item_to_delete["info_widget"], 'destroy'):
-                 item_to_delete["info_widget"].destroy()
+            hide_token_info(self, item_to_delete, now=True)
         # Clean up fullscreen canvas artifacts if present
         if getattr(self, "fs_canvas", None):
             if item_to_delete.get("fs_canvas_ids"):
@@ -691,6 +764,7 @@ class DisplayMapController:
                             pass
                 del item_to_delete["fs_cross_ids"]
         if item_to_delete in self.tokens: self.tokens.remove(item_to_delete)
+        self._item_index.remove(item_to_delete); self._shown_items.pop(id(item_to_delete), None)
         if self.selected_token is item_to_delete: self.selected_token = None
         self._persist_tokens(); self._update_canvas_images()
         try:
@@ -720,6 +794,10 @@ class DisplayMapController:
             print(f"[DEBUG] _send_item_to_back: Sending item to back: {item_description}")
             self.tokens.remove(item)
             self.tokens.insert(0, item) # Move item to the beginning of the logical list
+            # Below the lowest saved item: only this item's row changes
+            lowest = min((t["z"] for t in self.tokens[1:] if t.get("z") is not None), default=None)
+            if lowest is not None:
+                item["z"] = lowest - 1
 
             canvas_ids_to_manage = []
             if item.get('canvas_ids'):
@@ -730,14 +808,14 @@ class DisplayMapController:
                     canvas_ids_to_manage.append(item['name_id'])
                 if item.get('hp_canvas_ids'):
                     canvas_ids_to_manage.extend(hp_id for hp_id in item['hp_canvas_ids'] if hp_id)
-                # Note: info_widget is a Tkinter widget in a canvas window, its stacking is different.
+                # Note: the info popup is a Tkinter widget in a canvas window, its stacking is different.
                 # We primarily care about canvas items drawn directly.
 
             for c_id in canvas_ids_to_manage:
                 if c_id:
                     self.canvas.lower(c_id) # Send to absolute bottom first
-                    if self.base_id: # If map base image exists
-                        self.canvas.lift(c_id, self.base_id) # Then lift it just above the map base image
+                    if self.canvas.find_withtag(f"{MAP_TILE_TAG}_anchor"): # If map base tiles exist
+                        self.canvas.lift(c_id, f"{MAP_TILE_TAG}_anchor") # Then lift it just above the map base image
             
             self._update_canvas_images() # Redraw everything; other items will be drawn on top
             self._persist_tokens()
@@ -831,14 +909,13 @@ class DisplayMapController:
     def save_map(self):
         abs_masks_dir = os.path.abspath(MASKS_DIR); os.makedirs(abs_masks_dir, exist_ok=True)
         if not self.current_map or "Image" not in self.current_map: print("Error: Current map or map image not set. Cannot save mask."); return
-        img_name = os.path.basename(self.current_map["Image"]); base, _ = os.path.splitext(img_name)
-        mask_filename = f"{base}_mask.png"; abs_mask_path = os.path.join(abs_masks_dir, mask_filename)
+        mask_filename = mask_path_for(self.current_map["Image"]); abs_mask_path = os.path.join(abs_masks_dir, mask_filename)
         rel_mask_path = os.path.join("masks/", mask_filename)
-        if self.mask_img: self.mask_img.save(abs_mask_path, format="PNG")
+        if self.mask_img: save_mask(self.mask_img, abs_mask_path)
         else: print("Warning: No fog mask image to save.")
         self.current_map["FogMaskPath"] = rel_mask_path; self._persist_tokens()
         self.current_map.update({"token_size": self.token_size, "pan_x": self.pan_x, "pan_y": self.pan_y, "zoom": self.zoom})
-        all_maps = list(self._maps.values()); self.maps.save_items(all_maps)
+        self.maps.upsert_item(self.current_map)
         try:
             if getattr(self, 'fs', None) and self.fs.winfo_exists() and \
                getattr(self, 'fs_canvas', None) and self.fs_canvas.winfo_exists(): self._update_fullscreen_map()
@@ -926,6 +1003,7 @@ class DisplayMapController:
     load_icon = load_icon
     on_entity_selected = on_entity_selected
     on_paint = on_paint # For fog
+    end_fog_stroke = end_fog_stroke
     open_entity_picker = open_entity_picker
     open_fullscreen = open_fullscreen
     open_web_display = open_web_display
@@ -1050,6 +1128,7 @@ class DisplayMapController:
         }
         if 'drag_data' in item: # Prevent normal item dragging
             del item['drag_data']
+        self._item_index.end_drag(item)
 
 
     def _on_resize_handle_move(self, event):
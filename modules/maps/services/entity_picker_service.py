@@ -24,16 +24,13 @@ def on_entity_selected(self, entity_type, entity_name, picker_frame):
     """
     Called when user picks an NPC or Creature in the selection dialog.
     """
-    items = self._model_wrappers[entity_type].load_items()
-    selected = next(item for item in items if item.get("Name") == entity_name)
-    portrait = selected.get("Portrait")
+    # the full creature/NPC record, so we can show its fields later
+    record = self._model_wrappers[entity_type].get_by_key(entity_name) or {}
+    portrait = record.get("Portrait")
     if isinstance(portrait, dict):
         path = portrait.get("path") or portrait.get("text")
     else:
         path = portrait
-    # find the full creature/NPC record so we can show its fields later
-    all_items = self._model_wrappers[entity_type].load_items()
-    record = next((i for i in all_items if i.get("Name")==entity_name), {})       
     self.add_token(path, entity_type, entity_name, record)
     picker_frame.destroy()
 
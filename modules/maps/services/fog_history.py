@@ -0,0 +1,139 @@
+import zlib
+
+from PIL import Image
+
+from modules.helpers.config_helper import ConfigHelper
+
+HISTORY_TILE = 256  # world pixels per saved block
+
+
+class FogHistory:
+    """
+    Undo/redo of fog strokes that stores only what each stroke changed.
+
+    While a stroke is recorded, every HISTORY_TILE block of the mask it is
+    about to draw into is saved once, zlib-compressed, before the first
+    stamp lands on it. When the stroke ends the same blocks are saved again
+    as they are now. Undo pastes the "before" blocks back, redo the "after"
+    ones. Fog is mostly uniform, so blocks compress to a few hundred bytes.
+
+    History is bounded by a byte budget (``[Fog] undo_budget_mb``, 64 MB by
+    default): the oldest strokes are dropped first.
+    """
+
+    def __init__(self, budget_bytes=None):
+        if budget_bytes is None:
+            try:
+                budget_mb = float(ConfigHelper.get("Fog", "undo_budget_mb", fallback=64))
+            except (TypeError, ValueError):
+                budget_mb = 64
+            budget_bytes = int(budget_mb * 1024 * 1024)
+        self.budget_bytes = budget_bytes
+        self._undo = []
+        self._redo = []
+        self._mask = None
+        self._before = None   # (col, row) -> (box, compressed bytes) of the stroke in progress
+
+    # --- Recording ---------------------------------------------------------
+    def begin(self, mask):
+        """Start recording a stroke drawn into ``mask``."""
+        self._mask = mask
+        self._before = {}
+
+    def touch(self, box):
+        """Call before drawing into ``box`` (world pixels) of the mask."""
+        if self._before is None or self._mask is None:
+            return
+        for key, block in self._blocks(box):
+            if key not in self._before:
+                self._before[key] = (block, _pack(self._mask.crop(block)))
+
+    def commit(self):
+        """Finish the stroke; returns its bounding box, or None if it changed nothing."""
+        before, mask = self._before, self._mask
+        self._before = None
+        if not before or mask is None:
+            return None
+        blocks = []
+        for block, packed_before in before.values():
+            blocks.append((block, packed_before, _pack(mask.crop(block))))
+        entry = _Entry(blocks, mask.mode)
+        self._undo.append(entry)
+        self._redo = []
+        self._enforce_budget()
+        return entry.box
+
+    def clear(self):
+        """Forget all history, e.g. when the whole mask is replaced."""
+        self._undo = []
+        self._redo = []
+        self._before = None
+
+    # --- Undo / redo -------------------------------------------------------
+    def can_undo(self):
+        return bool(self._undo)
+
+    def can_redo(self):
+        return bool(self._redo)
+
+    def undo(self, mask):
+        """Restore the last stroke's region in ``mask``; returns the box changed."""
+        if not self._undo:
+            return None
+        entry = self._undo.pop()
+        entry.apply(mask, after=False)
+        self._redo.append(entry)
+        return entry.box
+
+    def redo(self, mask):
+        """Re-apply the last undone stroke to ``mask``; returns the box changed."""
+        if not self._redo:
+            return None
+        entry = self._redo.pop()
+        entry.apply(mask, after=True)
+        self._undo.append(entry)
+        return entry.box
+
+    # --- Internals ---------------------------------------------------------
+    def size_bytes(self):
+        return sum(e.nbytes for e in self._undo) + sum(e.nbytes for e in self._redo)
+
+    def _enforce_budget(self):
+        while self._undo and self.size_bytes() > self.budget_bytes:
+            self._undo.pop(0)
+
+    def _blocks(self, box):
+        w, h = self._mask.size
+        left, top = max(0, int(box[0])), max(0, int(box[1]))
+        right, bottom = min(w, int(box[2]) + 1), min(h, int(box[3]) + 1)
+        if right <= left or bottom <= top:
+            return
+        t = HISTORY_TILE
+        for row in range(top // t, (bottom - 1) // t + 1):
+            for col in range(left // t, (right - 1) // t + 1):
+                yield (col, row), (
+                    col * t, row * t, min(w, (col + 1) * t), min(h, (row + 1) * t)
+                )
+
+
+class _Entry:
+    __slots__ = ("blocks", "mode", "box", "nbytes")
+
+    def __init__(self, blocks, mode):
+        self.blocks = blocks   # [(box, before, after)]
+        self.mode = mode
+        self.box = (
+            min(b[0][0] for b in blocks), min(b[0][1] for b in blocks),
+            max(b[0][2] for b in blocks), max(b[0][3] for b in blocks),
+        )
+        self.nbytes = sum(len(b[1]) + len(b[2]) for b in blocks)
+
+    def apply(self, mask, after):
+        for box, before, after_bytes in self.blocks:
+            size = (box[2] - box[0], box[3] - box[1])
+            data = zlib.decompress(after_bytes if after else before)
+            mask.paste(Image.frombytes(self.mode, size, data), box[:2])
+
+
+def _pack(image):
+    return zlib.compress(image.tobytes(), 1)
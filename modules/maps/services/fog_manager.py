@@ -1,20 +1,38 @@
-from PIL import ImageDraw, Image, ImageTk
+from PIL import ImageDraw
+from modules.maps.utils.fog_mask import new_mask, FOG, CLEAR
 
 def _set_fog(self, mode):
     self.fog_mode = mode
 
 def clear_fog(self):
-    self.mask_img = Image.new("RGBA", self.base_img.size, (0,0,0,0))
+    if self.base_img is None:
+        return  # the map is still loading
+    self.mask_img = new_mask(self.base_img.size, fogged=False)
+    self.fog_history.clear()
     self._update_canvas_images()
 
 def reset_fog(self):
-    self.mask_img = Image.new("RGBA", self.base_img.size, (0, 0, 0, 128))
+    if self.base_img is None:
+        return  # the map is still loading
+    self.mask_img = new_mask(self.base_img.size)
+    self.fog_history.clear()
     self._update_canvas_images()
 
+# Fog display refreshes are coalesced to at most one per frame
+PAINT_REFRESH_MS = 16
+
+def _brush_box(self, xw, yw):
+    half = self.brush_size / 2
+    return int(xw - half), int(yw - half), int(xw + half), int(yw + half)
+
 def on_paint(self, event):
-    """Paint or erase fog using a square brush of size self.brush_size,
-       with semi-transparent black (alpha=128) for fog."""
-    if any('drag_data' in t for t in self.tokens):
+    """Paint or erase fog using a square brush of size self.brush_size.
+
+    Stamps are interpolated from the previous motion event so fast strokes
+    stay continuous. The mask is drawn immediately, but the display is
+    refreshed once per frame, over the dirty rectangle of the stroke only.
+    """
+    if self._item_index.dragging:
         return
     if not self.mask_img:
         return
@@ -23,43 +41,58 @@ def on_paint(self, event):
     xw = (event.x - self.pan_x) / self.zoom
     yw = (event.y - self.pan_y) / self.zoom
 
-    half = self.brush_size / 2
-    left   = int(xw - half)
-    top    = int(yw - half)
-    right  = int(xw + half)
-    bottom = int(yw + half)
+    last = getattr(self, '_last_paint_pos', None)
+    points = [(xw, yw)]
+    if last is not None:
+        # Stamp every quarter brush along the segment since the last event
+        dx, dy = xw - last[0], yw - last[1]
+        step = max(1.0, self.brush_size / 4)
+        count = int(max(abs(dx), abs(dy)) / step)
+        points = [(last[0] + dx * i / (count + 1), last[1] + dy * i / (count + 1))
+                  for i in range(1, count + 1)] + points
+    self._last_paint_pos = (xw, yw)
 
     draw = ImageDraw.Draw(self.mask_img)
     # actually paint or erase on the mask_img
-    if self.fog_mode == "add":
-        draw_color= (0, 0, 0, 128)  # semi-transparent black
-    else:
-        draw_color= (0, 0, 0, 0) # semi-transparent black
-    if self.brush_shape == "circle":
-        draw.ellipse((left, top, right, bottom), fill=draw_color)
-    else:
-        draw.rectangle((left, top, right, bottom), fill=draw_color)
-    
-    half = self.brush_size/2
-    size      = int(self.brush_size * self.zoom)
-    half_size = size // 2
-    size      = int(self.brush_size * self.zoom)
-    half_size = size // 2
+    # The mask is single-channel; fog colour is applied at display time
+    draw_color = FOG if self.fog_mode == "add" else CLEAR
+    for px, py in points:
+        box = _brush_box(self, px, py)
+        self.fog_history.touch(box)
+        if self.brush_shape == "circle":
+            draw.ellipse(box, fill=draw_color)
+        else:
+            draw.rectangle(box, fill=draw_color)
+        _add_dirty(self, (box[0], box[1], box[2] + 1, box[3] + 1))
 
-    # Directly center on the mouse‐pointer (event.x/event.y):
-    px = event.x - half_size
-    py = event.y - half_size
+    if not getattr(self, '_paint_refresh_id', None):
+        self._paint_refresh_id = self.canvas.after(PAINT_REFRESH_MS, lambda: flush_fog_paint(self))
 
-    
-    # —— only resize & blit the mask ——
-    w, h = self.base_img.size
-    sw, sh = int(w * self.zoom), int(h * self.zoom)
-
-    # use the interactive (fast) filter
-    mask_resized = self.mask_img.resize((sw, sh), resample=self._fast_resample)
-    self.mask_tk = ImageTk.PhotoImage(mask_resized)
+def _add_dirty(self, box):
+    dirty = getattr(self, '_fog_dirty', None)
+    if dirty is None:
+        self._fog_dirty = box
+    else:
+        self._fog_dirty = (min(dirty[0], box[0]), min(dirty[1], box[1]),
+                           max(dirty[2], box[2]), max(dirty[3], box[3]))
 
-    # update the existing canvas image item
-    self.canvas.itemconfig(self.mask_id, image=self.mask_tk)
-    self.canvas.coords(self.mask_id, self.pan_x, self.pan_y)
+def flush_fog_paint(self):
+    """Redraw the fog tiles under the region painted since the last flush."""
+    if getattr(self, '_paint_refresh_id', None):
+        try:
+            self.canvas.after_cancel(self._paint_refresh_id)
+        except Exception:
+            pass
+    self._paint_refresh_id = None
+    dirty = getattr(self, '_fog_dirty', None)
+    self._fog_dirty = None
+    if dirty is not None:
+        self._refresh_fog(dirty)
 
+def end_fog_stroke(self):
+    """Finish a stroke: show what is left and stop interpolating from it."""
+    flush_fog_paint(self)
+    self._last_paint_pos = None
+    # Players' web view gets the stroke once, when it is done
+    if getattr(self, '_web_server_thread', None):
+        self._update_web_display_map()
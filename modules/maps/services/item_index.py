@@ -0,0 +1,94 @@
+# Glue between the controller's items (self.tokens) and its SpatialIndex
+# (self._item_index): bounds, culling, hit tests and canvas stacking.
+
+# Screen pixels around the view where items are still drawn, so labels and
+# HP badges hanging off a token's box do not pop in at the edges
+CULL_MARGIN = 40
+
+
+def item_bounds(self, item):
+    """World-space (left, top, right, bottom) of a token or shape."""
+    x, y = item.get("position", (0, 0))
+    if item.get("type", "token") == "token":
+        pil = item.get("pil_image")
+        w, h = pil.size if pil is not None else (item.get("size", self.token_size),) * 2
+    else:
+        w, h = item.get("width", 50), item.get("height", 50)
+    return (min(x, x + w), min(y, y + h), max(x, x + w), max(y, y + h))
+
+
+def index_item(self, item):
+    """Record where ``item`` is now, after it moved or was resized."""
+    self._item_index.update(item, item_bounds(self, item))
+
+
+def sync_item_index(self):
+    """Index items added to (and drop items removed from) self.tokens since the last call."""
+    index = self._item_index
+    if len(index) == len(self.tokens):
+        return
+    live = {id(t) for t in self.tokens}
+    for item in index.items():
+        if id(item) not in live:
+            index.remove(item)
+    for item in self.tokens:
+        if item not in index:
+            index_item(self, item)
+
+
+def visible_items(self):
+    """The items on screen (or just off it), in no particular order."""
+    sync_item_index(self)
+    cw, ch = self.canvas.winfo_width(), self.canvas.winfo_height()
+    if cw <= 1 or ch <= 1:
+        return list(self.tokens)  # not laid out yet: nothing to cull against
+    m = CULL_MARGIN
+    return self._item_index.query((
+        (-m - self.pan_x) / self.zoom, (-m - self.pan_y) / self.zoom,
+        (cw + m - self.pan_x) / self.zoom, (ch + m - self.pan_y) / self.zoom,
+    ))
+
+
+def item_at(self, x, y):
+    """
+    The topmost item drawn under the screen point (x, y), or None. The
+    index only picks the items whose box holds the point; the canvas then
+    decides, like the items' own bindings, so an oval's corners or the
+    inside of an unfilled shape are not hits.
+    """
+    sync_item_index(self)
+    hits = self._item_index.at((x - self.pan_x) / self.zoom, (y - self.pan_y) / self.zoom)
+    if not hits:
+        return None
+    owners = {cid: item for item in hits for cid in item_canvas_ids(item)}
+    cx, cy = self.canvas.canvasx(x), self.canvas.canvasy(y)
+    # find_overlapping lists items bottom to top
+    for cid in reversed(self.canvas.find_overlapping(cx, cy, cx, cy)):
+        item = owners.get(cid)
+        if item is not None:
+            return item
+    return None
+
+
+def item_canvas_ids(item):
+    """Canvas ids drawn for an item on the GM canvas, bottom to top."""
+    ids = list(item.get("canvas_ids") or ())
+    if item.get("name_id"):
+        ids.append(item["name_id"])
+    ids.extend(item.get("hp_canvas_ids") or ())
+    return [cid for cid in ids if cid]
+
+
+def stack_new_item(self, item):
+    """
+    Put the canvas items just created for ``item`` below those of the next
+    item up in self.tokens: items are created when first scrolled into
+    view, not in stacking order.
+    """
+    index = self.tokens.index(item)
+    for above in self.tokens[index + 1:]:
+        above_ids = item_canvas_ids(above)
+        if above_ids:
+            for cid in item_canvas_ids(item):
+                self.canvas.tag_lower(cid, above_ids[0])
+            return
@@ -0,0 +1,144 @@
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from modules.maps.utils.fog_mask import load_mask, new_mask
+from modules.maps.utils.tile_pyramid import TilePyramid, TileSource, CanvasTileLayer
+from modules.maps.utils.token_images import load_token_image
+
+PREVIEW_SIDE = 1024       # longest side of the low-resolution preview
+MAP_LOAD_POLL_MS = 30     # how often the Tk thread picks up finished work
+PREVIEW_TILE_TAG = "map_preview"
+
+# Decoding runs here; every Tk call stays on the main thread
+_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="map-load")
+
+
+def start_map_load(self, image_path, mask_path):
+    """
+    Decode the map, its fog mask and the token portraits in the background.
+
+    Results come back in order of completion through a queue drained on
+    the Tk thread with ``after``: a low-resolution preview of the map
+    first, then the full map together with its mask (players never see
+    the map before its fog), and each token as soon as its image is ready.
+    Opening another map abandons the results of this one.
+    """
+    self._map_load_id = getattr(self, "_map_load_id", 0) + 1
+    load_id = self._map_load_id
+    results = queue.Queue()
+    self._map_load_pending = {"base": None, "mask": None}
+
+    def post(kind, *payload):
+        results.put((kind, payload))
+
+    _pool.submit(_decode_map, image_path, mask_path, post)
+    pending = 1
+    for item, path, size in _token_jobs(self):
+        _pool.submit(_decode_token, item, path, size, post)
+        pending += 1
+    self._map_load_remaining = pending
+    _poll_map_load(self, load_id, results)
+
+
+def _token_jobs(self):
+    for item in self.tokens:
+        if item.get("type", "token") == "token" and item.get("pil_image") is None:
+            yield item, item.get("image_path"), item.get("size", self.token_size)
+
+
+def _decode_map(image_path, mask_path, post):
+    try:
+        img = Image.open(image_path)
+        size = img.size
+        if max(size) > PREVIEW_SIDE:
+            if img.format == "JPEG":
+                # JPEG decodes straight to a fraction of its size
+                preview_src = Image.open(image_path)
+                preview_src.draft("RGB", (size[0] // 4, size[1] // 4))
+                preview = preview_src.convert("RGBA")
+                preview.thumbnail((PREVIEW_SIDE, PREVIEW_SIDE))
+                post("preview", preview, size)
+                full = img.convert("RGBA")
+            else:
+                full = img.convert("RGBA")
+                preview = full.copy()
+                preview.thumbnail((PREVIEW_SIDE, PREVIEW_SIDE), Image.BILINEAR)
+                post("preview", preview, size)
+        else:
+            full = img.convert("RGBA")
+        # The mask needs the map size: load it before handing the map over
+        mask = load_mask(mask_path, size) if mask_path else None
+        post("map", full, mask)
+    except Exception as e:
+        post("map_failed", image_path, e)
+
+
+def _decode_token(item, path, size, post):
+    try:
+        pil = load_token_image(path, size)
+    except Exception as e:
+        print(f"[map_loader] Failed to load token image '{path}': {e}. Creating placeholder.")
+        pil = Image.new("RGBA", (size, size), (255, 0, 0, 128))  # Red placeholder
+    post("token", item, pil)
+
+
+def _poll_map_load(self, load_id, results):
+    if load_id != self._map_load_id:
+        return  # another map was opened meanwhile
+    tokens_ready = False
+    while True:
+        try:
+            kind, payload = results.get_nowait()
+        except queue.Empty:
+            break
+        if kind == "preview":
+            _show_preview(self, *payload)
+        elif kind == "map":
+            self._map_load_remaining -= 1
+            _show_map(self, *payload)
+        elif kind == "map_failed":
+            self._map_load_remaining -= 1
+            _clear_preview(self)
+            print(f"[map_loader] Failed to load map image '{payload[0]}': {payload[1]}")
+        elif kind == "token":
+            self._map_load_remaining -= 1
+            item, pil = payload
+            if item in self.tokens:
+                item["pil_image"] = pil
+                tokens_ready = True
+    # One redraw for every token that finished since the last poll
+    if tokens_ready and self.base_img is not None:
+        self._update_canvas_images()
+    if self._map_load_remaining > 0:
+        self.canvas.after(MAP_LOAD_POLL_MS, lambda: _poll_map_load(self, load_id, results))
+    elif getattr(self, '_web_server_thread', None):
+        self._update_web_display_map()
+
+
+def _show_preview(self, preview, size):
+    """Draw the low-resolution map on the GM canvas, scaled to the full map's size."""
+    if self.base_img is not None:
+        return
+    scale = preview.width / size[0]
+    layer = CanvasTileLayer(self.canvas, TileSource(TilePyramid(preview)), PREVIEW_TILE_TAG)
+    layer.render(self.zoom / scale, self.pan_x, self.pan_y, Image.BILINEAR)
+    self._preview_layer = layer
+
+
+def _clear_preview(self):
+    layer = getattr(self, "_preview_layer", None)
+    if layer is not None:
+        layer.clear()
+        self.canvas.delete(layer.anchor_tag)
+        self._preview_layer = None
+
+
+def _show_map(self, base_img, mask_img):
+    self.base_img = base_img
+    self.mask_img = mask_img if mask_img is not None else new_mask(base_img.size)
+    # Strokes recorded on the previous map do not apply to this one
+    self.fog_history.clear()
+    self._update_canvas_images()
+    _clear_preview(self)
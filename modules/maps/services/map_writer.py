@@ -0,0 +1,139 @@
+import logging
+import threading
+import time
+
+from db.db import resolve_db_path, write_connection, write_map_items, delete_map_items
+
+# A burst of edits (drag, paste, HP clicks...) is written once
+WRITE_DELAY_SECONDS = 0.25
+# Wait before retrying a batch that failed (database locked, share offline...)
+RETRY_DELAY_SECONDS = 5
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+class MapWriter:
+    """
+    The single background writer of the map items (tokens and shapes, see
+    db.db.map_items) of one campaign database.
+
+    ``save_items`` only records the changed and removed items of a map:
+    changes queued for the same item replace each other, so a burst of
+    edits costs one write of the latest state. The thread writes whatever
+    is pending shortly after the first change. A batch that fails to write
+    is logged and queued again, under any newer change, and retried after
+    RETRY_DELAY_SECONDS. ``flush`` blocks until everything queued is on
+    disk, or until an attempt made for it failed.
+    """
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path    # campaign database the queued items belong to
+        self._cond = threading.Condition()
+        self._pending_items = {}  # map key -> {item_id: latest row, or None if removed}
+        self._writing = False
+        self._flushing = 0
+        self._attempts = 0        # batches tried so far
+        self.last_error = None    # exception of the last batch, None once one succeeds
+        self._thread = threading.Thread(target=self._run, daemon=True, name="map-writer")
+        self._thread.start()
+
+    def save_items(self, map_name, changed=(), removed=()):
+        """Queue ``changed`` item rows (with their item_id) and ``removed`` item ids of a map."""
+        with self._cond:
+            items = self._pending_items.setdefault(map_name, {})
+            for row in changed:
+                items[row["item_id"]] = row
+            for item_id in removed:
+                items[item_id] = None
+            self._cond.notify_all()
+
+    def _idle(self):
+        return not self._pending_items and not self._writing
+
+    def flush(self, timeout=None):
+        """
+        Write pending items now and wait until they are saved. False on
+        timeout, or if writing them failed (they stay queued).
+        """
+        with self._cond:
+            self._flushing += 1
+            self._cond.notify_all()
+            start = self._attempts
+            # A batch already being written may predate the flush
+            tries = start + (2 if self._writing else 1)
+            try:
+                self._cond.wait_for(
+                    lambda: self._idle() or (
+                        self.last_error is not None and not self._writing
+                        and self._attempts >= tries
+                    ),
+                    timeout
+                )
+                return self._idle()
+            finally:
+                self._flushing -= 1
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending_items)
+                if self.last_error is not None:
+                    # Back off after a failure, even when a flush is waiting
+                    retry_at = time.monotonic() + RETRY_DELAY_SECONDS
+                    self._cond.wait_for(lambda: time.monotonic() >= retry_at, RETRY_DELAY_SECONDS)
+                # Let the burst settle, unless someone is waiting for it
+                self._cond.wait_for(lambda: self._flushing, WRITE_DELAY_SECONDS)
+                items = self._pending_items
+                self._pending_items = {}
+                self._writing = True
+            error = None
+            try:
+                if self.db_path is not None and resolve_db_path() != self.db_path:
+                    # Never retry into the campaign that was switched to
+                    logging.error("Map writer dropped unsaved changes of %s: the database was switched",
+                                  self.db_path)
+                    items = {}
+                if items:
+                    with write_connection(invalidate_caches=False) as conn:
+                        cursor = conn.cursor()
+                        for map_name, changes in items.items():
+                            write_map_items(cursor, map_name, [r for r in changes.values() if r is not None])
+                            delete_map_items(cursor, map_name, [i for i, r in changes.items() if r is None])
+            except Exception as e:
+                error = e
+                logging.exception("Map writer failed to save the items of %d map(s); will retry", len(items))
+            finally:
+                with self._cond:
+                    if error is not None:
+                        self._requeue(items)
+                    self.last_error = error
+                    self._attempts += 1
+                    self._writing = False
+                    self._cond.notify_all()
+
+    def _requeue(self, items):
+        # Caller holds the lock. Changes queued since the batch was taken win.
+        for map_name, changes in items.items():
+            newer = self._pending_items.get(map_name, {})
+            merged = dict(changes)
+            merged.update(newer)
+            self._pending_items[map_name] = merged
+
+
+def map_writer(maps):
+    """The writer of the items of ``maps`` for the current campaign database."""
+    key = (resolve_db_path(), maps.table)
+    with _writers_lock:
+        writer = _writers.get(key)
+        if writer is None:
+            writer = _writers[key] = MapWriter(key[0])
+        return writer
+
+
+def flush_map_writers(timeout=None):
+    """Wait for every queued map write; call before closing or switching the database."""
+    with _writers_lock:
+        writers = list(_writers.values())
+    for writer in writers:
+        writer.flush(timeout)
@@ -0,0 +1,134 @@
+from PIL import Image
+
+from modules.maps.utils.tile_pyramid import TilePyramid, TileSource
+from modules.maps.utils.fog_mask import fog_overlay, binarize_mask, GM_FOG_ALPHA, PLAYER_FOG_ALPHA
+from modules.maps.utils.token_images import scaled_token_image, scaled_token_photo
+
+
+def _gm_fog(tile):
+    return fog_overlay(tile, GM_FOG_ALPHA)
+
+
+def _player_fog(tile):
+    # Resampled edges are fog too: players never see through partial fog
+    return fog_overlay(binarize_mask(tile), PLAYER_FOG_ALPHA)
+
+
+class SceneCompositor:
+    """
+    The scaled layers of the map on display, computed once per change and
+    shared by every view of it: the GM canvas, the players' fullscreen
+    window and the web display.
+
+    - ``base_tiles`` holds the map tiles for both Tk canvases.
+    - ``gm_fog_tiles`` / ``player_fog_tiles`` hold the fog tiles, translucent
+      for the GM and opaque for players, both cut from one mask pyramid.
+    - ``token_image`` / ``token_photo`` return each token scaled to a zoom,
+      as PIL (web) or PhotoImage (Tk), from the shared token image cache.
+    - ``scaled_base`` / ``scaled_player_fog`` return layers at a zoom for
+      the PIL back-end, whole or cropped to a viewport ``box`` before
+      scaling, and cached until the map or the fog changes.
+
+    ``version`` is bumped on every change, so back-ends can tell whether
+    what they rendered last is still current; ``fog_version`` only when
+    the fog changes.
+    """
+
+    def __init__(self):
+        self.base_img = None
+        self.mask_img = None
+        self.base_pyramid = None
+        self.mask_pyramid = None
+        self.base_tiles = None
+        self.gm_fog_tiles = None
+        self.player_fog_tiles = None
+        self.version = 0
+        self.fog_version = 0
+        self._layers = {}              # (name, zoom, box) -> PIL image
+
+    def changed(self):
+        """Something in the scene moved or changed (tokens, view)."""
+        self.version += 1
+
+    # --- Map and fog -------------------------------------------------------
+    def set_images(self, base_img, mask_img):
+        """Show ``base_img`` under ``mask_img``; only what changed is rebuilt."""
+        if base_img is not self.base_img:
+            self.base_img = base_img
+            self.base_pyramid = TilePyramid(base_img) if base_img is not None else None
+            if self.base_tiles is None:
+                self.base_tiles = TileSource(self.base_pyramid)
+            elif self.base_pyramid is not None:
+                self.base_tiles.set_pyramid(self.base_pyramid)
+            self._drop_layers("base")
+            self.changed()
+        if mask_img is not self.mask_img:
+            self.mask_img = mask_img
+            self.mask_pyramid = TilePyramid(mask_img) if mask_img is not None else None
+            if self.mask_pyramid is not None:
+                if self.gm_fog_tiles is None:
+                    self.gm_fog_tiles = TileSource(self.mask_pyramid, tile_filter=_gm_fog)
+                    self.player_fog_tiles = TileSource(self.mask_pyramid, tile_filter=_player_fog)
+                else:
+                    self.gm_fog_tiles.set_pyramid(self.mask_pyramid)
+                    self.player_fog_tiles.set_pyramid(self.mask_pyramid)
+            self._drop_layers("fog")
+            self.fog_version += 1
+            self.changed()
+
+    def fog_changed(self, box=None):
+        """The mask was drawn on, inside ``box`` (world pixels) if given."""
+        if self.mask_pyramid is None:
+            return
+        self.mask_pyramid.invalidate(box)
+        self.gm_fog_tiles.invalidate(box)
+        self.player_fog_tiles.invalidate(box)
+        self._drop_layers("fog")
+        self.fog_version += 1
+        self.changed()
+
+    def scaled_base(self, zoom, resample=Image.LANCZOS, box=None):
+        """
+        The map at ``zoom``, as a PIL image: whole, or only the screen-pixel
+        ``box`` of it (clipped to the map), or None if that is empty.
+        """
+        return self._layer("base", self.base_pyramid, zoom, resample, box)
+
+    def scaled_player_fog(self, zoom, resample=Image.LANCZOS, box=None):
+        """
+        The players' fog at ``zoom`` (and ``box``, as for ``scaled_base``),
+        as binary RGBA fog, or None without a mask.
+        """
+        mask = self._layer("fog_mask", self.mask_pyramid, zoom, resample, box)
+        if mask is None:
+            return None
+        key = ("fog", zoom, box)
+        fog = self._layers.get(key)
+        if fog is None:
+            fog = self._layers[key] = _player_fog(mask)
+        return fog
+
+    def _layer(self, name, pyramid, zoom, resample, box=None):
+        if pyramid is None:
+            return None
+        key = (name, zoom, box)
+        if key not in self._layers:
+            # One view per layer is kept: the views all show the same one
+            self._drop_layers(name)
+            self._layers[key] = pyramid.scaled(zoom, resample, box)
+        return self._layers[key]
+
+    def _drop_layers(self, name):
+        # The fog overlay goes with the scaled mask it is built from
+        names = ("fog", "fog_mask") if name.startswith("fog") else (name,)
+        for key in [k for k in self._layers if k[0] in names]:
+            del self._layers[key]
+
+    # --- Tokens ------------------------------------------------------------
+    def token_image(self, pil, zoom, resample=Image.LANCZOS):
+        """``pil`` scaled by ``zoom``, or None if that makes it empty."""
+        return scaled_token_image(pil, zoom, resample)
+
+    def token_photo(self, pil, zoom, resample=Image.LANCZOS):
+        """PhotoImage of ``pil`` scaled by ``zoom``, shared by the Tk canvases."""
+        return scaled_token_photo(pil, zoom, resample)
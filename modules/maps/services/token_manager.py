@@ -1,13 +1,15 @@
-import json
-from PIL import Image, ImageTk
-import customtkinter as ctk
+import uuid
+from PIL import ImageTk
 from tkinter import messagebox, colorchooser
 import os
 from modules.helpers.config_helper import ConfigHelper
 from modules.ui.image_viewer import show_portrait
+from modules.maps.utils.token_images import load_token_image
+from modules.maps.services.map_writer import map_writer
+from modules.maps.services.item_index import index_item
+from modules.maps.views.token_info_popup import hide_token_info, place_token_info
 import tkinter.simpledialog as sd
 import tkinter as tk
-import threading
 
 def add_token(self, path, entity_type, entity_name, entity_record=None):
     img_path = path
@@ -22,8 +24,7 @@ def add_token(self, path, entity_type, entity_name, entity_record=None):
         )
         return
 
-    pil_img = Image.open(img_path).convert("RGBA")
-    pil_img = pil_img.resize((self.token_size, self.token_size), resample=Image.LANCZOS)
+    pil_img = load_token_image(img_path, self.token_size)
 
     # Get canvas center in world coords
     self.canvas.update_idletasks()
@@ -32,14 +33,6 @@ def add_token(self, path, entity_type, entity_name, entity_record=None):
     xw_center = (cw/2 - self.pan_x) / self.zoom
     yw_center = (ch/2 - self.pan_y) / self.zoom
 
-    # Hydrate the info box
-    raw = entity_record.get("Stats", "") if entity_type == "Creature" else entity_record.get("Traits", "")
-    display = "\n".join(map(str, raw)) if isinstance(raw, (list, tuple)) else str(raw)
-    height = self.token_size * 2
-    info_widget = ctk.CTkTextbox(self.canvas, width=100, height=height, wrap="word")
-    info_widget._textbox.delete("1.0", "end")
-    info_widget._textbox.insert("1.0", display)
-
     token = {
         "entity_type":  entity_type,
         "entity_id":    entity_name,
@@ -47,8 +40,7 @@ def add_token(self, path, entity_type, entity_name, entity_record=None):
         "pil_image":    pil_img,
         "position":     (xw_center, yw_center),
         "border_color": "#0000ff",
-        "entity_record": entity_record or {},
-        "info_widget": info_widget,  # ✅ fix crash here
+        "entity_record": entity_record or {},  # the info popup reads its stats from here
         "hp": 10,
         "hp_label_id": None,
         "hp_entry": None,
@@ -68,6 +60,7 @@ def _on_token_press(self, event, token):
     # mark this as the “selected” token for copy/paste
     self.selected_token = token
     token["drag_data"] = {"x": event.x, "y": event.y}
+    self._item_index.begin_drag(token)
 
 def _on_token_move(self, event, token):
     dx = event.x - token["drag_data"]["x"]
@@ -80,9 +73,8 @@ def _on_token_move(self, event, token):
     if name_id:
         self.canvas.move(name_id, dx, dy)
     token["drag_data"] = {"x": event.x, "y": event.y}
-    info_widget_id = token.get("info_widget_id")
-    if info_widget_id:
-        self.canvas.move(info_widget_id, dx, dy)
+    if getattr(self, "_info_popup_item", None) is token:
+        place_token_info(self)
     sx, sy = self.canvas.coords(i_id)
     if "hp_canvas_ids" in token:
         cid, tid = token["hp_canvas_ids"]
@@ -92,6 +84,8 @@ def _on_token_move(self, event, token):
 
 def _on_token_release(self, event, token):
     token.pop("drag_data", None)
+    self._item_index.end_drag(token)
+    index_item(self, token)
     # debounce any pending save
     try:
         self.canvas.after_cancel(self._persist_after_id)
@@ -127,8 +121,7 @@ def _paste_token(self, event=None):
     vcy = (self.canvas.winfo_height() // 2 - self.pan_y) / self.zoom
 
     # Re-create the PIL image at the original token size
-    pil_img = Image.open(c["image_path"]).convert("RGBA") \
-                .resize((c["size"], c["size"]), Image.LANCZOS)
+    pil_img = load_token_image(c["image_path"], c["size"])
 
     # Clone all relevant fields into a new token dict
     token = {
@@ -163,9 +156,7 @@ def _resize_token_dialog(self, token):
 
     # 1) update the token’s PIL image & stored size
     try:
-        pil = Image.open(token["image_path"]) \
-                .convert("RGBA") \
-                .resize((new_size, new_size), Image.LANCZOS)
+        pil = load_token_image(token["image_path"], new_size)
     except Exception as e:
         messagebox.showerror("Error", f"Could not resize token image:\n{e}")
         return
@@ -183,7 +174,7 @@ def _resize_token_dialog(self, token):
     # 3) persist both tokens *and* the global slider
     self._persist_tokens()
     self.current_map["token_size"] = self.token_size
-    self.maps.save_items(list(self._maps.values()))
+    self.maps.patch_fields(self.current_map["Name"], {"token_size": self.token_size})
 
 def _change_token_border_color(self, token):
     """Open a color chooser and update the token’s border."""
@@ -234,11 +225,8 @@ def _delete_token(self, token):
         token["max_hp_entry_widget"].destroy()
         del token["max_hp_entry_widget"], token["max_hp_entry_widget_id"]
 
-    # 6) The info widget on the right
-    if "info_widget_id" in token:
-        self.canvas.delete(token["info_widget_id"])
-        token["info_widget"].destroy()
-        del token["info_widget"], token["info_widget_id"]
+    # 6) The info popup, if it shows this token
+    hide_token_info(self, token, now=True)
 
     # 7) Fullscreen mirror items, if present
     if getattr(self, "fs_canvas", None):
@@ -255,12 +243,18 @@ def _delete_token(self, token):
 
     # 8) Finally remove from state & persist
     self.tokens.remove(token)
+    self._item_index.remove(token)
+    self._shown_items.pop(id(token), None)
     self._persist_tokens()
 
-def _persist_tokens(self):
-    """Quickly capture token state, then hand off the heavy write to a daemon thread."""
-    # 1) Build the JSON in–memory (cheap)
-    data = []
+def _item_rows(self):
+    """
+    {item_id: row} of the tokens and shapes as stored in map_items. Items
+    get a stable item_id and a z (stacking order) the first time they are
+    saved; z is only changed where the stacking order changed.
+    """
+    rows = {}
+    prev_z = None
     for t in self.tokens:
         try:
             x, y = t["position"]
@@ -294,21 +288,28 @@ def _persist_tokens(self):
             else:
                 # Silently skip unknown types for now
                 continue
-
-            data.append(item_data)
         except Exception as e:
             print(f"Error processing item {t} for persistence: {e}")
             continue
 
-    self.current_map["Tokens"] = json.dumps(data)
-    all_maps = list(self._maps.values())
+        # Pasted items may carry the id of the one they were copied from
+        if not t.get("item_id") or t["item_id"] in rows:
+            t["item_id"] = uuid.uuid4().hex
+        z = t.get("z")
+        if z is None or (prev_z is not None and z <= prev_z):
+            z = t["z"] = 0 if prev_z is None else prev_z + 1
+        prev_z = z
+        item_data.update({"item_id": t["item_id"], "z": z})
+        rows[t["item_id"]] = item_data
+    return rows
 
-    # 2) Fire‐and‐forget the actual disk write so the UI never blocks
-    
-    def _write_maps():
-            try:
-                    self.maps.save_items(all_maps)
-            except Exception as e:
-                    print(f"[persist_tokens] Background save error: {e}")
-
-    threading.Thread(target=_write_maps, daemon=True).start()
+def _persist_tokens(self):
+    """Quickly capture token state, then queue the items that changed for the background writer."""
+    rows = _item_rows(self)
+    saved = getattr(self, "_persisted_items", None) or {}
+    changed = [row for item_id, row in rows.items() if saved.get(item_id) != row]
+    removed = [item_id for item_id in saved if item_id not in rows]
+    self._persisted_items = rows
+    if changed or removed:
+        # Moving one token rewrites one map_items row
+        map_writer(self.maps).save_items(self.current_map["Name"], changed, removed)
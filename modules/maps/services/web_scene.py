@@ -0,0 +1,355 @@
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageDraw
+
+from modules.helpers.config_helper import ConfigHelper
+
+KEEPALIVE_SECONDS = 15
+
+# Pillow format name, mime type, and whether it keeps transparency
+_FORMATS = {
+    "png":  ("PNG", "image/png", True),
+    "webp": ("WEBP", "image/webp", True),
+    "jpeg": ("JPEG", "image/jpeg", False),
+}
+
+
+def _config_format():
+    fmt = str(ConfigHelper.get("MapServer", "image_format", fallback="png")).strip().lower()
+    if fmt == "jpg":
+        return "jpeg"
+    return fmt if fmt in _FORMATS else "png"
+
+
+def _config_quality():
+    try:
+        return max(1, min(100, int(ConfigHelper.get("MapServer", "image_quality", fallback=80))))
+    except (TypeError, ValueError):
+        return 80
+
+
+def _config_widths():
+    raw = ConfigHelper.get("MapServer", "image_widths", fallback="640,1280,1920")
+    widths = []
+    for part in str(raw).split(","):
+        try:
+            widths.append(int(part))
+        except ValueError:
+            continue
+    return sorted(w for w in widths if w > 0)
+
+
+class WebScene:
+    """
+    What the players' web display shows, handed from the Tk thread to the
+    web server threads.
+
+    The view is split in layers so that only what changed is sent: the map
+    with its shapes (``base``), the players' fog on top (``fog``), and the
+    tokens in between, each an <img> the browser positions itself.
+    ``frame_version`` changes when the map or fog layers change (view,
+    fog, shapes); ``version`` changes on any update, token moves included.
+
+    The Tk thread only publishes a snapshot (already scaled images, shape
+    geometry). Compositing and encoding run on a background worker, once
+    per version, format and width; results are cached until a newer
+    version replaces them. Server threads wait for changes with ``wait``
+    and fetch encoded images with ``image``.
+
+    ``[MapServer]`` settings: ``image_format`` (png, webp or jpeg; layers
+    that need transparency stay PNG with jpeg, and browsers without WebP
+    get PNG), ``image_quality`` for the lossy formats, and
+    ``image_widths``, the downscaled widths offered to ``?w=`` hints.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self.version = 0
+        self.frame_version = 0
+        self.layer_key = None
+        self.size = (0, 0)
+        self.fog_size = None
+        self.fog_offset = (0, 0)
+        self.tokens = {}          # token id -> state dict (see token_state)
+        self.closed = False
+        self.format = _config_format()
+        self.quality = _config_quality()
+        self.widths = _config_widths()
+        self._spec = None         # snapshot the current frame is rendered from
+        self._layers = {}         # (layer, ident) -> rendered PIL image
+        self._encoded = {}        # (layer, ident, format, width) -> bytes
+        self._pending = {}        # same keys -> Event, while being encoded
+        self._worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="web-encode")
+
+    # --- Tk thread ---------------------------------------------------------
+    def publish(self, layer_key, spec, tokens):
+        """
+        Make ``tokens`` current, and the frame ``spec`` (see render_frame)
+        when ``layer_key`` changed. Only the Tk thread publishes, so it may
+        compare ``layer_key`` beforehand without the lock and skip building
+        the spec. Returns False if nothing changed or the scene is closed.
+        """
+        with self._cond:
+            if self.closed:
+                return False
+            frame_changed = layer_key != self.layer_key
+            if not frame_changed and _public(tokens) == _public(self.tokens):
+                return False
+            if frame_changed:
+                self._spec = spec
+                self.size = spec["size"]
+                fog = spec.get("fog")
+                self.fog_size = fog.size if fog is not None else None
+                self.fog_offset = spec.get("fog_offset", (0, 0))
+                self.layer_key = layer_key
+                self.frame_version += 1
+            self.tokens = tokens
+            self.version += 1
+            # Only images of the current frame, view and tokens are kept
+            live = {("base", self.frame_version), ("fog", self.frame_version), ("map", self.version)}
+            live.update(("token", (tid, t["img"])) for tid, t in tokens.items())
+            self._layers = {k: v for k, v in self._layers.items() if k in live}
+            self._encoded = {k: v for k, v in self._encoded.items() if k[:2] in live}
+            self._cond.notify_all()
+            # Have the default variants ready before the browsers ask; under
+            # the lock so close() cannot shut the worker down in between
+            self._worker.submit(self._prewarm, self.version, frame_changed)
+        return True
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+        self._worker.shutdown(wait=False)
+
+    # --- Server threads ----------------------------------------------------
+    def state(self):
+        """The whole view, as sent to a client that just connected."""
+        with self._cond:
+            return {
+                "version": self.version,
+                "frame": self.frame_version,
+                "width": self.size[0],
+                "height": self.size[1],
+                "fog": self.fog_size is not None,
+                "fog_x": self.fog_offset[0],
+                "fog_y": self.fog_offset[1],
+                "fog_w": self.fog_size[0] if self.fog_size else 0,
+                "fog_h": self.fog_size[1] if self.fog_size else 0,
+                "tokens": _public(self.tokens),
+            }
+
+    def wait(self, version, timeout=KEEPALIVE_SECONDS):
+        """Block until ``version`` is out of date (True) or ``timeout`` passes."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.closed or self.version != version, timeout)
+            return not self.closed and self.version != version
+
+    def pick_format(self, layer, accepts=None):
+        """The configured format for ``layer``, or PNG where it cannot be used."""
+        fmt = self.format
+        if fmt == "jpeg" and layer in ("fog", "token"):
+            fmt = "png"  # these need transparency
+        if fmt == "webp" and accepts is not None and "image/webp" not in accepts:
+            fmt = "png"
+        return fmt
+
+    def pick_width(self, hint):
+        """The smallest configured width covering a ``?w=`` hint, or None for full size."""
+        try:
+            hint = int(hint)
+        except (TypeError, ValueError):
+            return None
+        with self._cond:
+            full = self.size[0]
+        for width in self.widths:
+            if hint <= width < full:
+                return width
+        return None
+
+    def image(self, layer, token_id=None, fmt="png", width=None):
+        """
+        (etag, mime type, bytes) of a layer of the current view, encoded as
+        ``fmt`` and scaled so the whole frame is ``width`` wide, or None.
+        """
+        with self._cond:
+            if layer == "token":
+                token = self.tokens.get(token_id)
+                if token is None:
+                    return None
+                ident, width = (token_id, token["img"]), None  # tokens are tiny
+            elif layer == "map":
+                ident = self.version
+            else:
+                ident = self.frame_version
+                if layer == "fog" and self.fog_size is None:
+                    return None
+        data = self._encode(layer, ident, fmt, width)
+        if data is None:
+            return None
+        version = ident[1] if layer == "token" else ident
+        etag = f"{layer}-{version}-{fmt}-{width or 'full'}"
+        return etag, _FORMATS[fmt][1], data
+
+    # --- Worker ------------------------------------------------------------
+    def _prewarm(self, version, frame_changed):
+        with self._cond:
+            if version != self.version:
+                return  # already out of date
+            frame_version, has_fog = self.frame_version, self.fog_size is not None
+            tokens = list(self.tokens.items())
+        if frame_changed:
+            self._encode("base", frame_version, self.pick_format("base"), None)
+            if has_fog:
+                self._encode("fog", frame_version, self.pick_format("fog"), None)
+        for tid, token in tokens:
+            self._encode("token", (tid, token["img"]), self.pick_format("token"), None)
+
+    def _encode(self, layer, ident, fmt, width):
+        """Encode one variant once, however many threads ask for it at the same time."""
+        key = (layer, ident, fmt, width)
+        with self._cond:
+            data = self._encoded.get(key)
+            if data is not None:
+                return data
+            pending = self._pending.get(key)
+            owner = pending is None
+            if owner:
+                pending = self._pending[key] = threading.Event()
+        if not owner:
+            pending.wait()
+            with self._cond:
+                return self._encoded.get(key)
+        try:
+            img = self._layer_image(layer, ident)
+            if img is None:
+                return None
+            if width:
+                with self._cond:
+                    frame_width = self.size[0]
+                img = _scaled(img, width / max(1, frame_width))
+            data = _encode_image(img, fmt, self.quality)
+            with self._cond:
+                # Keep it only if no newer version dropped its layer meanwhile
+                if (layer, ident) in self._layers:
+                    self._encoded[key] = data
+            return data
+        finally:
+            with self._cond:
+                self._pending.pop(key, None)
+            pending.set()
+
+    def _layer_image(self, layer, ident):
+        with self._cond:
+            img = self._layers.get((layer, ident))
+            if img is not None:
+                return img
+            spec, frame_version, version = self._spec, self.frame_version, self.version
+            tokens = dict(self.tokens)
+        img = None
+        if layer == "token":
+            token = tokens.get(ident[0])
+            if token is not None and token["img"] == ident[1]:
+                img = token["image"]
+        elif layer == "fog" and ident == frame_version:
+            img = spec.get("fog")
+        elif layer == "base" and ident == frame_version:
+            img = render_frame(spec)
+        elif layer == "map" and ident == version:
+            base = self._layer_image("base", frame_version)
+            img = _composite(base, tokens, spec) if base is not None else None
+        if img is not None:
+            with self._cond:
+                current = self.frame_version if layer in ("base", "fog") else self.version
+                if layer == "token" or ident == current:
+                    self._layers[(layer, ident)] = img
+        return img
+
+
+def render_frame(spec):
+    """
+    The map layer of a frame: ``spec`` holds the frame ``size``, the scaled
+    map ``base`` and where it goes (``base_offset``), and the ``shapes``
+    drawn over it as (kind, box, fill, outline).
+    """
+    img = Image.new('RGBA', spec["size"], (0, 0, 0, 255))
+    if spec.get("base") is not None:
+        img.paste(spec["base"], spec["base_offset"])
+    draw = ImageDraw.Draw(img)
+    for kind, box, fill, outline in spec.get("shapes", ()):
+        if kind == "rectangle":
+            draw.rectangle(box, fill=fill, outline=outline, width=2)
+        else:
+            draw.ellipse(box, fill=fill, outline=outline, width=2)
+    return img
+
+
+def _composite(base, tokens, spec):
+    # The single image served to clients that poll /map.png
+    img = base.copy()
+    draw = ImageDraw.Draw(img)
+    for token in sorted(tokens.values(), key=lambda t: t["z"]):
+        x, y, w, h = token["x"], token["y"], token["w"], token["h"]
+        img.paste(token["image"], (x, y), token["image"])
+        draw.rectangle([x - 3, y - 3, x + w + 3, y + h + 3], outline=token["border"], width=3)
+    fog = spec.get("fog")
+    if fog is not None:
+        img.paste(fog, spec.get("fog_offset", (0, 0)), fog)
+    return img
+
+
+def _scaled(img, factor):
+    size = (max(1, round(img.width * factor)), max(1, round(img.height * factor)))
+    return img.resize(size, resample=Image.LANCZOS)
+
+
+def _encode_image(img, fmt, quality):
+    name, _, alpha = _FORMATS[fmt]
+    if not alpha and img.mode != "RGB":
+        img = img.convert("RGB")
+    buf = io.BytesIO()
+    if fmt == "png":
+        # Level 1 is several times faster than the default for ~10% more bytes
+        img.save(buf, format=name, compress_level=1)
+    else:
+        img.save(buf, format=name, quality=quality)
+    return buf.getvalue()
+
+
+def token_state(item, image, x, y, z):
+    """Web state of one token: its scaled ``image`` drawn at (x, y) of the frame."""
+    return {
+        "x": x, "y": y, "w": image.width, "h": image.height, "z": z,
+        "img": id(image),  # changes with the scaled image: lets browsers cache it
+        "border": item.get("border_color", "#0000ff") or "#0000ff",
+        "image": image.convert("RGBA") if image.mode != "RGBA" else image,
+    }
+
+
+def token_delta(old, new):
+    """
+    What a client showing ``old`` tokens needs to show ``new``: full state
+    for new or restyled tokens, only x/y for moved ones, and removed ids.
+    """
+    old, new = _public(old), _public(new)
+    changed = {}
+    for tid, token in new.items():
+        before = old.get(tid)
+        if before == token:
+            continue
+        if before is not None and all(before[k] == token[k] for k in token if k not in ("x", "y")):
+            changed[tid] = {"x": token["x"], "y": token["y"]}
+        else:
+            changed[tid] = token
+    removed = [tid for tid in old if tid not in new]
+    return {"changed": changed, "removed": removed}
+
+
+def _public(tokens):
+    # Token state without the image, as sent to browsers
+    return {
+        tid: {k: v for k, v in token.items() if k != "image"}
+        for tid, token in tokens.items()
+    }
@@ -0,0 +1,96 @@
+import os
+import struct
+import zlib
+
+from PIL import Image
+
+# Fog masks are single-channel "L" images: FOG where the map is hidden,
+# CLEAR where it is revealed. Colour and transparency are applied only
+# when a mask is composited for display.
+FOG = 255
+CLEAR = 0
+GM_FOG_ALPHA = 128      # the GM sees through the fog
+PLAYER_FOG_ALPHA = 255  # players do not
+
+# Lookup tables, applied by Pillow in C: any fog at all -> FOG
+_BINARY_LUT = [CLEAR] + [FOG] * 255
+_ALPHA_LUTS = {}
+
+MASK_EXTENSION = ".fog"
+_MAGIC = b"GMFOG1"
+_HEADER = struct.Struct("<6sII")
+
+
+def new_mask(size, fogged=True):
+    """A mask of ``size`` entirely fogged, or entirely clear."""
+    return Image.new("L", size, FOG if fogged else CLEAR)
+
+
+def save_mask(mask, path):
+    """
+    Write ``mask`` as a bit-packed, zlib-compressed .fog file: one bit per
+    pixel, rows padded to whole bytes, after a small header with the size.
+    """
+    bits = mask.point(lambda v: 255 if v else 0).convert("1", dither=Image.NONE)
+    payload = zlib.compress(bits.tobytes(), 6)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, mask.width, mask.height))
+        f.write(payload)
+    os.replace(tmp_path, path)
+
+
+def load_mask(path, size):
+    """
+    Read a fog mask from ``path``: a .fog file, or an older RGBA PNG mask
+    (any non-transparent pixel is fog). Returns an "L" mask of ``size``,
+    or None when the file cannot be read.
+    """
+    try:
+        with open(path, "rb") as f:
+            head = f.read(_HEADER.size)
+            if len(head) == _HEADER.size and head[:len(_MAGIC)] == _MAGIC:
+                _, width, height = _HEADER.unpack(head)
+                data = zlib.decompress(f.read())
+                mask = Image.frombytes("1", (width, height), data).convert("L")
+            else:
+                mask = _from_legacy_image(Image.open(path))
+    except (OSError, ValueError, zlib.error, struct.error) as e:
+        print(f"[fog_mask] Failed to load fog mask '{path}': {e}")
+        return None
+    if mask.size != tuple(size):
+        mask = mask.resize(size, resample=Image.NEAREST)
+    return mask
+
+
+def _from_legacy_image(img):
+    # PNG masks were RGBA, black with alpha 128 where fogged
+    if img.mode in ("RGBA", "LA") or "transparency" in img.info:
+        alpha = img.convert("RGBA").getchannel("A")
+    else:
+        alpha = img.convert("L")
+    return alpha.point(lambda v: FOG if v else CLEAR)
+
+
+def mask_path_for(image_path):
+    """File name of the mask saved for a map image, e.g. cave.png -> cave_mask.fog."""
+    base, _ = os.path.splitext(os.path.basename(image_path))
+    return f"{base}_mask{MASK_EXTENSION}"
+
+
+def binarize_mask(mask):
+    """``mask`` with every partly fogged pixel (e.g. resampled edges) fully fogged."""
+    return mask.point(_BINARY_LUT)
+
+
+def fog_overlay(mask, alpha=GM_FOG_ALPHA):
+    """Composite an "L" mask (or a tile of one) into black RGBA fog for display."""
+    black = Image.new("L", mask.size, 0)
+    if alpha == FOG:
+        fog_alpha = mask
+    else:
+        lut = _ALPHA_LUTS.get(alpha)
+        if lut is None:
+            lut = _ALPHA_LUTS[alpha] = [v * alpha // FOG for v in range(256)]
+        fog_alpha = mask.point(lut)
+    return Image.merge("RGBA", (black, black, black, fog_alpha))
@@ -0,0 +1,110 @@
+import math
+
+CELL_SIZE = 256   # world pixels per grid cell side
+
+
+class SpatialIndex:
+    """
+    Uniform grid of the world-space bounding boxes of map items (tokens and
+    shapes), for finding what lies in a view or under a point without
+    walking every item.
+
+    Items are indexed by identity: ``update`` (re)places an item's box,
+    ``remove`` drops it. Each box is listed in every cell it overlaps, so a
+    query only looks at the cells it covers. The index also tracks which
+    items are being dragged, so ``dragging`` is a constant-time check.
+    """
+
+    def __init__(self, cell_size=CELL_SIZE):
+        self.cell_size = cell_size
+        self._cells = {}       # (col, row) -> {id(item): item}
+        self._boxes = {}       # id(item) -> (item, box, cells)
+        self._dragged = set()  # id(item) of the items being dragged
+
+    def __len__(self):
+        return len(self._boxes)
+
+    def __contains__(self, item):
+        return id(item) in self._boxes
+
+    def _cells_of(self, box):
+        left, top, right, bottom = box
+        size = self.cell_size
+        c0, r0 = math.floor(left / size), math.floor(top / size)
+        c1, r1 = math.floor(right / size), math.floor(bottom / size)
+        return [(c, r) for c in range(c0, c1 + 1) for r in range(r0, r1 + 1)]
+
+    def update(self, item, box):
+        """Index ``item`` at ``box`` (left, top, right, bottom); a no-op if unchanged."""
+        key = id(item)
+        entry = self._boxes.get(key)
+        if entry is not None:
+            if entry[1] == box:
+                return
+            self._unlink(key, entry[2])
+        cells = self._cells_of(box)
+        for cell in cells:
+            self._cells.setdefault(cell, {})[key] = item
+        self._boxes[key] = (item, box, cells)
+
+    def remove(self, item):
+        entry = self._boxes.pop(id(item), None)
+        if entry is not None:
+            self._unlink(id(item), entry[2])
+        self._dragged.discard(id(item))
+
+    def clear(self):
+        self._cells.clear()
+        self._boxes.clear()
+        self._dragged.clear()
+
+    def _unlink(self, key, cells):
+        for cell in cells:
+            bucket = self._cells.get(cell)
+            if bucket is not None:
+                bucket.pop(key, None)
+                if not bucket:
+                    del self._cells[cell]
+
+    def items(self):
+        """Every indexed item, in no particular order."""
+        return [entry[0] for entry in self._boxes.values()]
+
+    def query(self, box):
+        """The items whose box overlaps ``box``, in no particular order."""
+        left, top, right, bottom = box
+        found = {}
+        size = self.cell_size
+        c0, r0 = math.floor(left / size), math.floor(top / size)
+        c1, r1 = math.floor(right / size), math.floor(bottom / size)
+        if (c1 - c0 + 1) * (r1 - r0 + 1) > len(self._cells):
+            # A view wider than the populated cells: walk the cells instead
+            buckets = self._cells.values()
+        else:
+            buckets = (self._cells.get((c, r)) for c in range(c0, c1 + 1) for r in range(r0, r1 + 1))
+        for bucket in buckets:
+            if not bucket:
+                continue
+            for key, item in bucket.items():
+                if key in found:
+                    continue
+                il, it, ir, ib = self._boxes[key][1]
+                if il <= right and left <= ir and it <= bottom and top <= ib:
+                    found[key] = item
+        return list(found.values())
+
+    def at(self, x, y):
+        """The items whose box contains the point (x, y)."""
+        return self.query((x, y, x, y))
+
+    # --- Dragging ----------------------------------------------------------
+    def begin_drag(self, item):
+        self._dragged.add(id(item))
+
+    def end_drag(self, item):
+        self._dragged.discard(id(item))
+
+    @property
+    def dragging(self):
+        """True while any item is being dragged."""
+        return bool(self._dragged)
@@ -0,0 +1,274 @@
+from collections import OrderedDict
+import math
+import weakref
+
+from PIL import Image, ImageTk
+
+TILE_SIZE = 256          # screen pixels per tile side
+TILE_CACHE_SIZE = 256    # PhotoImages kept per tile source (~64 MB of RGBA tiles)
+
+
+class TilePyramid:
+    """
+    Downsampled levels of a map-sized image, cut into screen-sized tiles.
+
+    Level 0 is the image itself and each following level halves it, down to
+    one tile. A tile is addressed by (zoom, col, row) in screen space: it
+    covers the screen pixels [col*T, (col+1)*T) of the map drawn at ``zoom``,
+    and is resampled from the smallest level that still has at least one
+    source pixel per screen pixel, so no tile ever costs more than a
+    (2T x 2T) -> (T x T) resize.
+    """
+
+    def __init__(self, image, tile_size=TILE_SIZE):
+        self.image = image
+        self.tile_size = tile_size
+        self._levels = [image]
+
+    @property
+    def size(self):
+        return self.image.size
+
+    def _level(self, zoom):
+        # Smallest level whose scale is still >= zoom
+        index = 0
+        if zoom < 1:
+            index = int(math.floor(math.log2(1.0 / zoom)))
+        max_side = max(self.image.size)
+        while index > 0 and max_side / (2 ** index) < self.tile_size:
+            index -= 1
+        while len(self._levels) <= index:
+            prev = self._levels[-1]
+            if prev.width < 2 or prev.height < 2:
+                break
+            self._levels.append(prev.reduce(2))
+        index = min(index, len(self._levels) - 1)
+        return self._levels[index]
+
+    def grid(self, zoom):
+        """(columns, rows) of tiles covering the map at ``zoom``."""
+        w, h = self.image.size
+        sw, sh = int(w * zoom), int(h * zoom)
+        return (
+            (sw + self.tile_size - 1) // self.tile_size,
+            (sh + self.tile_size - 1) // self.tile_size,
+        )
+
+    def scaled(self, zoom, resample=Image.LANCZOS, box=None):
+        """
+        The map drawn at ``zoom``, or only the screen-pixel ``box`` of it,
+        resampled from the closest level instead of the full image.
+        """
+        w, h = self.image.size
+        sw, sh = int(w * zoom), int(h * zoom)
+        x0, y0, x1, y1 = box if box is not None else (0, 0, sw, sh)
+        x0, y0 = max(0, x0), max(0, y0)
+        x1, y1 = min(sw, x1), min(sh, y1)
+        if x1 <= x0 or y1 <= y0:
+            return None
+        level = self._level(zoom)
+        sx, sy = level.width / w, level.height / h
+        src = (x0 / zoom * sx, y0 / zoom * sy, x1 / zoom * sx, y1 / zoom * sy)
+        return level.resize((x1 - x0, y1 - y0), resample=resample, box=src)
+
+    def tile(self, zoom, col, row, resample=Image.LANCZOS):
+        """The PIL image of one screen tile, or None if it is off the map."""
+        t = self.tile_size
+        return self.scaled(zoom, resample, (col * t, row * t, (col + 1) * t, (row + 1) * t))
+
+    def invalidate(self, box=None):
+        """
+        The source image changed, inside ``box`` (world pixels) if given:
+        refresh the downsampled levels over that region.
+        """
+        if box is None or len(self._levels) == 1:
+            self._levels = [self.image]
+            return
+        left, top, right, bottom = (int(v) for v in box)
+        for index in range(1, len(self._levels)):
+            scale = 2 ** index
+            # Align to the level grid so reduce() sees whole source blocks
+            l, t = (left // scale) * scale, (top // scale) * scale
+            r = min(self.image.width, -(-right // scale) * scale)
+            b = min(self.image.height, -(-bottom // scale) * scale)
+            if r <= l or b <= t:
+                continue
+            patch = self.image.crop((l, t, r, b)).reduce(scale)
+            self._levels[index].paste(patch, (l // scale, t // scale))
+
+    def tile_overlaps(self, zoom, col, row, box):
+        """True if screen tile (col, row) at ``zoom`` covers part of world ``box``."""
+        t = self.tile_size
+        left, top, right, bottom = box
+        # Tile bounds in world pixels, padded by a pixel for the resample filter
+        tx0, ty0 = col * t / zoom - 1, row * t / zoom - 1
+        tx1, ty1 = (col + 1) * t / zoom + 1, (row + 1) * t / zoom + 1
+        return tx0 < right and left < tx1 and ty0 < bottom and top < ty1
+
+
+class TileSource:
+    """
+    Rendered tiles of a TilePyramid as PhotoImages, in an LRU cache keyed by
+    (zoom, col, row, resample). One source can feed several canvases (the GM
+    map and the players' fullscreen view share the base map tiles), so each
+    tile is resampled once. ``tile_filter``, if given, is applied to each
+    resampled tile (e.g. to turn a fog mask into RGBA fog).
+    """
+
+    def __init__(self, pyramid, tile_filter=None, cache_size=TILE_CACHE_SIZE):
+        self.pyramid = pyramid
+        self.tile_filter = tile_filter
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._layers = weakref.WeakSet()
+
+    def set_pyramid(self, pyramid):
+        self.pyramid = pyramid
+        self.invalidate()
+
+    def photo(self, zoom, col, row, resample):
+        key = (zoom, col, row, resample)
+        photo = self._cache.get(key)
+        if photo is not None:
+            self._cache.move_to_end(key)
+            return photo
+        tile = self.pyramid.tile(zoom, col, row, resample)
+        if tile is None:
+            return None
+        if self.tile_filter:
+            tile = self.tile_filter(tile)
+        photo = ImageTk.PhotoImage(tile)
+        self._cache[key] = photo
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return photo
+
+    def invalidate(self, box=None):
+        """
+        The pyramid changed inside ``box`` (world pixels), or everywhere:
+        drop the affected tiles and redraw them on every canvas showing them.
+        """
+        if box is None:
+            self._cache.clear()
+        else:
+            for key in list(self._cache):
+                if self.pyramid.tile_overlaps(key[0], key[1], key[2], box):
+                    del self._cache[key]
+        for layer in list(self._layers):
+            layer.refresh(box)
+
+
+class CanvasTileLayer:
+    """
+    Draws a TileSource on a Tk canvas, keeping only the tiles that
+    intersect the viewport as canvas items, all tagged with ``tag``.
+    Pure pans only move the existing items.
+
+    The layer's place in the canvas stacking order is held by a hidden
+    anchor item (tagged ``anchor_tag``): tiles are always inserted just
+    below it. The anchor starts just above the ``above`` tag, or at the
+    bottom of the canvas.
+
+    The layer holds the PhotoImages it shows itself: the source's cache may
+    evict a tile that is still on screen (several canvases, interim and
+    final renders), and Tk blanks an image once Python drops it.
+    """
+
+    def __init__(self, canvas, source, tag, above=None):
+        self.canvas = canvas
+        self.tag = tag
+        self.anchor_tag = f"{tag}_anchor"
+        self.above = above
+        self._items = {}              # (col, row) -> (canvas item id, its PhotoImage)
+        self._zoom = None
+        self._resample = None
+        self._origin = None
+        self.source = None
+        self.set_source(source)
+
+    def set_source(self, source):
+        if source is self.source:
+            return
+        self.source = source
+        source._layers.add(self)
+        self.refresh()
+
+    def _ensure_anchor(self):
+        if self.canvas.find_withtag(self.anchor_tag):
+            return
+        anchor = self.canvas.create_line(0, 0, 0, 0, state="hidden", tags=(self.anchor_tag,))
+        if self.above and self.canvas.find_withtag(self.above):
+            self.canvas.tag_raise(anchor, self.above)
+        else:
+            self.canvas.tag_lower(anchor)
+
+    def render(self, zoom, pan_x, pan_y, resample=Image.LANCZOS):
+        """Show the tiles visible at this zoom and pan, creating only new ones."""
+        zoom = round(zoom, 6)
+        pyramid = self.source.pyramid
+        t = pyramid.tile_size
+        x0, y0 = int(pan_x), int(pan_y)
+
+        stale = []
+        if zoom != self._zoom or resample != self._resample:
+            # Old tiles stay up until their replacements exist: no flicker
+            stale = list(self._items.values())  # photos kept until deleted
+            self._items = {}
+            self._zoom, self._resample = zoom, resample
+        elif self._origin != (x0, y0):
+            dx, dy = x0 - self._origin[0], y0 - self._origin[1]
+            self.canvas.move(self.tag, dx, dy)
+        self._origin = (x0, y0)
+
+        cols, rows = pyramid.grid(zoom)
+        cw, ch = self.canvas.winfo_width(), self.canvas.winfo_height()
+        first_col, last_col = max(0, -x0 // t), min(cols - 1, (cw - x0) // t)
+        first_row, last_row = max(0, -y0 // t), min(rows - 1, (ch - y0) // t)
+        visible = {
+            (c, r)
+            for c in range(first_col, last_col + 1)
+            for r in range(first_row, last_row + 1)
+        }
+
+        for key in [k for k in self._items if k not in visible]:
+            self.canvas.delete(self._items.pop(key)[0])
+        self._ensure_anchor()
+        for col, row in sorted(visible):
+            if (col, row) in self._items:
+                continue
+            photo = self.source.photo(zoom, col, row, resample)
+            if photo is None:
+                continue
+            item_id = self.canvas.create_image(
+                x0 + col * t, y0 + row * t, image=photo, anchor="nw", tags=(self.tag,)
+            )
+            self.canvas.tag_lower(item_id, self.anchor_tag)
+            self._items[(col, row)] = (item_id, photo)
+        for item_id, _photo in stale:
+            self.canvas.delete(item_id)
+
+    def refresh(self, box=None):
+        """Re-fetch the shown tiles overlapping ``box`` (world pixels), or all."""
+        if self._zoom is None:
+            return
+        try:
+            for (col, row), (item_id, _old) in list(self._items.items()):
+                if box is None or self.source.pyramid.tile_overlaps(self._zoom, col, row, box):
+                    photo = self.source.photo(self._zoom, col, row, self._resample)
+                    if photo is not None:
+                        self.canvas.itemconfig(item_id, image=photo)
+                        self._items[(col, row)] = (item_id, photo)
+        except Exception:
+            # The canvas is gone (map closed, fullscreen window destroyed)
+            self._items = {}
+            self._zoom = None
+
+    def clear(self):
+        """Remove this layer's items from the canvas (the cache is kept)."""
+        try:
+            self.canvas.delete(self.tag)
+        except Exception:
+            pass
+        self._items = {}
+        self._origin = None
+        self._zoom = None
@@ -0,0 +1,104 @@
+import os
+import threading
+from collections import OrderedDict
+
+from PIL import Image, ImageTk
+
+SOURCE_CACHE_SIZE = 64    # decoded portraits kept
+SIZED_CACHE_SIZE = 256    # portraits at a token size
+SCALED_CACHE_SIZE = 512   # tokens scaled to a zoom (PIL + PhotoImage)
+
+# Shared by every map and every view: the same portrait at the same size
+# and zoom is decoded and resampled once.
+_sources = OrderedDict()  # (path, mtime) -> RGBA image
+_sized = OrderedDict()    # (path, mtime, size) -> RGBA image
+_sized_keys = {}          # id(sized image) -> its _sized key
+_scaled = OrderedDict()   # (source key, scaled size, resample) -> [pil, image, photo]
+# Map loading decodes portraits on worker threads; decoding itself runs
+# outside the lock
+_lock = threading.Lock()
+
+
+def _lru_get(cache, key):
+    value = cache.get(key)
+    if value is not None:
+        cache.move_to_end(key)
+    return value
+
+
+def _lru_put(cache, key, value, limit, on_evict=None):
+    cache[key] = value
+    while len(cache) > limit:
+        old_key, old_value = cache.popitem(last=False)
+        if on_evict:
+            on_evict(old_key, old_value)
+
+
+def load_token_image(path, size):
+    """
+    The portrait at ``path`` as a ``size`` x ``size`` RGBA token image.
+    The file is decoded once; callers get the same image object back for
+    the same path and size until the file changes on disk. Raises OSError
+    if the file cannot be read.
+    """
+    path = os.path.abspath(path)
+    mtime = os.path.getmtime(path)
+    size = int(size)
+    key = (path, mtime, size)
+    with _lock:
+        sized = _lru_get(_sized, key)
+        source = _lru_get(_sources, (path, mtime)) if sized is None else None
+    if sized is not None:
+        return sized
+    if source is None:
+        with Image.open(path) as img:
+            source = img.convert("RGBA")
+    sized = source.resize((size, size), resample=Image.LANCZOS)
+    with _lock:
+        _lru_put(_sources, (path, mtime), source, SOURCE_CACHE_SIZE)
+        # Another thread may have loaded the same token meanwhile: keep one
+        existing = _sized.get(key)
+        if existing is not None:
+            return existing
+        _lru_put(_sized, key, sized, SIZED_CACHE_SIZE,
+                 on_evict=lambda k, img: _sized_keys.pop(id(img), None))
+        _sized_keys[id(sized)] = key
+    return sized
+
+
+def scaled_token_image(pil, zoom, resample=Image.LANCZOS):
+    """``pil`` scaled by ``zoom``, or None if that makes it empty."""
+    entry = _scaled_entry(pil, zoom, resample)
+    return entry[1] if entry else None
+
+
+def scaled_token_photo(pil, zoom, resample=Image.LANCZOS):
+    """PhotoImage of ``pil`` scaled by ``zoom``, shared by every Tk canvas."""
+    entry = _scaled_entry(pil, zoom, resample)
+    if entry is None:
+        return None
+    if entry[2] is None:
+        entry[2] = ImageTk.PhotoImage(entry[1])
+    return entry[2]
+
+
+def _scaled_entry(pil, zoom, resample):
+    # The scaled pixel size is the zoom bucket: zooms that round to the
+    # same size share an entry
+    size = (int(pil.width * zoom), int(pil.height * zoom))
+    if size[0] <= 0 or size[1] <= 0:
+        return None
+    with _lock:
+        source_key = _sized_keys.get(id(pil))
+        if source_key is not None and _sized.get(source_key) is not pil:
+            source_key = None
+        key = (source_key or ("id", id(pil)), size, resample)
+        entry = _lru_get(_scaled, key)
+    # Images not loaded through load_token_image are keyed by identity;
+    # the stored reference guards against id() reuse
+    if entry is not None and (source_key is not None or entry[0] is pil):
+        return entry
+    entry = [pil, pil.resize(size, resample=resample), None]
+    with _lock:
+        _lru_put(_scaled, key, entry, SCALED_CACHE_SIZE)
+    return entry
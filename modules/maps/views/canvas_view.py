@@ -1,5 +1,5 @@
 import tkinter as tk
-from PIL import ImageDraw
+from modules.maps.services.fog_manager import on_paint
 MIN_ZOOM = 0.01  # Minimum zoom level to prevent division by zero
 
 def _build_canvas(self):
@@ -17,6 +17,8 @@ def _build_canvas(self):
     # Undo fog
     root.bind_all("<Control-z>",   lambda e: self.undo_fog(e))
     root.bind_all("<Control-Z>",   lambda e: self.undo_fog(e))
+    root.bind_all("<Control-y>",   lambda e: self.redo_fog(e))
+    root.bind_all("<Control-Y>",   lambda e: self.redo_fog(e))
     
     root.bind_all("<Control-f>", self.open_global_search)
     root.bind_all("<Control-F>", self.open_global_search)
@@ -48,34 +50,5 @@ def _on_delete_key(self, event=None):
     self._delete_item(item_to_delete) # Use the generic delete method
 
 def on_paint2(self, event):
-    """Paint or erase fog using a square brush of size self.brush_size,
-       with semi-transparent black (alpha=128) for fog."""
-    # Prevent fog painting if a drag operation is in progress for any item
-    if any(t.get('drag_data') for t in self.tokens):
-        return
-    if not self.mask_img:
-        return
-
-    # Convert screen → world coords
-    # Ensure zoom is not zero to prevent division by zero error
-    current_zoom = self.zoom if self.zoom != 0 else MIN_ZOOM 
-    xw = (event.x - self.pan_x) / current_zoom
-    yw = (event.y - self.pan_y) / current_zoom
-
-    half = self.brush_size / 2
-    left   = int(xw - half)
-    top    = int(yw - half)
-    right  = int(xw + half)
-    bottom = int(yw + half)
-
-    draw = ImageDraw.Draw(self.mask_img)
-    fill_color = (0,0,0,0) # Default to erase (transparent)
-    if self.fog_mode == "add":
-        fill_color = (0,0,0,128) # Semi-transparent black to add fog
-    
-    if self.brush_shape == "circle":
-        draw.ellipse([left, top, right, bottom], fill=fill_color)
-    else: # Default to rectangle
-        draw.rectangle([left, top, right, bottom], fill=fill_color)
-
-    self._update_canvas_images()
+    """Kept for older callers: fog painting lives in fog_manager.on_paint."""
+    return on_paint(self, event)
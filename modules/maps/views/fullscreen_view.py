@@ -1,6 +1,9 @@
 import tkinter as tk
-from PIL import ImageTk, Image
 from screeninfo import get_monitors
+from modules.maps.utils.tile_pyramid import CanvasTileLayer
+
+FS_MAP_TILE_TAG = "fs_map_tile"
+FS_FOG_TILE_TAG = "fs_fog_tile"
 
 def open_fullscreen(self):
     monitors = get_monitors()
@@ -13,58 +16,33 @@ def open_fullscreen(self):
     self.fs.geometry(f"{m.width}x{m.height}+{m.x}+{m.y}")
     self.fs_canvas = tk.Canvas(self.fs, bg="black")
     self.fs_canvas.pack(fill="both", expand=True)
-    # reset IDs so base/mask/tokens all get re-created on the new canvas
-    self.fs_base_id = None
-    self.fs_mask_id = None
+    # reset layers so base/mask/tokens all get re-created on the new canvas
+    self._fs_base_layer = None
+    self._fs_fog_layer = None
     # clear any stale fullscreen token IDs
     for token in self.tokens:
         token.pop('fs_canvas_ids', None)
+        token.pop('fs_cross_ids', None)
     self._update_fullscreen_map()
 
 def _update_fullscreen_map(self):
-    """Mirror the GM canvas into the fullscreen window."""
+    """
+    Mirror the GM canvas into the fullscreen window.
+
+    Map and fog tiles come from the controller's SceneCompositor, and
+    token images are the ones already scaled for the GM canvas, so nothing
+    is resampled here. Canvas items are updated in place.
+    """
     if not self.fs_canvas or not self.base_img:
         return
+    scene = self.scene
+    scene.set_images(self.base_img, self.mask_img)
 
-    # Same logic as above but on fs_canvas
-    w, h = self.base_img.size
-    sw, sh = int(w*self.zoom), int(h*self.zoom)
-    x0, y0 = self.pan_x, self.pan_y
-
-    base_resized = self.base_img.resize((sw,sh), resample=Image.LANCZOS)
-    self.fs_base_tk = ImageTk.PhotoImage(base_resized)
-    if self.fs_base_id:
-        self.fs_canvas.itemconfig(self.fs_base_id, image=self.fs_base_tk)
-        self.fs_canvas.coords(self.fs_base_id, x0, y0)
-    else:
-        self.fs_base_id = self.fs_canvas.create_image(x0, y0,
-                                                      image=self.fs_base_tk,
-                                                      anchor='nw')
-
-    # Clear existing token/shape representations on fs_canvas before redrawing
-    # This prevents duplicates if fs_canvas_ids were not properly cleaned up or if items are removed.
-    for item_to_clear in self.tokens:
-        if 'fs_canvas_ids' in item_to_clear:
-            for fs_id in item_to_clear['fs_canvas_ids']:
-                if fs_id: # Check if fs_id is not None
-                    try:
-                        self.fs_canvas.delete(fs_id)
-                    except tk.TclError: # Item might have already been deleted
-                        pass
-            # It's important to remove the key so items are fully recreated,
-            # especially if their structure (e.g. number of canvas IDs) changes.
-            del item_to_clear['fs_canvas_ids']
-        
-        if 'fs_cross_ids' in item_to_clear: # For dead token markers
-            for fs_id in item_to_clear['fs_cross_ids']:
-                if fs_id:
-                    try:
-                        self.fs_canvas.delete(fs_id)
-                    except tk.TclError:
-                        pass
-            del item_to_clear['fs_cross_ids']
-        
-        item_to_clear.pop('fs_tk', None) # Remove old PhotoImage reference to allow GC
+    if self._fs_base_layer is None or self._fs_base_layer.canvas is not self.fs_canvas:
+        self._fs_base_layer = CanvasTileLayer(self.fs_canvas, scene.base_tiles, FS_MAP_TILE_TAG)
+        self._fs_fog_layer = None
+    self._fs_base_layer.set_source(scene.base_tiles)
+    self._fs_base_layer.render(self.zoom, self.pan_x, self.pan_y)
 
     for item in self.tokens:
         item_type = item.get("type", "token")
@@ -76,17 +54,10 @@ def _update_fullscreen_map(self):
             pil = item.get('pil_image')
             if not pil:
                 continue
-
-            tw, th = pil.size
-            if tw <= 0 or th <= 0:
-                continue
-            
-            nw, nh = int(tw * self.zoom), int(th * self.zoom)
-            if nw <= 0 or nh <= 0:
+            fsimg = scene.token_photo(pil, self.zoom)
+            if fsimg is None:
                 continue
-            
-            img_r = pil.resize((nw, nh), resample=Image.LANCZOS)
-            fsimg = ImageTk.PhotoImage(img_r)
+            nw, nh = fsimg.width(), fsimg.height()
             item['fs_tk'] = fsimg # Store the PhotoImage to prevent garbage collection
 
             # Token border, image, and name
@@ -110,13 +81,13 @@ def _update_fullscreen_map(self):
             # HP-related cross for dead tokens
             hp = item.get("hp", 0)
             if hp <= 0:
-                if 'fs_cross_ids' not in item:
-                    tl = (sx, sy)
-                    br = (sx + nw, sy + nh)
-                    tr = (sx + nw, sy)
-                    bl = (sx, sy + nh)
-                    line1 = self.fs_canvas.create_line(*tl, *br, fill="red", width=3)
-                    line2 = self.fs_canvas.create_line(*tr, *bl, fill="red", width=3)
+                if 'fs_cross_ids' in item:
+                    line1, line2 = item['fs_cross_ids']
+                    self.fs_canvas.coords(line1, sx, sy, sx + nw, sy + nh)
+                    self.fs_canvas.coords(line2, sx + nw, sy, sx, sy + nh)
+                else:
+                    line1 = self.fs_canvas.create_line(sx, sy, sx + nw, sy + nh, fill="red", width=3)
+                    line2 = self.fs_canvas.create_line(sx + nw, sy, sx, sy + nh, fill="red", width=3)
                     item['fs_cross_ids'] = (line1, line2)
             else: # HP > 0, remove cross if it exists
                 if 'fs_cross_ids' in item:
@@ -141,10 +112,7 @@ def _update_fullscreen_map(self):
             fs_shape_id = fs_shape_id_tuple[0] if fs_shape_id_tuple and len(fs_shape_id_tuple) > 0 else None
 
             if fs_shape_id:
-                if item_type == "rectangle":
-                    self.fs_canvas.coords(fs_shape_id, sx, sy, sx + shape_width, sy + shape_height)
-                elif item_type == "oval":
-                    self.fs_canvas.coords(fs_shape_id, sx, sy, sx + shape_width, sy + shape_height)
+                self.fs_canvas.coords(fs_shape_id, sx, sy, sx + shape_width, sy + shape_height)
                 self.fs_canvas.itemconfig(fs_shape_id, fill=fill_color, outline=border_color)
             else:
                 new_fs_shape_id = None
@@ -156,45 +124,19 @@ def _update_fullscreen_map(self):
                                                                fill=fill_color, outline=border_color, width=2)
                 if new_fs_shape_id:
                     item['fs_canvas_ids'] = (new_fs_shape_id,)
-    # Fog of War Mask (should be drawn last, on top of everything else)
-    if self.mask_img: # Ensure mask_img exists
-        try:
-            # Ensure sw and sh for mask are valid (same as base_img scaled dimensions)
-            if sw > 0 and sh > 0:
-                mask_copy = self.mask_img.copy()
-                # split out alpha channel
-                _, _, _, alpha_channel = mask_copy.split() # Renamed to avoid conflict if alpha was a var
-                # map any alpha>0 to 255, leave 0 as 0
-                processed_alpha = alpha_channel.point(lambda a: 255 if a > 0 else 0)
-                mask_copy.putalpha(processed_alpha)
-                
-                mask_resized = mask_copy.resize((sw, sh), Image.LANCZOS)
-                self.fs_mask_tk = ImageTk.PhotoImage(mask_resized) # Store to prevent GC
-                
-                if self.fs_mask_id:
-                    self.fs_canvas.itemconfig(self.fs_mask_id, image=self.fs_mask_tk)
-                    self.fs_canvas.coords(self.fs_mask_id, x0, y0)
-                else:
-                    self.fs_mask_id = self.fs_canvas.create_image(x0, y0,
-                                                                image=self.fs_mask_tk,
-                                                                anchor='nw')
-                self.fs_canvas.tag_raise(self.fs_mask_id) # Ensure mask is on top
-            # else:
-                # print("Skipping fullscreen mask rendering due to invalid scaled dimensions.")
-        except Exception as e:
-            # print(f"Error processing or rendering fullscreen fog mask: {e}")
-            # If mask processing fails, we might want to ensure an old mask isn't shown
-            if self.fs_mask_id:
-                self.fs_canvas.delete(self.fs_mask_id)
-                self.fs_mask_id = None
-            pass
-    elif self.fs_mask_id: # If no mask_img, but an old fs_mask_id exists, delete it
-        self.fs_canvas.delete(self.fs_mask_id)
-        self.fs_mask_id = None
-
-    if hasattr(self, '_update_web_display_map'):
-        try:
-            self._update_web_display_map()
-        except Exception:
-            pass
 
+    # Fog of War (drawn last, on top of everything else): players get
+    # opaque fog wherever the mask is set
+    if self.mask_img is None:
+        if self._fs_fog_layer:
+            self._fs_fog_layer.clear()
+        return
+    if self._fs_fog_layer is None:
+        self._fs_fog_layer = CanvasTileLayer(
+            self.fs_canvas, scene.player_fog_tiles, FS_FOG_TILE_TAG,
+            above=self._fs_base_layer.anchor_tag
+        )
+    self._fs_fog_layer.set_source(scene.player_fog_tiles)
+    self._fs_fog_layer.render(self.zoom, self.pan_x, self.pan_y)
+    self.fs_canvas.tag_raise(self._fs_fog_layer.anchor_tag)
+    self.fs_canvas.tag_raise(FS_FOG_TILE_TAG)
@@ -3,12 +3,50 @@ import ast
 import json
 import os
 import tkinter as tk
-import customtkinter as ctk
-from PIL import Image, ImageTk, ImageDraw
+from PIL import ImageTk, ImageDraw
 from modules.helpers.config_helper import ConfigHelper
+from modules.maps.services.map_loader import start_map_load
+from modules.maps.services.map_writer import map_writer
+from modules.maps.services.token_manager import _item_rows
+from db.db import write_connection, load_map_items, write_map_items, delete_map_items
 from modules.helpers.template_loader import load_template
 from modules.generic.generic_list_selection_view import GenericListSelectionView
 
+def _parse_tokens_blob(raw):
+    """The items of a legacy Tokens blob, or [] when there is none."""
+    if isinstance(raw, list):
+        return raw
+    if not isinstance(raw, str) or not raw.strip():
+        return []
+    try:
+        # Try ast.literal_eval first as it's safer for simple structures
+        token_list = ast.literal_eval(raw.strip())
+    except (ValueError, SyntaxError): # Catch errors from ast.literal_eval
+        try:
+            # Fallback to json.loads if ast.literal_eval fails
+            token_list = json.loads(raw)
+        except json.JSONDecodeError: # Catch errors from json.loads
+            print(f"[_on_display_map] Failed to parse Tokens string: {raw}")
+            return []
+    if not isinstance(token_list, list): # Ensure the result is a list
+        print(f"[_on_display_map] Parsed Tokens string but did not get a list: {raw}")
+        return []
+    return token_list
+
+def _migrate_tokens_blob(self, map_name):
+    """
+    Move the items parsed from the map's Tokens blob to map_items, then
+    empty the blob. Until the blob is emptied, opening the map migrates it
+    again, replacing whatever an interrupted migration wrote.
+    """
+    with write_connection(invalidate_caches=False) as conn:
+        cursor = conn.cursor()
+        delete_map_items(cursor, map_name)
+        write_map_items(cursor, map_name, list(self._persisted_items.values()))
+    self.maps.patch_fields(map_name, {"Tokens": ""})
+    self.current_map["Tokens"] = ""
+    print(f"[_on_display_map] Migrated {len(self._persisted_items)} items of '{map_name}' to map_items.")
+
 def select_map(self):
     """Show the full‐frame map selector, replacing any existing UI."""
     for w in self.parent.winfo_children():
@@ -43,17 +81,18 @@ def _on_display_map(self, entity_type, map_name): # entity_type here is the map'
     self._build_toolbar()
     self._build_canvas()
 
-    # 3) Load base image + fog mask
+    # 3) Locate base image + fog mask; they are decoded in the background
+    # (see step 9) and nothing is drawn until they arrive
     campaign_dir = ConfigHelper.get_campaign_dir()
     image_path = item.get("Image", "")
     full_image_path= os.path.join(campaign_dir, image_path)
-    self.base_img = Image.open(full_image_path).convert("RGBA")
     mask_path = (item.get("FogMaskPath") or "").strip()
     full_mask_path = os.path.join(campaign_dir, mask_path) if mask_path else ""
-    if mask_path and os.path.isfile(full_mask_path):
-        self.mask_img = Image.open(full_mask_path).convert("RGBA")
-    else:
-        self.mask_img = Image.new("RGBA", self.base_img.size, (0, 0, 0, 128))
+    if not (mask_path and os.path.isfile(full_mask_path)):
+        full_mask_path = None
+    self.base_img = None
+    self.mask_img = None
+    self.fog_history.clear()
 
     # Restore pan/zoom if available, otherwise use defaults
     zoom_raw  = item.get("zoom", 1.0)
@@ -90,36 +129,30 @@ def _on_display_map(self, entity_type, map_name): # entity_type here is the map'
             for cid in t_obj["fs_canvas_ids"]:
                 self.fs_canvas.delete(cid)
     self.tokens = []
+    self._item_index.clear()
+    self._shown_items = {}
+    self._items_view = None
+    self._info_popup_item = None
+
+    # 5) Load the map's items; a map still holding a Tokens blob is
+    # migrated to map_items once it is built (step 7b)
+    token_list = _parse_tokens_blob(item.get("Tokens"))
+    migrate = bool(token_list)
+    if not migrate:
+        # Reads must see edits still queued by the background writer
+        map_writer(self.maps).flush()
+        token_list = load_map_items(map_name)
 
-    # 5) Parse persisted token list
-    raw = item.get("Tokens", [])
-   
-    if isinstance(raw, str):
-        try:
-            # Try ast.literal_eval first as it's safer for simple structures
-            token_list = ast.literal_eval(raw.strip() or "[]")
-        except (ValueError, SyntaxError): # Catch errors from ast.literal_eval
-            try:
-                # Fallback to json.loads if ast.literal_eval fails
-                token_list = json.loads(raw)
-            except json.JSONDecodeError: # Catch errors from json.loads
-                token_list = []
-                print(f"[_on_display_map] Failed to parse Tokens string: {raw}")
-        if not isinstance(token_list, list): # Ensure the result is a list
-            print(f"[_on_display_map] Parsed Tokens string but did not get a list: {raw}")
-            token_list = []
-
-    elif isinstance(raw, list):
-        token_list = raw
-    else:
-        token_list = []
-    
     print(f"[_on_display_map] Processing {len(token_list)} items from map data.")
 
-    # 6) Pre-load all Creature & NPC records once
-    creatures = {r.get("Name"): r for r in self._model_wrappers["Creature"].load_items()}
-    npcs      = {r.get("Name"): r for r in self._model_wrappers["NPC"].load_items()}
-    pcs       = {r.get("Name"): r for r in self._model_wrappers["PC"].load_items()}
+    # 6) Fetch only the Creature, NPC & PC records the tokens refer to
+    wanted = {"Creature": [], "NPC": [], "PC": []}
+    for rec in token_list:
+        if rec.get("type", "token") == "token" and rec.get("entity_type") in wanted:
+            wanted[rec["entity_type"]].append(rec.get("entity_id"))
+    creatures = self._model_wrappers["Creature"].get_many(wanted["Creature"])
+    npcs      = self._model_wrappers["NPC"].get_many(wanted["NPC"])
+    pcs       = self._model_wrappers["PC"].get_many(wanted["PC"])
 
     # 7) Build self.tokens (now includes shapes)
     for rec in token_list:
@@ -136,6 +169,8 @@ def _on_display_map(self, entity_type, map_name): # entity_type here is the map'
         item_data = {
             "type": item_type_from_rec,
             "position": (xw, yw),
+            "item_id": rec.get("item_id"),
+            "z": rec.get("z"),
         }
 
         if item_type_from_rec == "token":
@@ -145,20 +180,8 @@ def _on_display_map(self, entity_type, map_name): # entity_type here is the map'
             path = os.path.join(campaign_dir, portrait_path)
             
             sz   = rec.get("size", self.token_size) # Use self.token_size as default
+            # The portrait is decoded in the background (see step 9)
             pil_image = None
-            try:
-                if path and os.path.exists(path): # Check if path exists
-                    pil_image = Image.open(path).convert("RGBA")
-                    pil_image = pil_image.resize((sz, sz), resample=Image.LANCZOS)
-                elif path: # Path provided but does not exist
-                     print(f"[_on_display_map] Token image path not found: '{path}'. Creating placeholder.")
-                     pil_image = Image.new("RGBA", (sz, sz), (255, 0, 0, 128)) # Red placeholder
-                else: # No path provided for a token
-                    print(f"[_on_display_map] Token missing image_path. Creating placeholder for ID: {rec.get('entity_id')}.")
-                    pil_image = Image.new("RGBA", (sz, sz), (255, 0, 0, 128)) # Red placeholder
-            except Exception as e:
-                print(f"[_on_display_map] Failed to load token image '{path}': {e}. Creating placeholder.")
-                pil_image = Image.new("RGBA", (sz, sz), (255, 0, 0, 128)) # Red placeholder on any error
 
             item_data.update({
                 "entity_type":  rec.get("entity_type"), # Must come from record for tokens
@@ -189,7 +212,13 @@ def _on_display_map(self, entity_type, map_name): # entity_type here is the map'
         
         self.tokens.append(item_data)
 
-    # 8) Hydrate info box (ONLY FOR TOKENS)
+    # 7b) What is stored now, so the next save only writes what changes
+    self._persisted_items = _item_rows(self)
+    if migrate:
+        _migrate_tokens_blob(self, map_name)
+
+    # 8) Attach entity records (ONLY FOR TOKENS); the shared info popup
+    # formats their stats on first hover
     for current_item in self.tokens: # Renamed to current_item
         if current_item.get("type", "token") == "token":
             # Ensure entity_type is present for token, critical for lookup
@@ -198,43 +227,23 @@ def _on_display_map(self, entity_type, map_name): # entity_type here is the map'
 
             if not token_entity_type or not token_entity_id:
                 print(f"[_on_display_map] Token missing entity_type or entity_id, cannot hydrate info: {current_item}")
-                current_item["info_widget"] = None
                 current_item["entity_record"] = {}
                 continue
 
             record = {}
-            raw_txt = ""
             if token_entity_type == "Creature":
                 record = creatures.get(token_entity_id, {})
-                raw_txt = record.get("Stats", "")
             elif token_entity_type == "PC":
                 record = pcs.get(token_entity_id, {})
-                raw_txt = record.get("Stats", "") # Assuming PCs also use "Stats"
             elif token_entity_type == "NPC":
                 record = npcs.get(token_entity_id, {})
-                raw_txt = record.get("Traits", "")
             else:
                 print(f"[_on_display_map] Unknown entity_type '{token_entity_type}' for token ID '{token_entity_id}'. Cannot hydrate info.")
             
             current_item["entity_record"] = record
-
-            if isinstance(raw_txt, (list, tuple)):
-                info_text = "\n".join(map(str, raw_txt))
-            else:
-                info_text = str(raw_txt or "")
-            
-            # Use actual token size for info box height calculation
-            token_actual_size = current_item.get("size", self.token_size) 
-            info_box_height = token_actual_size * 2
-            tb = ctk.CTkTextbox(self.canvas, width=100, height=info_box_height, wrap="word")
-            tb._textbox.delete("1.0", "end")
-            tb._textbox.insert("1.0", info_text)
-            current_item["info_widget"] = tb
-        else: # For shapes, ensure info_widget is None
-            current_item["info_widget"] = None
+        else:
             current_item["entity_record"] = {} # Shapes don't have entity records
 
-    # 9) Finally draw everything onto the canvas
-    self._update_canvas_images()
-    if getattr(self, '_web_server_thread', None):
-        self._update_web_display_map()
+    # 9) Decode map, mask and portraits in the background; they are drawn
+    # as they arrive, a low-resolution preview of the map first
+    start_map_load(self, full_image_path, full_mask_path)
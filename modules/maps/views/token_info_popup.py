@@ -0,0 +1,90 @@
+import customtkinter as ctk
+from modules.helpers.text_helpers import format_longtext
+
+INFO_POPUP_WIDTH = 100
+INFO_HIDE_DELAY_MS = 150  # lets the pointer cross from a token onto its popup
+
+# Record field shown in the popup, per token entity type
+_INFO_FIELDS = {"Creature": "Stats", "PC": "Stats", "NPC": "Traits"}
+
+
+def token_info_text(item):
+    """The formatted stats text of a token, computed once per entity record."""
+    record = item.get("entity_record") or {}
+    cached = item.get("info_text")
+    if cached is not None and cached[0] is record:
+        return cached[1]
+    raw = record.get(_INFO_FIELDS.get(item.get("entity_type"), ""), "")
+    text = format_longtext(raw)
+    if isinstance(text, (list, tuple)):
+        text = "\n".join(map(str, text))
+    else:
+        text = str(text or "")
+    item["info_text"] = (record, text)
+    return text
+
+
+def show_token_info(self, item):
+    """Show the shared info popup next to ``item``, creating it on first use."""
+    _cancel_hide(self)
+    popup = getattr(self, "_info_popup", None)
+    # A new canvas is built for each map: the popup lives on the current one
+    if popup is None or popup.master is not self.canvas or not popup.winfo_exists():
+        popup = ctk.CTkTextbox(self.canvas, width=INFO_POPUP_WIDTH, height=self.token_size * 2, wrap="word")
+        popup.bind("<Enter>", lambda e: _cancel_hide(self))
+        popup.bind("<Leave>", lambda e: hide_token_info(self))
+        self._info_popup = popup
+        self._info_popup_id = self.canvas.create_window(0, 0, anchor="w", window=popup, state="hidden")
+        self._info_popup_text = None
+        self._info_popup_height = None
+    text = token_info_text(item)
+    if text != self._info_popup_text:
+        popup._textbox.delete("1.0", "end")
+        popup._textbox.insert("1.0", text)
+        self._info_popup_text = text
+    height = item.get("size", self.token_size) * 2
+    if height != self._info_popup_height:
+        popup.configure(height=height)
+        self._info_popup_height = height
+    self._info_popup_item = item
+    place_token_info(self)
+    self.canvas.itemconfigure(self._info_popup_id, state="normal")
+
+
+def place_token_info(self):
+    """Keep the popup beside its token after the token moved or the view changed."""
+    item = getattr(self, "_info_popup_item", None)
+    if item is None or not item.get("canvas_ids"):
+        return
+    bbox = self.canvas.bbox(item["canvas_ids"][1])
+    if bbox:
+        self.canvas.coords(self._info_popup_id, bbox[2] + 10, (bbox[1] + bbox[3]) / 2)
+
+
+def hide_token_info(self, item=None, now=False):
+    """Hide the popup (if it shows ``item``, when given), after a short delay unless ``now``."""
+    if getattr(self, "_info_popup_item", None) is None:
+        return
+    if item is not None and item is not self._info_popup_item:
+        return
+    _cancel_hide(self)
+    if now:
+        _hide(self)
+    else:
+        self._info_hide_after = self.canvas.after(INFO_HIDE_DELAY_MS, lambda: _hide(self))
+
+
+def _hide(self):
+    self._info_hide_after = None
+    self._info_popup_item = None
+    try:
+        self.canvas.itemconfigure(self._info_popup_id, state="hidden")
+    except Exception:
+        pass  # the canvas was replaced
+
+
+def _cancel_hide(self):
+    after_id = getattr(self, "_info_hide_after", None)
+    if after_id:
+        self.canvas.after_cancel(after_id)
+        self._info_hide_after = None
@@ -1,12 +1,136 @@
 import io
+import json
+import math
 import threading
 import logging
-from flask import Flask, send_file
+from flask import Flask, Response, request, send_file
 from werkzeug.serving import make_server
-from PIL import Image, ImageDraw
 from modules.helpers.config_helper import ConfigHelper
+from modules.maps.services.web_scene import WebScene, token_state, token_delta
+from modules.maps.services.item_index import item_bounds
+from modules.maps.utils.fog_mask import CLEAR
+
+# Flask app pushing the players' view to browsers: the page listens to
+# /events (server-sent events) and only fetches what changed.
+
+_PAGE = """
+<!DOCTYPE html>
+<html>
+<head>
+<meta charset='utf-8'>
+<title>Map Display</title>
+<style>
+    body { margin: 0; background: black; overflow-x: hidden; }
+    #view { position: relative; transform-origin: 0 0; overflow: hidden; }
+    #view img { position: absolute; }
+</style>
+<script>
+    let frame = null;
+    const tokens = {};
+
+    function fit() {
+        const view = document.getElementById('view');
+        const w = parseInt(view.style.width) || 1;
+        view.style.transform = 'scale(' + Math.min(1, window.innerWidth / w) + ')';
+    }
+
+    function setToken(id, t) {
+        let img = tokens[id];
+        if (!img) {
+            img = document.createElement('img');
+            img.style.borderStyle = 'solid';
+            img.style.borderWidth = '3px';
+            document.getElementById('tokens').appendChild(img);
+            tokens[id] = img;
+        }
+        img.style.left = (t.x - 3) + 'px';
+        img.style.top = (t.y - 3) + 'px';
+        if (t.img !== undefined) {
+            img.src = '/token/' + id + '?i=' + t.img;
+            img.style.width = t.w + 'px';
+            img.style.height = t.h + 'px';
+            img.style.borderColor = t.border;
+            img.style.zIndex = t.z;
+        }
+    }
+
+    function removeToken(id) {
+        if (tokens[id]) { tokens[id].remove(); delete tokens[id]; }
+    }
+
+    function applyState(s) {
+        const view = document.getElementById('view');
+        view.style.width = s.width + 'px';
+        view.style.height = s.height + 'px';
+        if (s.frame !== frame) {
+            frame = s.frame;
+            // Ask for a variant no wider than the screen can show
+            const w = Math.round(Math.min(s.width, window.innerWidth) * (window.devicePixelRatio || 1));
+            const base = document.getElementById('base');
+            base.src = '/base?v=' + frame + '&w=' + w;
+            base.style.width = s.width + 'px';
+            base.style.height = s.height + 'px';
+            const fog = document.getElementById('fog');
+            fog.style.display = s.fog ? '' : 'none';
+            if (s.fog) fog.src = '/fog?v=' + frame + '&w=' + w;
+            fog.style.left = s.fog_x + 'px';
+            fog.style.top = s.fog_y + 'px';
+            fog.style.width = s.fog_w + 'px';
+            fog.style.height = s.fog_h + 'px';
+        }
+        for (const id of Object.keys(tokens)) if (!(id in s.tokens)) removeToken(id);
+        for (const [id, t] of Object.entries(s.tokens)) setToken(id, t);
+        fit();
+    }
+
+    function applyTokens(d) {
+        for (const id of d.removed) removeToken(id);
+        for (const [id, t] of Object.entries(d.changed)) setToken(id, t);
+    }
+
+    window.addEventListener('load', () => {
+        const events = new EventSource('/events');
+        events.addEventListener('state', e => applyState(JSON.parse(e.data)));
+        events.addEventListener('tokens', e => applyTokens(JSON.parse(e.data)));
+    });
+    window.addEventListener('resize', fit);
+</script>
+</head>
+<body>
+<div id='view'>
+    <img id='base' style='left: 0; top: 0; z-index: 0'>
+    <div id='tokens' style='position: absolute; left: 0; top: 0; z-index: 1'></div>
+    <img id='fog' style='z-index: 100000'>
+</div>
+</body>
+</html>
+"""
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _image_response(web, layer, token_id=None, max_age=0):
+    """
+    Serve an encoded layer in the configured format and the ``?w=`` width
+    variant, with revalidation: unchanged images cost a 304.
+    """
+    fmt = web.pick_format(layer, request.accept_mimetypes)
+    width = web.pick_width(request.args.get('w')) if layer != 'token' else None
+    result = web.image(layer, token_id, fmt, width)
+    if result is None:
+        return ('No map image', 404)
+    etag, mimetype, data = result
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+    else:
+        resp = send_file(io.BytesIO(data), mimetype=mimetype, max_age=max_age)
+    resp.set_etag(etag)
+    resp.headers['Cache-Control'] = f'max-age={max_age}' if max_age else 'no-cache'
+    resp.headers['Vary'] = 'Accept'
+    return resp
 
-# Simple Flask app to serve the current map image
 
 def open_web_display(self, port=None):
     if port is None:
@@ -15,49 +139,54 @@ def open_web_display(self, port=None):
         return  # already running
     self._web_app = Flask(__name__)
     self._web_port = port
-
-    controller = self
+    self._web_scene = web = WebScene()
+    self._web_image_version = None
 
     @self._web_app.route('/')
     def index():
-        # Basic HTML page that reloads the map image periodically so
-        # changes on the GM side appear without requiring a manual refresh.
-        return """
-        <!DOCTYPE html>
-        <html>
-        <head>
-        <meta charset='utf-8'>
-        <title>Map Display</title>
-        <style>
-            body { margin: 0; }
-            img { max-width: 100%; height: auto; }
-        </style>
-        <script>
-            function reloadImage() {
-                const img = document.getElementById('mapImage');
-                img.src = '/map.png?ts=' + Date.now();
-            }
-            setInterval(reloadImage, 1000);
-        </script>
-        </head>
-        <body>
-        <img id='mapImage' src='/map.png?ts=0'>
-        </body>
-        </html>
-        """
+        return _PAGE
+
+    @self._web_app.route('/events')
+    def events():
+        # One stream per browser: a full state on connect, then a full
+        # state when the map or fog changed, or only the token changes
+        def stream():
+            sent = web.state()
+            yield _sse("state", sent)
+            while not web.closed:
+                if not web.wait(sent["version"]):
+                    yield ": keepalive\n\n"
+                    continue
+                current = web.state()
+                if current["frame"] != sent["frame"]:
+                    yield _sse("state", current)
+                else:
+                    yield _sse("tokens", token_delta(sent["tokens"], current["tokens"]))
+                sent = current
+        resp = Response(stream(), mimetype='text/event-stream')
+        resp.headers['Cache-Control'] = 'no-cache'
+        resp.headers['X-Accel-Buffering'] = 'no'
+        return resp
+
+    # Layer URLs carry their version, so browsers may cache them
+    @self._web_app.route('/base')
+    def base_image():
+        return _image_response(web, "base", max_age=3600)
+
+    @self._web_app.route('/fog')
+    def fog_image():
+        return _image_response(web, "fog", max_age=3600)
+
+    @self._web_app.route('/token/<token_id>')
+    def token_image(token_id):
+        # 404 for any id not in the current state, fogged tokens included
+        return _image_response(web, "token", token_id, max_age=3600)
 
     @self._web_app.route('/map.png')
     def map_png():
-        controller._update_web_display_map()
-        data = getattr(controller, '_web_image_bytes', None)
-        if not data:
-            return ('No map image', 404)
-        buf = io.BytesIO(data)
-        resp = send_file(buf, mimetype='image/png', max_age=0)
-        resp.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-        resp.headers['Pragma'] = 'no-cache'
-        resp.headers['Expires'] = '0'
-        return resp
+        # Whole view in one image, for clients that poll; the ETag follows
+        # the version. Despite the name, served in the configured format.
+        return _image_response(web, "map")
 
     def run_app():
         self._web_server = make_server('0.0.0.0', port, self._web_app, threaded=True)
@@ -65,69 +194,111 @@ def open_web_display(self, port=None):
 
     self._web_server_thread = threading.Thread(target=run_app, daemon=True)
     self._web_server_thread.start()
+    self._update_web_display_map()
 
 
-def _render_map_image(self):
-    if not self.base_img:
-        return None
-    w, h = self.base_img.size
-    sw, sh = int(w * self.zoom), int(h * self.zoom)
+def _frame_spec(self, size):
+    """
+    Snapshot of the map layer and the players' fog for the web frame; the
+    web scene's worker composites and encodes it (see render_frame).
+    """
+    scene = self.scene
     x0, y0 = int(self.pan_x), int(self.pan_y)
-    min_x, min_y = min(0, x0), min(0, y0)
-    max_x, max_y = max(sw, x0 + sw), max(sh, y0 + sh)
-    width, height = max_x - min_x, max_y - min_y
-    img = Image.new('RGBA', (width, height), (0, 0, 0, 255))
-    base_resized = self.base_img.resize((sw, sh), Image.LANCZOS)
-    img.paste(base_resized, (x0 - min_x, y0 - min_y))
-
-    draw = ImageDraw.Draw(img)
+    # Only the part of the map inside the frame is scaled
+    box = (-x0, -y0, size[0] - x0, size[1] - y0)
+    offset = (max(0, x0), max(0, y0))
+    shapes = []
     for item in self.tokens:
         item_type = item.get('type', 'token')
+        if item_type not in ['rectangle', 'oval']:
+            continue
         xw, yw = item.get('position', (0, 0))
-        sx = int(xw * self.zoom + self.pan_x - min_x)
-        sy = int(yw * self.zoom + self.pan_y - min_y)
-        if item_type == 'token':
-            pil = item.get('pil_image')
-            if pil:
-                tw, th = pil.size
-                nw, nh = int(tw * self.zoom), int(th * self.zoom)
-                img_r = pil.resize((nw, nh), Image.LANCZOS)
-                img.paste(img_r, (sx, sy), img_r.convert('RGBA'))
-                draw.rectangle([sx - 3, sy - 3, sx + nw + 3, sy + nh + 3], outline=item.get('border_color', '#0000ff'), width=3)
-        elif item_type in ['rectangle', 'oval']:
-            shape_w = int(item.get('width', 50) * self.zoom)
-            shape_h = int(item.get('height', 50) * self.zoom)
-            fill_color = None
-            if item.get('is_filled', True):
-                fc = item.get('fill_color')
-                fill_color = fc if fc else None
-            border_color = item.get('border_color', '#000000') or None
-            if item_type == 'rectangle':
-                draw.rectangle([sx, sy, sx + shape_w, sy + shape_h], fill=fill_color, outline=border_color, width=2)
-            else:
-                draw.ellipse([sx, sy, sx + shape_w, sy + shape_h], fill=fill_color, outline=border_color, width=2)
-
-    if self.mask_img:
-        mask_copy = self.mask_img.copy()
-        _, _, _, alpha = mask_copy.split()
-        processed_alpha = alpha.point(lambda a: 255 if a > 0 else 0)
-        mask_copy.putalpha(processed_alpha)
-        mask_resized = mask_copy.resize((sw, sh), Image.LANCZOS)
-        img.paste(mask_resized, (x0 - min_x, y0 - min_y), mask_resized)
-
-    return img
+        sx = int(xw * self.zoom + self.pan_x)
+        sy = int(yw * self.zoom + self.pan_y)
+        shape_w = int(item.get('width', 50) * self.zoom)
+        shape_h = int(item.get('height', 50) * self.zoom)
+        fill_color = None
+        if item.get('is_filled', True):
+            fc = item.get('fill_color')
+            fill_color = fc if fc else None
+        border_color = item.get('border_color', '#000000') or None
+        shapes.append((item_type, [sx, sy, sx + shape_w, sy + shape_h], fill_color, border_color))
+
+    return {
+        "size": size,
+        "base": scene.scaled_base(self.zoom, box=box),
+        "base_offset": offset,
+        "shapes": shapes,
+        "fog": scene.scaled_player_fog(self.zoom, box=box) if self.mask_img else None,
+        "fog_offset": offset,
+    }
+
+
+def _hidden_by_fog(self, item):
+    """True when the players' fog covers the whole of ``item``, which is then never sent."""
+    mask = self.mask_img
+    if mask is None:
+        return False
+    left, top, right, bottom = item_bounds(self, item)
+    box = (int(left), int(top), int(math.ceil(right)), int(math.ceil(bottom)))
+    if box[0] < 0 or box[1] < 0 or box[2] > mask.width or box[3] > mask.height:
+        return False  # partly off the map, where there is no fog
+    if box[2] <= box[0] or box[3] <= box[1]:
+        return False
+    # Players see any fog at all as opaque (see fog_mask.binarize_mask)
+    return mask.crop(box).getextrema()[0] != CLEAR
+
+
+def _shapes_key(self):
+    return tuple(
+        (id(item), tuple(item.get('position', (0, 0))), item.get('width'), item.get('height'),
+         item.get('is_filled'), item.get('fill_color'), item.get('border_color'))
+        for item in self.tokens if item.get('type', 'token') in ('rectangle', 'oval')
+    )
 
 
 def _update_web_display_map(self):
-    if not getattr(self, '_web_server_thread', None):
+    """
+    Publish the current view to the web display. The map and fog layers
+    are only re-rendered when the view, the fog or the shapes changed;
+    otherwise browsers just get the token moves. Tokens entirely under the
+    players' fog are left out of the state. Compositing and encoding
+    happen on the web scene's worker, never on the Tk thread.
+    """
+    if not getattr(self, '_web_server_thread', None) or not self.base_img:
         return
-    img = _render_map_image(self)
-    if img is None:
+    scene = self.scene
+    # Several callers refresh the web view for the same change
+    if getattr(self, '_web_image_version', None) == scene.version:
         return
-    buf = io.BytesIO()
-    img.save(buf, format='PNG')
-    self._web_image_bytes = buf.getvalue()
-    buf.close()
+    self._web_image_version = scene.version
+
+    # Players see what the GM frames, like the fullscreen view
+    size = (max(1, self.canvas.winfo_width()), max(1, self.canvas.winfo_height()))
+
+    tokens = {}
+    for z, item in enumerate(self.tokens):
+        if item.get('type', 'token') != 'token' or not item.get('pil_image'):
+            continue
+        if _hidden_by_fog(self, item):
+            continue  # neither its position nor its image may reach players
+        img_r = scene.token_image(item['pil_image'], self.zoom)
+        if img_r is None:
+            continue
+        xw, yw = item.get('position', (0, 0))
+        sx = int(xw * self.zoom + self.pan_x)
+        sy = int(yw * self.zoom + self.pan_y)
+        if sx + img_r.width < 0 or sy + img_r.height < 0 or sx > size[0] or sy > size[1]:
+            continue  # outside the frame
+        tokens[str(id(item))] = token_state(item, img_r, sx, sy, z + 1)
+
+    web = self._web_scene
+    layer_key = (id(self.base_img), scene.fog_version, round(self.zoom, 6),
+                 int(self.pan_x), int(self.pan_y), size, _shapes_key(self))
+    spec = None
+    if layer_key != web.layer_key:
+        spec = _frame_spec(self, size)
+    web.publish(layer_key, spec, tokens)
 
 def close_web_display(self, port=None):
     """Shut down the web display server if it is running.
@@ -147,6 +318,10 @@ def close_web_display(self, port=None):
             int(ConfigHelper.get("MapServer", "map_port", fallback=32000)),
         )
 
+    if getattr(self, '_web_scene', None):
+        # Ends the event streams still waiting for changes
+        self._web_scene.close()
+
     if getattr(self, '_web_server', None):
         try:
             self._web_server.shutdown()
@@ -27,6 +27,12 @@ ctk.set_default_color_theme("blue")
 PORTRAIT_FOLDER = os.path.join(ConfigHelper.get_campaign_dir(), "assets", "portraits")
 MAX_PORTRAIT_SIZE = (64, 64)
 
+# Zoom limits, and how long the wheel must rest before nodes are re-rendered
+MIN_ZOOM, MAX_ZOOM = 0.5, 2.5
+ZOOM_SETTLE_MS = 200
+# Zoom levels whose rendered node layouts are kept (see _node_layout)
+CACHED_SCALES = 3
+
 # ─────────────────────────────────────────────────────────────────────────
 # CLASS: NPCGraphEditor
 # A custom graph editor for NPCs and factions using CustomTkinter.
@@ -67,6 +73,9 @@ class NPCGraphEditor(ctk.CTkFrame):
         self.node_bboxes = {}     # Bounding boxes for nodes (used for arrow offsets)
         self.shape_counter = 0  # For unique shape tags
         self.node_holder_images = {}  # PhotoImage refs for post-it & overlay images
+        self._portrait_sources = {}   # portrait path -> PIL image, read once
+        self._layout_cache = {}       # scale bucket -> {node key: layout}, oldest first
+        self._zoom_redraw_id = None   # pending re-render once a zoom gesture settles
         # Variables for selection and dragging
         self.selected_node = None
         self.selected_items = []  # All canvas items belonging to the selected node
@@ -127,41 +136,56 @@ class NPCGraphEditor(ctk.CTkFrame):
         self.canvas.bind("<Double-Button-1>", self.open_npc_editor)
 
     def _on_zoom(self, event):
+        """
+        Zoom around the mouse. What is drawn is only scaled in place (one
+        canvas call); fonts and images are re-rendered at the new size once
+        the wheel rests for ZOOM_SETTLE_MS.
+        """
         if event.delta > 0 or event.num == 4:
             scale = self.zoom_factor
         else:
             scale = 1 / self.zoom_factor
 
-        new_scale = self.canvas_scale * scale
-        new_scale = max(0.5, min(new_scale, 2.5))
+        new_scale = max(MIN_ZOOM, min(self.canvas_scale * scale, MAX_ZOOM))
         scale_change = new_scale / self.canvas_scale
+        if scale_change == 1:
+            return
         self.canvas_scale = new_scale
 
         # Use mouse as zoom anchor
         anchor_x = self.canvas.canvasx(event.x)
         anchor_y = self.canvas.canvasy(event.y)
 
+        def zoomed(x, y):
+            return (anchor_x + (x - anchor_x) * scale_change,
+                    anchor_y + (y - anchor_y) * scale_change)
+
         # Update positions
+        nodes_by_tag = {node.get("tag"): node for node in self.graph["nodes"]}
         for tag, (x, y) in self.node_positions.items():
-            dx = x - anchor_x
-            dy = y - anchor_y
-            new_x = anchor_x + dx * scale_change
-            new_y = anchor_y + dy * scale_change
+            new_x, new_y = zoomed(x, y)
             self.node_positions[tag] = (new_x, new_y)
-            for node in self.graph["nodes"]:
-                node_tag = f"npc_{node['npc_name'].replace(' ', '_')}"
-                if node_tag == tag:
-                    node["x"], node["y"] = new_x, new_y
-                    break
+            node = nodes_by_tag.get(tag)
+            if node is not None:
+                node["x"], node["y"] = new_x, new_y
+        # Links are routed against the node boxes while the gesture lasts
+        for tag, (left, top, right, bottom) in self.node_bboxes.items():
+            self.node_bboxes[tag] = zoomed(left, top) + zoomed(right, bottom)
 
         # Also apply to shapes
-        for tag, shape in self.shapes.items():
-            dx = shape["x"] - anchor_x
-            dy = shape["y"] - anchor_y
-            shape["x"] = anchor_x + dx * scale_change
-            shape["y"] = anchor_y + dy * scale_change
+        for shape in self.shapes.values():
+            shape["x"], shape["y"] = zoomed(shape["x"], shape["y"])
+
+        self.canvas.scale("!background", anchor_x, anchor_y, scale_change, scale_change)
+        if self._zoom_redraw_id is not None:
+            self.canvas.after_cancel(self._zoom_redraw_id)
+        self._zoom_redraw_id = self.canvas.after(ZOOM_SETTLE_MS, self._on_zoom_settled)
+
+    def _on_zoom_settled(self):
+        self._zoom_redraw_id = None
+        if self.canvas.winfo_exists():
+            self.draw_graph()
 
-        self.draw_graph()
  # ─────────────────────────────────────────────────────────────────────────
     # FUNCTION: open_npc_editor
     # Opens the Generic Editor Window for the clicked NPC.
@@ -737,19 +761,6 @@ class NPCGraphEditor(ctk.CTkFrame):
         GAP = int(5 * scale)
         PAD = int(10 * scale)
 
-        # Helper to measure wrapped text height
-        def measure_text_height(text, font, wrap_width):
-            tid = self.canvas.create_text(
-                0, 0,
-                text=text,
-                font=font,
-                width=wrap_width,
-                anchor="nw"
-            )
-            bbox = self.canvas.bbox(tid)
-            self.canvas.delete(tid)
-            return (bbox[3] - bbox[1]) if bbox else 0
-
         for node in self.graph["nodes"]:
             npc_name = node["npc_name"]
             tag = node.get("tag")
@@ -761,25 +772,6 @@ class NPCGraphEditor(ctk.CTkFrame):
             fv = data.get("Factions", "")
             fv_text = ", ".join(fv) if isinstance(fv, list) else str(fv) if fv else ""
 
-            # ── Load & scale portrait ─────────────────────────────────
-            portrait_img = None
-            p_w = p_h = 0
-            portrait_path = data.get("Portrait", "")
-            if portrait_path and not os.path.isabs(portrait_path):
-                candidate = os.path.join(ConfigHelper.get_campaign_dir(), portrait_path)
-                if os.path.exists(candidate):
-                    portrait_path = candidate
-            if portrait_path and os.path.exists(portrait_path):
-                img = Image.open(portrait_path)
-                ow, oh = img.size
-                max_w = int(80 * scale)
-                max_h = int(80 * scale)
-                ratio = min(max_w/ow, max_h/oh, 1.0)
-                p_w, p_h = int(ow*ratio), int(oh*ratio)
-                img = img.resize((p_w, p_h), Image.Resampling.LANCZOS)
-                portrait_img = ImageTk.PhotoImage(img, master=self.canvas)
-                self.node_images[tag] = portrait_img
-
             # ── Prepare title & body text ────────────────────────────
             title_text = npc_name
             body_text = "\n".join(filter(None, [role, fv_text]))
@@ -788,30 +780,20 @@ class NPCGraphEditor(ctk.CTkFrame):
             title_font = ("Arial", max(1, int(10 * scale)), "bold")
             body_font  = ("Arial", max(1, int(9  * scale)))
 
-            # ── Compute wrap width & measure text heights ────────────
-            wrap_width = max(p_w, int(150 * scale)) - 2 * PAD
-            title_h = measure_text_height(title_text, title_font, wrap_width)
-            body_h  = measure_text_height(body_text,  body_font,  wrap_width) if body_text else 0
-
-            # ── Compute content & node dimensions ────────────────────
-            content_w = max(p_w, wrap_width)
-            content_h = (
-                p_h
-                + (GAP if p_h > 0 and (title_h > 0 or body_h > 0) else 0)
-                + title_h
-                + (GAP if body_h > 0 else 0)
-                + body_h
-            )
-            min_w = content_w + 2 * PAD
-            min_h = content_h + 2 * PAD
+            # ── Portrait, text heights & node size (cached) ──────────
+            layout = self._node_layout(data.get("Portrait", ""), title_text, body_text,
+                                       title_font, body_font)
+            portrait_img = layout["portrait"]
+            if portrait_img:
+                self.node_images[tag] = portrait_img
+            p_h = layout["p_h"]
+            wrap_width = layout["wrap_width"]
+            title_h, body_h = layout["title_h"], layout["body_h"]
+            node_w, node_h = layout["node_w"], layout["node_h"]
 
             # ── 1) Draw the post-it background ───────────────────────
-            if self.postit_base:
-                ow, oh = self.postit_base.size
-                sf = max(min_w / ow, min_h / oh)
-                node_w, node_h = int(ow * sf), int(oh * sf)
-                bg_img = self.postit_base.resize((node_w, node_h), Image.Resampling.LANCZOS)
-                bg_photo = ImageTk.PhotoImage(bg_img, master=self.canvas)
+            bg_photo = layout["postit"]
+            if bg_photo:
                 self.node_holder_images[tag] = bg_photo
                 self.canvas.create_image(
                     x, y,
@@ -819,8 +801,6 @@ class NPCGraphEditor(ctk.CTkFrame):
                     anchor="center",
                     tags=(tag, "node_bg", "node")
                 )
-            else:
-                node_w, node_h = min_w, min_h
 
             # ── 2) Draw the thumbtack pin ────────────────────────────
             if self.pin_image:
@@ -845,7 +825,7 @@ class NPCGraphEditor(ctk.CTkFrame):
 
             # ── 4) Draw the wrapped title ────────────────────────────
             if title_h > 0:
-                title_id = self.canvas.create_text(
+                self.canvas.create_text(
                     x, current_y,
                     text=title_text,
                     font=title_font,
@@ -855,9 +835,7 @@ class NPCGraphEditor(ctk.CTkFrame):
                     justify="center",
                     tags=(tag, "node_fg", "node")
                 )
-                bbox = self.canvas.bbox(title_id)
-                actual_h = (bbox[3] - bbox[1]) if bbox else title_h
-                current_y += actual_h + (GAP if body_h > 0 else 0)
+                current_y += title_h + (GAP if body_h > 0 else 0)
 
             # ── 5) Draw body text ────────────────────────────────────
             if body_h > 0:
@@ -881,6 +859,117 @@ class NPCGraphEditor(ctk.CTkFrame):
             # ── 7) Layer foreground above background ────────────────
             self.canvas.tag_raise("node_fg", "node_bg")
 
+    # ─────────────────────────────────────────────────────────────────────────
+    # FUNCTION: _node_layout
+    # Portrait, text heights and post-it of a node at the current zoom. They
+    # only depend on the node's content and the scale, so they are kept per
+    # scale bucket: redrawing (after a drag, a link...) or zooming back to a
+    # recent level reuses them instead of resizing images again.
+    # ─────────────────────────────────────────────────────────────────────────
+    def _node_layout(self, portrait_path, title_text, body_text, title_font, body_font):
+        scale = self.canvas_scale
+        bucket = round(scale, 2)
+        layouts = self._layout_cache.pop(bucket, None)
+        if layouts is None:
+            layouts = {}
+            while len(self._layout_cache) >= CACHED_SCALES:
+                del self._layout_cache[next(iter(self._layout_cache))]
+        self._layout_cache[bucket] = layouts  # most recently used last
+
+        key = (portrait_path, title_text, body_text)
+        layout = layouts.get(key)
+        if layout is not None:
+            return layout
+
+        PAD = int(10 * scale)
+        GAP = int(5 * scale)
+
+        # ── Load & scale portrait ─────────────────────────────────
+        portrait_img = None
+        p_w = p_h = 0
+        img = self._portrait_source(portrait_path)
+        if img is not None:
+            ow, oh = img.size
+            max_w = int(80 * scale)
+            max_h = int(80 * scale)
+            ratio = min(max_w/ow, max_h/oh, 1.0)
+            p_w, p_h = int(ow*ratio), int(oh*ratio)
+            img = img.resize((p_w, p_h), Image.Resampling.LANCZOS)
+            portrait_img = ImageTk.PhotoImage(img, master=self.canvas)
+
+        # ── Compute wrap width & measure text heights ────────────
+        wrap_width = max(p_w, int(150 * scale)) - 2 * PAD
+        title_h = self._measure_text_height(title_text, title_font, wrap_width)
+        body_h  = self._measure_text_height(body_text,  body_font,  wrap_width) if body_text else 0
+
+        # ── Compute content & node dimensions ────────────────────
+        content_w = max(p_w, wrap_width)
+        content_h = (
+            p_h
+            + (GAP if p_h > 0 and (title_h > 0 or body_h > 0) else 0)
+            + title_h
+            + (GAP if body_h > 0 else 0)
+            + body_h
+        )
+        min_w = content_w + 2 * PAD
+        min_h = content_h + 2 * PAD
+
+        # ── Post-it sized to fit, shared by nodes of the same size ─
+        postit = None
+        if self.postit_base:
+            ow, oh = self.postit_base.size
+            sf = max(min_w / ow, min_h / oh)
+            node_w, node_h = int(ow * sf), int(oh * sf)
+            postit_key = ("postit", node_w, node_h)
+            postit = layouts.get(postit_key)
+            if postit is None:
+                bg_img = self.postit_base.resize((node_w, node_h), Image.Resampling.LANCZOS)
+                postit = layouts[postit_key] = ImageTk.PhotoImage(bg_img, master=self.canvas)
+        else:
+            node_w, node_h = min_w, min_h
+
+        layout = layouts[key] = {
+            "portrait": portrait_img, "p_w": p_w, "p_h": p_h,
+            "wrap_width": wrap_width, "title_h": title_h, "body_h": body_h,
+            "node_w": node_w, "node_h": node_h, "postit": postit,
+        }
+        return layout
+
+    def _portrait_source(self, portrait_path):
+        """The portrait image, read from disk once; None if there is none."""
+        if portrait_path in self._portrait_sources:
+            return self._portrait_sources[portrait_path]
+        path = portrait_path
+        if path and not os.path.isabs(path):
+            candidate = os.path.join(ConfigHelper.get_campaign_dir(), path)
+            if os.path.exists(candidate):
+                path = candidate
+        img = None
+        if path and os.path.exists(path):
+            try:
+                img = Image.open(path)
+                # Never shown larger than at the maximum zoom
+                size = int(80 * MAX_ZOOM)
+                img.thumbnail((size, size), Image.Resampling.LANCZOS)
+            except Exception as e:
+                print(f"Error loading portrait {path}: {e}")
+                img = None
+        self._portrait_sources[portrait_path] = img
+        return img
+
+    def _measure_text_height(self, text, font, wrap_width):
+        # Height of the wrapped text, measured with a throwaway canvas item
+        tid = self.canvas.create_text(
+            0, 0,
+            text=text,
+            font=font,
+            width=wrap_width,
+            anchor="nw"
+        )
+        bbox = self.canvas.bbox(tid)
+        self.canvas.delete(tid)
+        return (bbox[3] - bbox[1]) if bbox else 0
+
     # ─────────────────────────────────────────────────────────────────────────
     # FUNCTION: draw_all_links
     # Iterates over all links in the graph and draws them, then lowers link elements behind nodes.
@@ -1333,9 +1422,7 @@ class NPCGraphEditor(ctk.CTkFrame):
         #self.canvas.delete("link_text")
         # ── 1) Remove everything except the corkboard background ──
         #    we keep only items tagged “background”
-        for item in self.canvas.find_all():
-            if "background" not in self.canvas.gettags(item):
-                self.canvas.delete(item)
+        self.canvas.delete("!background")
         self.node_bboxes = {}
         self.draw_all_shapes()
         self.draw_nodes()
@@ -12,8 +12,7 @@ def open_npc_editor_window(npc_name):
     """
     # 1. Load the NPC data from the "npcs" file.
     npc_wrapper = GenericModelWrapper("npcs")
-    items = npc_wrapper.load_items()
-    npc_item = next((i for i in items if i.get("Name") == npc_name), None)
+    npc_item = npc_wrapper.get_by_key(npc_name)
     if not npc_item:
         messagebox.showerror("Error", f"NPC '{npc_name}' not found.")
         return
@@ -12,8 +12,7 @@ def open_pc_editor_window(pc_name):
     """
     # 1. Load the NPC data from the "pcs" file.
     npc_wrapper = GenericModelWrapper("pcs")
-    items = npc_wrapper.load_items()
-    npc_item = next((i for i in items if i.get("Name") == pc_name), None)
+    npc_item = npc_wrapper.get_by_key(pc_name)
     if not npc_item:
         messagebox.showerror("Error", f"NPC '{pc_name}' not found.")
         return
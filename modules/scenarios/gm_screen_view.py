@@ -6,6 +6,7 @@ from tkinter import filedialog, messagebox
 from PIL import Image
 from functools import partial
 from modules.generic.generic_model_wrapper import GenericModelWrapper
+from db.db import search
 from modules.helpers.text_helpers import format_multiline_text
 from customtkinter import CTkLabel, CTkImage
 from modules.generic.entity_detail_factory import create_entity_detail_frame
@@ -175,18 +176,29 @@ class GMScreenView(ctk.CTkFrame):
         search_map = []
 
         # 6) Populate & auto-select first
+        type_by_table = {w.table.lower(): et for et, w in self.wrappers.items()}
+
         def populate(initial=False, query=""):
             listbox.delete(0, "end")
             search_map.clear()
-            for entity_type, wrapper in self.wrappers.items():
-                items = wrapper.load_items()
-                key = "Title" if entity_type in ("Scenarios", "Informations") else "Name"
-                for item in items:
-                    name = item.get(key, "")
-                    if initial or query in name.lower():
-                        display = f"{entity_type[:-1]}: {name}"
-                        listbox.insert("end", display)
-                        search_map.append((entity_type, name))
+            # Ranked full-text matches on names and descriptions
+            results = None if initial or not query else search(
+                query, types=list(type_by_table), limit=50
+            )
+            if results is not None:
+                for table, name in results:
+                    entity_type = type_by_table[table]
+                    listbox.insert("end", f"{entity_type[:-1]}: {name}")
+                    search_map.append((entity_type, name))
+            else:
+                for entity_type, wrapper in self.wrappers.items():
+                    key = wrapper.key_field
+                    for item in wrapper.load_items(fields=[key]):
+                        name = item.get(key, "")
+                        if initial or query in name.lower():
+                            display = f"{entity_type[:-1]}: {name}"
+                            listbox.insert("end", display)
+                            search_map.append((entity_type, name))
             # auto-select first if present
             if listbox.size() > 0:
                 listbox.selection_clear(0, "end")
@@ -649,9 +661,7 @@ class GMScreenView(ctk.CTkFrame):
         and provides a mechanism to recursively open related entities.
         """
         wrapper = self.wrappers[entity_type]
-        items = wrapper.load_items()
-        key = "Title" if (entity_type == "Scenarios" or entity_type == "Informations") else "Name"
-        item = next((i for i in items if i.get(key) == name), None)
+        item = wrapper.get_by_key(name)
         if not item:
             messagebox.showerror("Error", f"{entity_type[:-1]} '{name}' not found.")
             return
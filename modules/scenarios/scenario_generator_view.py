@@ -141,7 +141,6 @@ class ScenarioGeneratorView(ctk.CTkFrame):
             messagebox.showwarning("Duplicate Title", f"A scenario titled '{title}' already exists.")
             return
 
-        existing.append(scenario_entity)
-        wrapper.save_items(existing)
+        wrapper.upsert_item(scenario_entity)
         messagebox.showinfo("Saved", f"Scenario '{title}' added to database.")
 
@@ -173,17 +173,9 @@ def import_formatted_scenario(text):
     places_wrapper = GenericModelWrapper("places")
     npcs_wrapper = GenericModelWrapper("npcs")
     
-    existing_scenarios = scenario_wrapper.load_items()
-    existing_places = places_wrapper.load_items()
-    existing_npcs = npcs_wrapper.load_items()
-    
-    combined_scenarios = existing_scenarios + [scenario_entity]
-    combined_places = existing_places + locations
-    combined_npcs = existing_npcs + npcs
-    
-    scenario_wrapper.save_items(combined_scenarios)
-    places_wrapper.save_items(combined_places)
-    npcs_wrapper.save_items(combined_npcs)
+    scenario_wrapper.upsert_item(scenario_entity)
+    places_wrapper.upsert_many(locations)
+    npcs_wrapper.upsert_many(npcs)
     
    #logging.info("Scenario imported successfully using the database (appended to existing data)!")
 
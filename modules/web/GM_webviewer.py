@@ -1,8 +1,6 @@
 import os
-import re
 import json
 import logging
-import platform
 import html
 
 from flask import (
@@ -25,6 +23,7 @@ from sqlalchemy.orm import joinedload
 
 from modules.helpers.config_helper import ConfigHelper
 from modules.generic.generic_model_wrapper import GenericModelWrapper
+from db.db import resolve_db_path
 from modules.helpers.text_helpers import format_multiline_text, rtf_to_html
 
 # ──────────────────────────────────────────────────────────────────────────────
@@ -42,18 +41,7 @@ app.jinja_env.filters['loads'] = json.loads
 # ──────────────────────────────────────────────────────────────────────────────
 # Paths & DB Name
 # ──────────────────────────────────────────────────────────────────────────────
-raw_db_path = ConfigHelper.get("Database", "path", fallback="default_campaign.db").strip()
-is_windows_style_path = re.match(r"^[a-zA-Z]:[\\/]", raw_db_path)
-if platform.system() != "Windows" and is_windows_style_path:
-    drive_letter = raw_db_path[0].upper()
-    subpath = raw_db_path[2:].lstrip("/\\").replace("\\", "/")
-    if subpath.lower().startswith("synologydrive/"):
-        subpath = subpath[len("synologydrive/"):]
-    synology_base = "/volume1/homes/llankar/Drive"
-    DB_PATH = os.path.join(synology_base, subpath)
-else:
-    DB_PATH = raw_db_path if os.path.exists(raw_db_path) else os.path.abspath(os.path.normpath(raw_db_path))
-
+DB_PATH = resolve_db_path()
 DB_NAME = os.path.basename(DB_PATH).replace(".db", "")
 
 # ──────────────────────────────────────────────────────────────────────────────
@@ -310,8 +298,8 @@ def delete_clue():
     if not removed_ids:
         return jsonify(error="Clue not found"), 404
 
-    new_items = [c for c in items if c.get("Name", "").strip() != name]
-    wrapper.save_items(new_items)
+    wrapper.delete_items([c.get("Name") for c in items
+                          if c.get("Name", "").strip() == name])
 
     links = load_links()
     filtered_links = [
@@ -350,9 +338,9 @@ def get_portrait_mapping():
     mapping = {}
     try:
         npc_wrapper = GenericModelWrapper("npcs")
-        for npc in npc_wrapper.load_items():
-            name = npc.get("Name","").strip()
-            portrait = npc.get("Portrait","").strip()
+        for npc in npc_wrapper.load_items(fields=["Name", "Portrait"]):
+            name = (npc.get("Name") or "").strip()
+            portrait = (npc.get("Portrait") or "").strip()
             if name and portrait:
                 mapping[name] = portrait
                 logging.debug("Mapping NPC portrait: %s -> %s", name, portrait)
@@ -497,17 +485,17 @@ def npc_graph():
         return jsonify(error="Graph file not found"), 404
     with open(path, encoding='utf-8') as f:
         data = json.load(f)
-    portrait_map = get_portrait_mapping()
-    npcs = []
+    nodes = data.get("nodes", [])
+    npcs = {}
     try:
-        npcs = GenericModelWrapper("npcs").load_items()
+        npcs = GenericModelWrapper("npcs").get_many(n.get("npc_name","") for n in nodes)
     except:
         pass
-    for node in data.get("nodes", []):
+    for node in nodes:
         name = node.get("npc_name","")
-        src = portrait_map.get(name,"").strip()
+        match = npcs.get(name)
+        src = str((match or {}).get("Portrait") or "").strip()
         node["portrait"] = os.path.basename(src) if src else FALLBACK_PORTRAIT
-        match = next((n for n in npcs if n.get("Name","").strip() == name), None)
         node["background"] = format_multiline_text(match.get("Background","")) if match else "(No background)"
     return jsonify(data)
 
@@ -583,8 +571,7 @@ def add_information():
             attachment.save(save_path)
 
         wrapper = GenericModelWrapper("informations")
-        items = wrapper.load_items()
-        items.append({
+        wrapper.upsert_item({
             "Title": title,
             "Information": info_txt,
             "Level": level,
@@ -592,7 +579,6 @@ def add_information():
             "NPCs": npcs,
             "Attachment": filename
         })
-        wrapper.save_items(items)
         return redirect(url_for('news_view'))
 
     return render_template('add_information.html')
@@ -638,14 +624,12 @@ def add_clue():
     if request.method == 'POST':
         # parse the RTF-JSON
         desc = json.loads(request.form['Description'])
-        items = wrapper.load_items()
-        items.append({
+        wrapper.upsert_item({
         "Name":          request.form['Name'].strip(),
         "Type":          request.form['Type'].strip(),
         "Description":   desc,
         "PlayerDisplay": bool(request.form.get('PlayerDisplay'))
         })
-        wrapper.save_items(items)
         return redirect(url_for('clues_view'))
 
     return render_template('clue_form.html', clue=None)
@@ -661,13 +645,14 @@ def edit_clue(idx):
     if request.method == 'POST':
         # parse the RTF-JSON
         desc = json.loads(request.form['Description'])
+        old_name = items[idx].get("Name")
         items[idx] = {
         "Name":          request.form['Name'].strip(),
         "Type":          request.form['Type'].strip(),
         "Description":   desc,
         "PlayerDisplay": bool(request.form.get('PlayerDisplay'))
         }
-        wrapper.save_items(items)
+        wrapper.rename_item(old_name, items[idx])
         return redirect(url_for('clues_view'))
 
     # GET: just hand the existing dict back into your form